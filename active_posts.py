@@ -0,0 +1,94 @@
+import time
+import calendar
+from collections import defaultdict
+from datetime import datetime
+
+from routing import parse_chat_id
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# Скільки годин пост вважається активним (після цього "зайнято" його вже не редагує)
+ACTIVE_POST_TTL_HOURS = 24
+# Наскільки пост може розминутись з моментом відкриття вікна (секунд),
+# щоб тривалість слотів записалась за ним
+OPENED_AT_TOLERANCE_SECONDS = 300
+
+
+class ActivePost:
+    """Оголошення, розіслане в один або кілька чатів, що ще не позначене як зайняте"""
+    __slots__ = ('msg_id', 'content_hash', 'text', 'posts', 'created_at')
+
+    def __init__(self, msg_id, content_hash, text, posts, created_at):
+        self.msg_id = msg_id
+        self.content_hash = content_hash
+        self.text = text
+        self.posts = posts  # [(chat_id, sent_msg_id), ...]
+        self.created_at = created_at
+
+
+def post_opened_at(posts, opened_at, tolerance=OPENED_AT_TOLERANCE_SECONDS):
+    """
+    Пост, найближчий до моменту відкриття вікна (час "зайнято" мінус
+    тривалість). Якщо жоден не ближчий за tolerance — None: найстаріший
+    активний міг лишитись від вікна, чиє "зайнято" ми пропустили.
+    """
+    closest = min(posts, key=lambda post: abs(post.created_at - opened_at), default=None)
+    if closest is None or abs(closest.created_at - opened_at) > tolerance:
+        return None
+    return closest
+
+
+class ActivePostIndex:
+    """
+    Місто → активні пости в каналах.
+
+    Повідомлення "слоти зайняті" приходить лише з назвою міста, тож індекс
+    дозволяє одразу знайти оригінальні пости і відредагувати їх на місці,
+    без запиту до БД. Записи старші за ACTIVE_POST_TTL_HOURS відкидаються.
+    """
+
+    def __init__(self, storage, ttl_hours=ACTIVE_POST_TTL_HOURS):
+        self.storage = storage
+        self.ttl_seconds = ttl_hours * 3600
+        self._by_city = defaultdict(list)
+
+    def add(self, city, msg_id, content_hash, text, posts, created_at=None):
+        if not city or not posts:
+            return
+        created_at = time.time() if created_at is None else created_at
+        post = ActivePost(msg_id, content_hash, text, list(posts), created_at)
+        # Місто без "зайнято" інакше накопичувало б пости (з текстом) до перезапуску
+        limit = created_at - self.ttl_seconds
+        city_posts = self._by_city[city]
+        city_posts[:] = [active for active in city_posts if active.created_at > limit]
+        city_posts.append(post)
+        return post
+
+    def pop_city(self, city, now=None):
+        """Забирає всі ще актуальні пости міста (слоти зайняті — активних більше немає)"""
+        limit = (time.time() if now is None else now) - self.ttl_seconds
+        return [post for post in self._by_city.pop(city, ()) if post.created_at > limit]
+
+    def __len__(self):
+        return sum(len(posts) for posts in self._by_city.values())
+
+    def load(self, rows):
+        """Заповнює з рядків sent_posts (див. Storage.get_active_posts)"""
+        self._by_city.clear()
+        grouped = {}
+        for msg_id, chat_id, sent_msg_id, city, content_hash, text, created_at in rows:
+            try:
+                created_ts = calendar.timegm(datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S').timetuple())
+            except (TypeError, ValueError):
+                continue
+            post = grouped.get(msg_id)
+            if post is None:
+                post = grouped[msg_id] = ActivePost(msg_id, content_hash, text, [], created_ts)
+                self._by_city[city].append(post)
+            post.posts.append((parse_chat_id(chat_id), sent_msg_id))
+
+    async def warm(self):
+        rows = await self.storage.get_active_posts(self.ttl_seconds // 3600)
+        self.load(rows)
+        log.info(f"📌 Активних постів: {len(self)}")
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import copy
+import queue
+import atexit
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+
+# Стандартні атрибути LogRecord — усе інше вважаємо структурованими полями
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+
+def record_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    """Один JSON-рядок на запис: час, рівень, логер, повідомлення + поля з extra"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Для читання очима: як print, але з рівнем та полями"""
+
+    def format(self, record):
+        line = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:<7} {record.getMessage()}"
+        fields = record_fields(record)
+        if fields:
+            line += "  " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Кладе запис у чергу без форматування: лише підставляє аргументи
+    та рендерить traceback, щоб запис можна було безпечно передати
+    в інший потік. JSON формується вже у фоновому потоці.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """
+    Логи через чергу: у event loop лише створюється запис і кладеться в
+    SimpleQueue, запис у stderr/journald виконує фоновий QueueListener.
+    Логи йдуть у stderr, щоб не змішуватись з виводом програми (bench.py --json).
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [_QueueHandler(log_queue)]
+    root.setLevel(level)
+    # Telethon дуже балакучий на INFO
+    logging.getLogger("telethon").setLevel(max(logging.WARNING, root.level))
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Дописує чергу логів і зупиняє фоновий потік"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name):
+    return logging.getLogger(name)
@@ -0,0 +1,474 @@
+"""
+Бенчмарк гарячого шляху без живого Telegram.
+
+    python bench.py --messages 2000 --send-latency 0.05
+
+Фейкові user_client/bot_client підміняють справжні, корпус повідомлень
+(на основі parse_like_whore.TEST_MESSAGES) проганяється через main.handler,
+handle_slots_gone та BotStatisticsHandler.handle_stats_callback.
+Звіт: msgs/sec, p50/p99 обробки, SQL-запитів на повідомлення, пам'ять.
+
+    python bench.py --messages 2000 --storage memory
+
+той самий прогін на сховищі в пам'яті (STORAGE_ENGINE=memory) — лише код, без диска.
+
+    python bench.py --startup --rpc-latency 0.1
+
+міряє холодний (нова БД, без кешу сутностей) і теплий старт main.startup().
+
+    python bench.py --stats-engine --stats-rows 100000
+
+порівнює підрахунок статистики за рік: цикл по рядках проти stats_engine.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import importlib
+import contextlib
+import tracemalloc
+from types import SimpleNamespace
+from datetime import datetime, timezone
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ============================================================
+# ФЕЙКОВІ КЛІЄНТИ
+# ============================================================
+
+class FakeMessage:
+    def __init__(self, msg_id, text=""):
+        self.id = msg_id
+        self.text = text
+
+
+class FakeClient:
+    """Старт і пошук сутностей з імітацією RPC-затримки"""
+
+    def __init__(self, rpc_latency=0.0):
+        self.rpc_latency = rpc_latency
+        self.rpc_calls = 0
+
+    async def _rpc(self):
+        self.rpc_calls += 1
+        if self.rpc_latency:
+            await asyncio.sleep(self.rpc_latency)
+
+    async def start(self, **kwargs):
+        # connect + перевірка авторизації
+        await self._rpc()
+        await self._rpc()
+        return self
+
+    async def get_me(self):
+        await self._rpc()
+        return SimpleNamespace(id=1, first_name="Bench", username="bench")
+
+    async def get_entity(self, key):
+        await self._rpc()
+        return SimpleNamespace(id=abs(hash(key)), title=str(key), first_name=None, username=str(key))
+
+    def is_connected(self):
+        return True
+
+    async def iter_messages(self, entity, **kwargs):
+        await self._rpc()
+        return
+        yield
+
+
+class FakeBotClient(FakeClient):
+    """Замість bot_client: імітує затримку мережі й рахує виклики"""
+
+    def __init__(self, latency=0.0, rpc_latency=0.0):
+        super().__init__(rpc_latency)
+        self.latency = latency
+        self.sent = 0
+        self.edited = 0
+        self._next_id = 1
+
+    async def _network(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def send_message(self, entity, message, **kwargs):
+        await self._network()
+        self.sent += 1
+        self._next_id += 1
+        return FakeMessage(self._next_id, message)
+
+    async def edit_message(self, entity, message_id, text=None, **kwargs):
+        await self._network()
+        self.edited += 1
+        return FakeMessage(message_id, text)
+
+
+class FakeSender:
+    username = "source_bot"
+    first_name = "Source"
+
+
+class FakeEvent:
+    """Мінімальна заміна events.NewMessage.Event"""
+
+    def __init__(self, msg_id, raw_text, date=None):
+        self.id = msg_id
+        self.raw_text = raw_text
+        self.date = date or datetime.now(timezone.utc)
+        self.sender_id = 1
+
+    async def get_sender(self):
+        return FakeSender()
+
+
+class FakeCallbackEvent:
+    """Мінімальна заміна events.CallbackQuery.Event"""
+
+    def __init__(self, data):
+        self.data = data
+
+    async def edit(self, text, **kwargs):
+        pass
+
+    async def answer(self, text=None, **kwargs):
+        pass
+
+    async def respond(self, text, **kwargs):
+        pass
+
+
+# ============================================================
+# КОРПУС
+# ============================================================
+
+def _slot_message(location, service, slots):
+    lines = ["🆕 З'явились нові слоти!", f"🔸 {location}", f"🔸 Послуга: {service}",
+             "📅 Слоти які були опубліковані:"]
+    lines += [f"{date}: {' '.join(times)}" for date, times in slots]
+    lines.append("🔥 Ви отримали це повідомлення без затримок!")
+    return "\n".join(lines)
+
+
+def build_corpus(count, seed=42):
+    """
+    Повідомлення для реплею: ~70% нових слотів, ~15% точних повторів,
+    ~8% "слоти зайняті", решта — нерозпізнані.
+    """
+    from parse_like_whore import TEST_MESSAGES, parse_announcement, parse_slots_gone_message
+
+    rng = random.Random(seed)
+    templates = [parse_announcement(text) for text in TEST_MESSAGES]
+    templates = [t for t in templates if t]
+    gone_messages = [text for text in TEST_MESSAGES if parse_slots_gone_message(text)[0]]
+
+    corpus = []
+    previous = None
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.15 and previous:
+            text = previous
+        elif roll < 0.23:
+            text = rng.choice(gone_messages)
+        elif roll < 0.30:
+            text = "Привіт! Це повідомлення не про слоти."
+        else:
+            template = rng.choice(templates)
+            slots = []
+            for date, _ in template.slots:
+                times = sorted({f"{rng.randint(8, 17):02d}:{rng.choice(range(0, 60, 5)):02d}"
+                                for _ in range(rng.randint(1, 4))})
+                slots.append((date, times))
+            text = _slot_message(template.location, template.service, slots)
+            previous = text
+        corpus.append(text)
+    return corpus
+
+
+# ============================================================
+# ЗАПУСК
+# ============================================================
+
+def prepare_environment(workdir, storage="sqlite"):
+    """Змінні оточення для імпорту main без справжнього .env"""
+    os.environ.setdefault("API_ID", "1")
+    os.environ.setdefault("API_HASH", "bench")
+    os.environ.setdefault("BOT_TOKEN", "bench")
+    os.environ.setdefault("BOT_USERNAME", "-1000000000001")
+    os.environ.setdefault("SOURCE_USER", "source_bot")
+    os.environ["SESSION_NAME"] = os.path.join(workdir, "bench_user")
+    os.environ["DB_FILE"] = os.path.join(workdir, "bench.db")
+    os.environ["STORAGE_ENGINE"] = storage
+    os.environ["METRICS_PORT"] = "0"
+    os.environ["ENTITY_CACHE_FILE"] = os.path.join(workdir, "entity_cache.json")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.chdir(workdir)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_benchmark(messages, send_latency, stats_presses, seed, rate_limit=False):
+    import db
+    main = importlib.import_module("main")
+
+    fake_bot = FakeBotClient(send_latency)
+    main.bot_client = fake_bot
+    if not rate_limit:
+        # Фейковий Telegram не має лімітів — міряємо сам код, а не token bucket
+        from send_queue import SendScheduler
+        main.send_scheduler = SendScheduler(per_chat_rate=1e9, per_chat_burst=1e9,
+                                            global_rate=1e9, global_burst=1e9, group_limit=None)
+
+    statements = [0]
+    db.set_statement_tracer(lambda sql: statements.__setitem__(0, statements[0] + 1))
+
+    corpus = build_corpus(messages, seed)
+    base_id = 1_000_000
+
+    await main.prepare_state()
+    statements[0] = 0
+
+    tracemalloc.start()
+    latencies = []
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i, text in enumerate(corpus):
+            event = FakeEvent(base_id + i, text)
+            t0 = time.perf_counter()
+            await main.handler(event)
+            latencies.append(time.perf_counter() - t0)
+        await main.persistence.flush()
+    elapsed = time.perf_counter() - started
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    handler_statements = statements[0]
+
+    # Натискання кнопок статистики: пачки одночасних callback-ів
+    stats_latencies = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for data in (b"stats_7", b"stats_30", b"stats_year", b"lifetime_30"):
+            async def press():
+                t0 = time.perf_counter()
+                await main.stats_handler.handle_stats_callback(FakeCallbackEvent(data))
+                stats_latencies.append(time.perf_counter() - t0)
+            await asyncio.gather(*(press() for _ in range(stats_presses)))
+
+    await main.persistence.close()
+
+    return {
+        "storage": main.storage.name,
+        "messages": messages,
+        "elapsed_s": elapsed,
+        "msgs_per_sec": messages / elapsed if elapsed else 0.0,
+        "handler_p50_ms": percentile(latencies, 0.50) * 1000,
+        "handler_p99_ms": percentile(latencies, 0.99) * 1000,
+        "db_statements_per_msg": handler_statements / messages if messages else 0.0,
+        "peak_memory_kb": peak_memory / 1024,
+        "sent": fake_bot.sent,
+        "edited": fake_bot.edited,
+        "stats_callbacks": len(stats_latencies),
+        "stats_p50_ms": percentile(stats_latencies, 0.50) * 1000,
+        "stats_p99_ms": percentile(stats_latencies, 0.99) * 1000,
+    }
+
+
+async def run_startup_benchmark(rpc_latency):
+    """Холодний і теплий старт: клієнти, БД, кеші, сутності — до готовності слухача"""
+    main = importlib.import_module("main")
+    from entity_cache import EntityCache
+
+    timings = {}
+    for phase in ("cold", "warm"):
+        main.user_client = FakeClient(rpc_latency)
+        main.bot_client = FakeBotClient(rpc_latency=rpc_latency)
+        main.catch_up.client = main.user_client
+        # Як новий процес: кеш сутностей читається з файлу заново
+        main.entity_cache = EntityCache()
+        main.state_ready.clear()
+
+        t0 = time.perf_counter()
+        ready = await main.startup()
+        timings[phase] = time.perf_counter() - t0
+        timings[f"{phase}_rpc_calls"] = main.user_client.rpc_calls + main.bot_client.rpc_calls
+        assert ready, "startup() не завершився"
+
+        await main.entity_cache.wait_revalidated()
+        for task in list(main._background_tasks):
+            task.cancel()
+        await asyncio.gather(*main._background_tasks, return_exceptions=True)
+
+    await main.persistence.close()
+    return {
+        "rpc_latency_s": rpc_latency,
+        "cold_startup_ms": timings["cold"] * 1000,
+        "warm_startup_ms": timings["warm"] * 1000,
+        "cold_rpc_calls": timings["cold_rpc_calls"],
+        "warm_rpc_calls": timings["warm_rpc_calls"],
+    }
+
+
+# ============================================================
+# СТАТИСТИКА: ЦИКЛ ПО РЯДКАХ ПРОТИ КОЛОНОК
+# ============================================================
+
+STATS_CITIES = ("Торонто", "Ванкувер", "Едмонтон", "Монреаль", "Оттава")
+STATS_SERVICES = ("Оформлення закордонного паспорта", "Консульський облік", None)
+
+
+def build_stats_rows(count, days=365, seed=42):
+    """Рік історії у двох форматах: як get_statistics_data і як get_statistics_history"""
+    import pytz
+
+    canada_tz = pytz.timezone("America/Toronto")
+    rng = random.Random(seed)
+    now = int(time.time())
+    data, history = [], []
+    for _ in range(count):
+        epoch = now - rng.randrange(days * 86400)
+        city, service, slots = rng.choice(STATS_CITIES), rng.choice(STATS_SERVICES), rng.randint(1, 12)
+        moment = datetime.fromtimestamp(epoch, timezone.utc)
+        data.append((city, service, slots, moment.astimezone(canada_tz).isoformat(),
+                     moment.strftime("%Y-%m-%d %H:%M:%S")))
+        history.append((epoch, city, service, slots))
+    return data, history
+
+
+def legacy_statistics(data):
+    """Підрахунки format_simple_statistics до stats_engine: datetime і pytz на кожен рядок"""
+    import pytz
+    from collections import defaultdict
+
+    canada_tz = pytz.timezone("America/Toronto")
+    total_slots = sum(slots or 0 for _, _, slots, _, _ in data)
+    city_stats = defaultdict(int)
+    city_hours = defaultdict(lambda: defaultdict(int))
+    for city, service, slots, canada_time_str, timestamp in data:
+        if city:
+            city_stats[city] += 1
+            try:
+                if canada_time_str:
+                    if "T" in canada_time_str:
+                        ct = datetime.fromisoformat(canada_time_str.replace("Z", "+00:00"))
+                    else:
+                        ct = datetime.strptime(canada_time_str, "%Y-%m-%d %H:%M:%S")
+                else:
+                    ct = pytz.UTC.localize(datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")).astimezone(canada_tz)
+                city_hours[city][ct.hour] += 1
+            except ValueError:
+                continue
+    return len(data), total_slots, dict(city_stats), {city: dict(hours) for city, hours in city_hours.items()}
+
+
+def run_stats_engine_benchmark(rows, repeats=5):
+    from stats_engine import HistoryColumns, summarize
+
+    data, history = build_stats_rows(rows)
+
+    def best_of(func):
+        timings = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - t0)
+        return min(timings) * 1000, result
+
+    legacy_ms, expected = best_of(lambda: legacy_statistics(data))
+    columns_ms, summary = best_of(lambda: summarize(HistoryColumns.from_rows(history)))
+    actual = (summary.total_messages, summary.total_slots, summary.city_counts, summary.city_hours)
+    assert actual == expected, "stats_engine: результат відрізняється від циклу по рядках"
+    return {"rows": rows, "legacy_ms": legacy_ms, "columns_ms": columns_ms}
+
+
+def print_stats_engine_report(result):
+    print("📊 СТАТИСТИКА ЗА РІК")
+    print("=" * 50)
+    print(f"🧾 Рядків: {result['rows']}")
+    print(f"🐢 Цикл по рядках (datetime + pytz): {result['legacy_ms']:.1f} мс")
+    print(f"⚡ Колонки (stats_engine): {result['columns_ms']:.1f} мс "
+          f"(×{result['legacy_ms'] / result['columns_ms']:.1f})")
+    print("=" * 50)
+
+
+def print_startup_report(result):
+    print("🚀 СТАРТ БОТА")
+    print("=" * 50)
+    print(f"🌐 RPC-затримка: {result['rpc_latency_s'] * 1000:.0f} мс")
+    print(f"🧊 Холодний старт: {result['cold_startup_ms']:.1f} мс")
+    print(f"🔥 Теплий старт: {result['warm_startup_ms']:.1f} мс")
+    print(f"📡 RPC (разом з фоновими): холодний {result['cold_rpc_calls']}, теплий {result['warm_rpc_calls']}")
+    print("=" * 50)
+
+
+def print_report(result):
+    print("🏁 РЕЗУЛЬТАТИ БЕНЧМАРКУ")
+    print("=" * 50)
+    print(f"🗄️ Сховище: {result['storage']}")
+    print(f"📨 Повідомлень: {result['messages']} за {result['elapsed_s']:.2f} с")
+    print(f"⚡ Пропускна здатність: {result['msgs_per_sec']:.0f} msg/s")
+    print(f"⏱️ Обробка: p50 {result['handler_p50_ms']:.2f} мс, p99 {result['handler_p99_ms']:.2f} мс")
+    print(f"🗄️ SQL-запитів на повідомлення: {result['db_statements_per_msg']:.2f}")
+    print(f"🧠 Пік пам'яті: {result['peak_memory_kb']:.0f} КБ")
+    print(f"📤 Відправлено: {result['sent']}, відредаговано: {result['edited']}")
+    print(f"📊 Статистика ({result['stats_callbacks']} натискань): "
+          f"p50 {result['stats_p50_ms']:.2f} мс, p99 {result['stats_p99_ms']:.2f} мс")
+    print("=" * 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк обробки повідомлень про слоти")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--send-latency", type=float, default=0.0, help="імітація затримки Telegram, с")
+    parser.add_argument("--stats-presses", type=int, default=20, help="одночасних натискань на період")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rate-limit", action="store_true", help="залишити ліміти Telegram у черзі відправки")
+    parser.add_argument("--startup", action="store_true", help="виміряти холодний і теплий старт")
+    parser.add_argument("--rpc-latency", type=float, default=0.05, help="імітація RPC під час старту, с")
+    parser.add_argument("--stats-engine", action="store_true", help="мікробенчмарк статистики за рік")
+    parser.add_argument("--stats-rows", type=int, default=100_000, help="рядків історії для --stats-engine")
+    parser.add_argument("--storage", choices=("sqlite", "memory"), default="sqlite",
+                        help="рушій сховища (STORAGE_ENGINE)")
+    parser.add_argument("--json", action="store_true", help="вивести результат як JSON")
+    args = parser.parse_args()
+
+    if args.stats_engine:
+        # Без main і БД — лише обчислення над готовими рядками
+        if REPO_DIR not in sys.path:
+            sys.path.insert(0, REPO_DIR)
+        result = run_stats_engine_benchmark(args.stats_rows)
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        else:
+            print_stats_engine_report(result)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        prepare_environment(workdir, args.storage)
+        if args.startup:
+            result = asyncio.run(run_startup_benchmark(args.rpc_latency))
+        else:
+            result = asyncio.run(run_benchmark(args.messages, args.send_latency, args.stats_presses, args.seed,
+                                               args.rate_limit))
+        importlib.import_module("main").storage.close()
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    elif args.startup:
+        print_startup_report(result)
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    main()
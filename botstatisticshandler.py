@@ -1,10 +1,28 @@
-from collections import defaultdict
+import asyncio
 from telethon.tl.custom import Button
-from db import get_statistics_data
+from metrics import format_metrics_summary
+from stats_engine import HistoryColumns, summarize, summarize_lifetimes
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+
+def format_duration(seconds):
+    """45 -> '45 с', 185 -> '3 хв 5 с'"""
+    seconds = round(seconds)
+    if seconds < 60:
+        return f"{seconds} с"
+    minutes, seconds = divmod(seconds, 60)
+    return f"{minutes} хв {seconds} с" if seconds else f"{minutes} хв"
+
 
 class BotStatisticsHandler:
-    def __init__(self):
-        pass
+    def __init__(self, storage, version_source=None):
+        self.storage = storage
+        self._cache = {}     # {днів: (версія статистики, текст)}
+        self._inflight = {}  # {днів: asyncio.Task} — одне обчислення на період
+        # async () -> версія; в окремому процесі статистики — з БД, а не з лічильника в пам'яті
+        self.version_source = version_source or storage.get_stats_version
     
     async def handle_start_command(self, event):
         """Обробка команди /start"""
@@ -20,16 +38,34 @@ class BotStatisticsHandler:
         
         buttons = [
             [Button.inline("📊 Статистика за тиждень", b"stats_7")],
-            [Button.inline("📆 Статистика за місяць", b"stats_30")]
+            [Button.inline("📆 Статистика за місяць", b"stats_30")],
+            [Button.inline("⏱️ Скільки живуть слоти", b"lifetime_30")]
         ]
         
         await event.respond(welcome_msg, buttons=buttons)
     
+    async def handle_metrics_command(self, event):
+        """Обробка команди /metrics"""
+        await event.respond(format_metrics_summary())
+
     async def handle_stats_callback(self, event):
         """Обробка callback для статистики"""
         data = event.data.decode()
-        
-        if data.startswith("stats_"):
+
+        if data.startswith("lifetime_"):
+            try:
+                days = int(data.replace("lifetime_", ""))
+            except ValueError:
+                days = 30
+
+            buttons = [
+                [Button.inline("⏱️ За тиждень", b"lifetime_7"), Button.inline("⏱️ За місяць", b"lifetime_30")],
+                [Button.inline("📊 Статистика", f"stats_{days}".encode())],
+                [Button.inline("🔄 Оновити", f"lifetime_{days}".encode())]
+            ]
+            await self._edit_statistics(event, await self.get_lifetime_text(days), buttons)
+
+        elif data.startswith("stats_"):
             # Підтримуємо і старий і новий формат
             period_str = data.replace("stats_", "")
             
@@ -47,90 +83,133 @@ class BotStatisticsHandler:
                 except ValueError:
                     days = 7  # fallback
             
-            stats_msg = self.format_simple_statistics(days)
+            stats_msg = await self.get_statistics_text(days)
             
             buttons = [
                 [Button.inline("📊 За тиждень", b"stats_7")],
                 [Button.inline("📆 За місяць", b"stats_30")],
+                [Button.inline("🗓️ За рік", b"stats_365")],
+                [Button.inline("⏱️ Скільки живуть слоти", f"lifetime_{days}".encode())],
                 [Button.inline("🔄 Оновити", f"stats_{days}".encode())]
             ]
-            
-            # Перевіряємо чи відрізняється контент перед редагуванням
-            try:
-                await event.edit(stats_msg, buttons=buttons)
-            except Exception as e:
-                if "MessageNotModifiedError" in str(e):
-                    print("⚠️ Контент не змінився, пропускаємо редагування")
-                    await event.answer("🔄 Дані вже актуальні")
-                else:
-                    print(f"❌ Помилка редагування статистики: {e}")
-                    await event.answer("❌ Помилка оновлення")
+            await self._edit_statistics(event, stats_msg, buttons)
+
+    async def _edit_statistics(self, event, text, buttons):
+        # Перевіряємо чи відрізняється контент перед редагуванням
+        try:
+            await event.edit(text, buttons=buttons)
+        except Exception as e:
+            if "MessageNotModifiedError" in str(e):
+                log.info("⚠️ Контент не змінився, пропускаємо редагування")
+                await event.answer("🔄 Дані вже актуальні")
+            else:
+                log.error(f"❌ Помилка редагування статистики: {e}")
+                await event.answer("❌ Помилка оновлення")
     
-    def format_simple_statistics(self, period_days):
-        """Проста статистика з годинами для кожного міста"""
-        from db import get_statistics_data
-        from datetime import datetime
-        from collections import defaultdict
-        import pytz
-        
-        data = get_statistics_data(period_days)
-        
-        if not data:
+    async def get_statistics_text(self, period_days):
+        """
+        Текст статистики з кешу. Кеш скидається, коли з'являються нові слоти;
+        одночасні натискання кнопок чекають на одне спільне обчислення;
+        запити йдуть у сховище, а форматування — в окремому потоці.
+        """
+        version = await self.version_source()
+        cached = self._cache.get(period_days)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        task = self._inflight.get(period_days)
+        if task is None:
+            task = asyncio.ensure_future(self._render_statistics(period_days, version))
+            self._inflight[period_days] = task
+            task.add_done_callback(lambda _: self._inflight.pop(period_days, None))
+
+        # shield — щоб скасування одного callback не скасувало спільне обчислення
+        return await asyncio.shield(task)
+
+    async def _render_statistics(self, period_days, version):
+        rows, daily = await asyncio.gather(
+            self.storage.get_statistics_history(period_days),
+            self.storage.get_daily_stats(period_days)
+        )
+        text = await asyncio.to_thread(self._summarize_and_format, period_days, rows, daily)
+        self._cache[period_days] = (version, text)
+        return text
+
+    def _summarize_and_format(self, period_days, rows, daily):
+        # Дні, старші за гаряче вікно, вже згорнуті в daily_stats
+        return self.format_simple_statistics(period_days, summarize(HistoryColumns.from_rows(rows), daily))
+
+    def format_simple_statistics(self, period_days, summary):
+        """Проста статистика з годинами для кожного міста (summary — stats_engine.StatsSummary)"""
+        if not summary.total_messages:
             return f"📊 **Статистика за {period_days} днів**\n\n❌ Даних немає"
-        
-        # Підрахунки
-        total_messages = len(data)
-        total_slots = sum(slots or 0 for _, _, slots, _, _ in data)
-        
-        city_stats = defaultdict(int)
-        service_stats = defaultdict(int)
-        city_hours = defaultdict(lambda: defaultdict(int))  # {місто: {година: кількість}}
-        
-        CANADA_TZ = pytz.timezone('America/Toronto')
-        
-        for city, service, slots, canada_time_str, timestamp in data:
-            if city:
-                city_stats[city] += 1
-                
-                # Обробка часу для статистики по годинах
-                try:
-                    if canada_time_str:
-                        if 'T' in canada_time_str:
-                            ct = datetime.fromisoformat(canada_time_str.replace('Z', '+00:00'))
-                        else:
-                            ct = datetime.strptime(canada_time_str, '%Y-%m-%d %H:%M:%S')
-                    else:
-                        utc_time = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
-                        utc_time = pytz.UTC.localize(utc_time)
-                        ct = utc_time.astimezone(CANADA_TZ)
-                    
-                    city_hours[city][ct.hour] += 1
-                except:
-                    continue
-                    
-            if service:
-                service_stats[service] += 1
-        
+
+        total_messages = summary.total_messages
+        total_slots = summary.total_slots
+
         # Форматування
         msg = f"📊 **Статистика за {period_days} днів**\n\n"
         msg += f"📈 **Всього повідомлень:** {total_messages}\n"
         msg += f"🎯 **Всього слотів:** {total_slots}\n"
-        msg += f"📊 **В середньому слотів на повідомлення:** {total_slots/total_messages:.1f}\n\n"
-        
+        msg += f"📊 **В середньому слотів на повідомлення:** {total_slots/total_messages:.1f}\n"
+        if summary.slot_percentiles:
+            msg += (f"📏 **Слотів у повідомленні:** медіана {summary.slot_percentiles[50]}, "
+                    f"p90 {summary.slot_percentiles[90]}\n")
+        msg += "\n"
+
         # Топ міст з годинами
         msg += "🏙️ **Найактивніші міста:**\n"
-        sorted_cities = sorted(city_stats.items(), key=lambda x: x[1], reverse=True)[:3]
-        
-        for i, (city, count) in enumerate(sorted_cities, 1):
+        for i, (city, count) in enumerate(summary.top_cities(3), 1):
             percentage = (count / total_messages) * 100
             msg += f"{i}. **{city}**: {count} разів ({percentage:.1f}%)\n"
-            
+
             # Топ-3 години для цього міста
-            if city in city_hours:
-                top_hours = sorted(city_hours[city].items(), key=lambda x: x[1], reverse=True)[:3]
-                if top_hours:
-                    hours_str = ", ".join([f"{h:02d}:00" for h, _ in top_hours])
-                    msg += f"   🕐 Найчастіші години: {hours_str}\n"
+            top_hours = summary.top_hours(city, 3)
+            if top_hours:
+                hours_str = ", ".join([f"{h:02d}:00" for h, _ in top_hours])
+                msg += f"   🕐 Найчастіші години: {hours_str}\n"
             msg += "\n"
-        
-        return msg
\ No newline at end of file
+
+        return msg
+
+    async def get_lifetime_text(self, period_days):
+        """Рядок на кожне "зайнято" — даних мало, рахуємо без кешу"""
+        rows = await self.storage.get_slot_lifetimes(period_days)
+        return self.format_lifetime_statistics(period_days, *summarize_lifetimes(rows))
+
+    def format_lifetime_statistics(self, period_days, total, by_city, by_hour):
+        """Скільки слоти були відкриті проти нашої затримки (див. stats_engine.LifetimeStats)"""
+        if not total:
+            return f"⏱️ **Скільки живуть слоти за {period_days} днів**\n\n❌ Даних немає"
+
+        lifetimes = total.lifetime_percentiles()
+        msg = f"⏱️ **Скільки живуть слоти за {period_days} днів**\n\n"
+        msg += f"🪟 **Вікон:** {len(total)}\n"
+        msg += f"⏳ **Тривалість:** медіана {format_duration(lifetimes[50])}, p10 {format_duration(lifetimes[10])}\n"
+        if total.latencies:
+            latency = total.latency_percentiles()
+            msg += (f"⚡ **Наша затримка (отримання → пост):** медіана {latency[50] / 1000:.1f} с, "
+                    f"p90 {latency[90] / 1000:.1f} с\n")
+            msg += (f"🏁 **Встигли до зайняття:** {total.beaten} з {len(total.latencies)} "
+                    f"({total.beat_ratio:.0%})\n")
+        msg += "\n"
+
+        msg += "🏙️ **По містах:**\n"
+        for city, stats in sorted(by_city.items(), key=lambda item: (-len(item[1]), item[0]))[:5]:
+            lifetimes = stats.lifetime_percentiles()
+            msg += (f"**{city}** ({len(stats)}): медіана {format_duration(lifetimes[50])}, "
+                    f"p10 {format_duration(lifetimes[10])}")
+            if stats.beat_ratio is not None:
+                msg += f", встигли {stats.beat_ratio:.0%}"
+            msg += "\n"
+
+            # Години (за Канадою), коли вікна відкривались найчастіше
+            hours = sorted(((hour, hour_stats) for (hour_city, hour), hour_stats in by_hour.items()
+                            if hour_city == city), key=lambda item: (-len(item[1]), item[0]))[:3]
+            for hour, hour_stats in hours:
+                hour_lifetimes = hour_stats.lifetime_percentiles()
+                msg += (f"   🕐 {hour:02d}:00 — медіана {format_duration(hour_lifetimes[50])}, "
+                        f"p10 {format_duration(hour_lifetimes[10])} ({len(hour_stats)})\n")
+            msg += "\n"
+
+        return msg
@@ -0,0 +1,191 @@
+import os
+import asyncio
+from datetime import datetime, timezone
+
+from parse_like_whore import parse_announcement, parse_slots_gone_message
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# Повідомлення старші за це вже не публікуємо — слоти майже напевно зайняті
+CATCHUP_MAX_AGE_MINUTES = int(os.getenv('CATCHUP_MAX_AGE_MINUTES', '30'))
+# Скільки повідомлень максимум добирати за раз
+CATCHUP_LIMIT = int(os.getenv('CATCHUP_LIMIT', '500'))
+# Як часто перевіряти, чи клієнт перепідключився (секунд)
+CATCHUP_CHECK_SECONDS = 5
+
+
+def split_stale(messages, now=None, max_age_minutes=CATCHUP_MAX_AGE_MINUTES):
+    """
+    Ділить пачку (за зростанням id) на (свіжі, застарілі).
+
+    Застаріле — старше за max_age_minutes, або оголошення, після якого
+    в тій самій пачці вже прийшло "слоти зайняті" для того ж міста.
+    """
+    now = now or datetime.now(timezone.utc)
+    gone_after = {}  # {місто: id останнього "зайнято"}
+    for message in messages:
+        _, city, _, _ = parse_slots_gone_message(message.raw_text)
+        if city:
+            gone_after[city] = message.id
+
+    fresh, stale = [], []
+    for message in messages:
+        date = getattr(message, 'date', None)
+        if date and (now - date).total_seconds() > max_age_minutes * 60:
+            stale.append(message)
+            continue
+        announcement = parse_announcement(message.raw_text)
+        if announcement and gone_after.get(announcement.city, 0) > message.id:
+            stale.append(message)
+            continue
+        fresh.append(message)
+    return fresh, stale
+
+
+class CatchUp:
+    """
+    Догін повідомлень джерела, пропущених під час перезапуску чи розриву.
+
+    Бере все новіше за позицію, запам'ятовану до розриву (mark_position):
+    живі повідомлення після перепідключення зсувають last_msg_id за пропуск,
+    тож брати його в момент догону не можна. Перекриття з уже обробленим
+    відсіює один запит до processed, решта йде
+    через звичайний хендлер (з catch_up=True — затримка від event.date тут
+    міряє простій, а не швидкість бота). Застаріле лише позначається обробленим.
+    """
+
+    def __init__(self, client, source, handler, dedup_cache, mark_skipped, storage,
+                 limit=CATCHUP_LIMIT, max_age_minutes=CATCHUP_MAX_AGE_MINUTES):
+        self.client = client
+        self.source = source
+        self.handler = handler
+        self.dedup_cache = dedup_cache
+        self.mark_skipped = mark_skipped  # (msg_id) -> None
+        self.storage = storage
+        self.limit = limit
+        self.max_age_minutes = max_age_minutes
+        self._lock = asyncio.Lock()
+        self._min_id = None
+
+    def mark_position(self):
+        """Запам'ятати, звідки доганяти: одразу після прогріву кешу та при виявленні розриву"""
+        self._min_id = self.dedup_cache.last_msg_id
+
+    async def run_once(self):
+        """Один прохід догону; повертає (оброблено, пропущено як застаріле)"""
+        async with self._lock:
+            min_id = self._min_id if self._min_id is not None else self.dedup_cache.last_msg_id
+            if not min_id:
+                # Перший запуск — немає позиції, з якої доганяти
+                return 0, 0
+            # Найновіші limit повідомлень: якщо пропуск довший, відкидаємо
+            # найстаріші — вони все одно застарілі
+            fetched = [
+                message async for message in self.client.iter_messages(
+                    self.source, min_id=min_id, limit=self.limit
+                )
+            ]
+            fetched.reverse()
+            messages = [
+                message for message in fetched
+                if message.raw_text and not getattr(message, 'out', False)
+            ]
+            if not messages:
+                return 0, 0
+
+            processed = await self.storage.get_processed_ids(message.id for message in messages)
+            pending = [
+                message for message in messages
+                if message.id not in processed and not self.dedup_cache.is_processed(message.id)
+            ]
+            fresh, stale = split_stale(pending, max_age_minutes=self.max_age_minutes)
+
+            for message in stale:
+                self.mark_skipped(message.id)
+            for message in fresh:
+                await self.handler(message, catch_up=True)
+
+            log.info("🔁 Догін пропущених повідомлень", extra={
+                'min_id': min_id,
+                'fetched': len(messages),
+                'truncated': len(fetched) >= self.limit,
+                'already_processed': len(messages) - len(pending),
+                'handled': len(fresh),
+                'stale': len(stale),
+            })
+            return len(fresh), len(stale)
+
+    async def _safe_run(self):
+        try:
+            await self.run_once()
+        except Exception:
+            log.exception("❌ Помилка догону")
+
+    async def watch(self, interval=CATCHUP_CHECK_SECONDS):
+        """Догін одразу після старту і після кожного перепідключення клієнта"""
+        await self._safe_run()
+        was_connected = self.client.is_connected()
+        while True:
+            await asyncio.sleep(interval)
+            connected = self.client.is_connected()
+            if was_connected and not connected:
+                # Поки розрив, живих повідомлень немає — позиція не зсунеться
+                self.mark_position()
+            elif connected and not was_connected:
+                log.info("🔌 Клієнт перепідключився — доганяю пропущене")
+                await self._safe_run()
+            was_connected = connected
+
+
+def test_catch_up():
+    from types import SimpleNamespace
+    from dedup_cache import DedupCache
+
+    now = datetime.now(timezone.utc)
+
+    class Client:
+        def __init__(self, ids):
+            self.messages = [SimpleNamespace(id=i, raw_text=f"msg {i}", date=now) for i in ids]
+
+        async def iter_messages(self, source, min_id=0, limit=None):
+            # Як у Telethon без reverse: від найновіших
+            newer = [m for m in reversed(self.messages) if m.id > min_id]
+            for message in newer[:limit]:
+                yield message
+
+    class Storage:
+        async def get_processed_ids(self, msg_ids):
+            return set()
+
+    async def scenario():
+        dedup = DedupCache(Storage())
+        handled = []
+
+        async def handler(message, catch_up=False):
+            assert catch_up
+            handled.append(message.id)
+            dedup.mark_processed(message.id)
+
+        dedup.mark_processed(100)
+        catch = CatchUp(Client(range(100, 111)), 'source', handler, dedup, dedup.mark_processed, Storage())
+        catch.mark_position()
+        # Живе 110 прийшло раніше за догін — пропуск 101..109 не губиться
+        dedup.mark_processed(110)
+        assert await catch.run_once() == (9, 0), handled
+        assert handled == list(range(101, 110)), handled
+
+        # Довгий пропуск: з limit беремо найновіші, за зростанням id
+        handled.clear()
+        catch = CatchUp(Client(range(200, 221)), 'source', handler, dedup, dedup.mark_processed, Storage(), limit=5)
+        dedup.mark_processed(200)
+        catch.mark_position()
+        await catch.run_once()
+        assert handled == list(range(216, 221)), handled
+
+    asyncio.run(scenario())
+    print("✅ catchup OK")
+
+
+if __name__ == "__main__":
+    test_catch_up()
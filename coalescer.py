@@ -0,0 +1,143 @@
+import os
+import asyncio
+
+from parse_like_whore import SlotAnnouncement
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# Вікно злиття оголошень одного консульства (мс); 0 — вимкнено
+COALESCE_MS = int(os.getenv('COALESCE_MS', '0'))
+
+
+def _date_key(date):
+    day, month, year = date.split('.')
+    return year, month, day
+
+
+def merge_slots(*slot_groups):
+    """Об'єднання ((дата, (час, ...)), ...) без повторів, дати та часи по порядку"""
+    merged = {}
+    for slots in slot_groups:
+        for date, times in slots:
+            merged.setdefault(date, set()).update(times)
+    return tuple((date, tuple(sorted(merged[date]))) for date in sorted(merged, key=_date_key))
+
+
+class Burst:
+    """Перший пост вікна та все, що злилось у нього"""
+    __slots__ = ('key', 'announcement', 'opened_at', 'sent', 'active_post', 'merged_hashes', 'flush_task')
+
+    def __init__(self, key, announcement, opened_at):
+        self.key = key
+        self.announcement = announcement
+        self.opened_at = opened_at
+        self.sent = asyncio.get_running_loop().create_future()  # [(chat, sent_msg_id)] першого поста
+        self.active_post = None    # запис ActivePostIndex — щоб "зайнято" бачило злитий текст
+        self.merged_hashes = []
+        self.flush_task = None
+
+
+class BurstCoalescer:
+    """
+    Дебаунс сплесків "З'явились нові слоти!" для одного консульства і послуги.
+
+    Перше оголошення публікується одразу й відкриває вікно window_ms.
+    Наступні в межах вікна не відправляються окремо: їхні дати/часи
+    об'єднуються з першим, і в кінці вікна пост редагується один раз.
+    """
+
+    def __init__(self, edit_posts, format_text, on_flushed=None, window_ms=COALESCE_MS):
+        self.edit_posts = edit_posts    # async (posts, text) -> None
+        self.format_text = format_text  # (SlotAnnouncement) -> str
+        self.on_flushed = on_flushed    # (burst, text) -> None
+        self.window = window_ms / 1000
+        self._bursts = {}
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    @staticmethod
+    def _key(announcement):
+        return announcement.city, announcement.service
+
+    def _now(self):
+        return asyncio.get_running_loop().time()
+
+    def start(self, announcement):
+        """Відкриває вікно для оголошення, яке зараз буде опубліковане"""
+        if not self.enabled:
+            return None
+        key = self._key(announcement)
+        burst = Burst(key, announcement, self._now())
+        self._bursts[key] = burst
+        return burst
+
+    def join(self, announcement):
+        """Якщо вікно консульства відкрите — зливає оголошення в нього і повертає Burst"""
+        if not self.enabled:
+            return None
+        burst = self._bursts.get(self._key(announcement))
+        if burst is None:
+            return None
+        elapsed = self._now() - burst.opened_at
+        if elapsed >= self.window:
+            return None
+
+        first = burst.announcement
+        burst.announcement = SlotAnnouncement(
+            first.location, first.city, first.service, merge_slots(first.slots, announcement.slots)
+        )
+        burst.merged_hashes.append(announcement.content_hash)
+        if burst.flush_task is None:
+            burst.flush_task = asyncio.ensure_future(self._flush(burst, self.window - elapsed))
+        return burst
+
+    def delivered(self, burst, posts, active_post=None):
+        burst.active_post = active_post
+        if not burst.sent.done():
+            burst.sent.set_result(posts)
+
+    def failed(self, burst):
+        """Перший пост не відправився: закриваємо вікно, повертаємо хеші злитих оголошень"""
+        if self._bursts.get(burst.key) is burst:
+            del self._bursts[burst.key]
+        if burst.flush_task:
+            burst.flush_task.cancel()
+        if not burst.sent.done():
+            burst.sent.set_result(None)
+        return burst.merged_hashes
+
+    def cancel_city(self, city):
+        """Слоти міста зайняті — відкладені редагування вже неактуальні"""
+        for key in [key for key in self._bursts if key[0] == city]:
+            burst = self._bursts.pop(key)
+            if burst.flush_task:
+                burst.flush_task.cancel()
+
+    async def _flush(self, burst, delay):
+        await asyncio.sleep(delay)
+        if self._bursts.get(burst.key) is burst:
+            del self._bursts[burst.key]
+        # Перший пост міг ще відправлятись — злите піде одним редагуванням після нього
+        posts = await burst.sent
+        if not posts:
+            return
+
+        text = self.format_text(burst.announcement)
+        try:
+            await self.edit_posts(posts, text)
+        except Exception as e:
+            log.error(f"❌ Не вдалося оновити пост злитими слотами: {e}", extra={'city': burst.key[0]})
+            return
+
+        if burst.active_post is not None:
+            burst.active_post.text = text
+        if self.on_flushed:
+            self.on_flushed(burst, text)
+        log.info("🧩 Злито оголошення в один пост", extra={
+            'city': burst.key[0],
+            'merged': len(burst.merged_hashes),
+            'slots': burst.announcement.total_slots,
+        })
@@ -1,53 +1,414 @@
+import os
+import json
+import time
 import sqlite3
+import asyncio
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import pytz
 
-DB_FILE = 'processed_messages.db'
+from forecast import forecast_index, cell_key, decayed_add
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+DB_FILE = os.getenv('DB_FILE', 'processed_messages.db')
 CANADA_TZ = pytz.timezone('America/Toronto')
 
+# Лічильник змін статистики (для інвалідації кешів)
+_stats_version = 0
+
+# Налаштування з'єднань
+BUSY_TIMEOUT_MS = 5000
+READER_THREADS = 2
+
+# Скільки днів сирі рядки processed лишаються "гарячими" до згортання в daily_stats
+HOT_DAYS = int(os.getenv('RETENTION_HOT_DAYS', '30'))
+
+# ============================================================
+# МЕНЕДЖЕР З'ЄДНАНЬ
+# ============================================================
+# Кожен потік тримає одне довготривале з'єднання (WAL + busy_timeout).
+# Усі записи йдуть через один потік-записувач, читання — через пул читачів,
+# тож повільний запит статистики чи fsync не блокують event loop.
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+_statement_tracer = None
+
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+_readers = ThreadPoolExecutor(max_workers=READER_THREADS, thread_name_prefix='db-reader')
+
+
+def get_connection():
+    """Повертає довготривале з'єднання поточного потоку"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if _statement_tracer:
+            conn.set_trace_callback(_statement_tracer)
+        _local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+def set_statement_tracer(callback):
+    """callback(sql) для кожного SQL-запиту на всіх з'єднаннях (бенчмарк, діагностика)"""
+    global _statement_tracer
+    _statement_tracer = callback
+    with _connections_lock:
+        for conn in _connections:
+            conn.set_trace_callback(callback)
+
+
+def close_db():
+    """Закриває всі з'єднання та зупиняє потоки БД"""
+    _writer.shutdown(wait=True)
+    _readers.shutdown(wait=True)
+    with _connections_lock:
+        for conn in _connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
+    _local.conn = None
+
+
+async def _run_in(executor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+async def run_write(func, *args, **kwargs):
+    """Виконує функцію в потоці-записувачі"""
+    return await _run_in(_writer, func, *args, **kwargs)
+
+
+async def run_read(func, *args, **kwargs):
+    """Виконує функцію в пулі читачів"""
+    return await _run_in(_readers, func, *args, **kwargs)
+
+
+# ============================================================
+# МІГРАЦІЇ СХЕМИ
+# ============================================================
+# Кожна міграція виконується рівно один раз в окремій транзакції,
+# застосовані версії записуються в таблицю schema_version.
+
+PROCESSED_COLUMNS = [
+    ('msg_id', 'INTEGER PRIMARY KEY'),
+    ('content_hash', 'TEXT'),
+    ('timestamp', 'DATETIME DEFAULT CURRENT_TIMESTAMP'),
+    ('city', 'TEXT'),
+    ('service', 'TEXT'),
+    ('slots_count', 'INTEGER'),
+    ('available_dates', 'TEXT'),
+    ('canada_time', 'DATETIME'),
+    ('sent_msg_id', 'INTEGER'),
+    ('is_gone_processed', 'BOOLEAN DEFAULT 0'),
+]
+
+
+def _migration_001_processed_table(cursor):
+    """Базова таблиця processed (+ перебудова старих БД без версіонування)"""
+    existing_columns = [row[1] for row in cursor.execute("PRAGMA table_info(processed)").fetchall()]
+    columns_sql = ",\n            ".join(f"{name} {column_type}" for name, column_type in PROCESSED_COLUMNS)
+
+    if existing_columns and len(existing_columns) < len(PROCESSED_COLUMNS):
+        # ALTER TABLE не вміє додавати колонку з DEFAULT CURRENT_TIMESTAMP,
+        # тому стару таблицю перебудовуємо з копіюванням наявних даних
+        cursor.execute('ALTER TABLE processed RENAME TO processed_legacy')
+        cursor.execute(f'CREATE TABLE processed (\n            {columns_sql}\n        )')
+        common = ", ".join(existing_columns)
+        cursor.execute(f'INSERT INTO processed ({common}) SELECT {common} FROM processed_legacy')
+        cursor.execute('DROP TABLE processed_legacy')
+        log.info(f"✅ Таблицю processed перебудовано ({len(existing_columns)} → {len(PROCESSED_COLUMNS)} колонок)")
+    else:
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS processed (\n            {columns_sql}\n        )')
+
+
+def _migration_002_backfill(cursor):
+    """Одноразове заповнення is_gone_processed та canada_time для старих рядків"""
+    cursor.execute('UPDATE processed SET is_gone_processed = 0 WHERE is_gone_processed IS NULL')
+
+    rows = cursor.execute('''
+        SELECT msg_id, timestamp FROM processed
+        WHERE canada_time IS NULL AND city IS NOT NULL AND timestamp IS NOT NULL
+    ''').fetchall()
+
+    updates = []
+    for msg_id, timestamp in rows:
+        try:
+            utc_time = pytz.UTC.localize(datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S'))
+        except (TypeError, ValueError):
+            continue
+        updates.append((utc_time.astimezone(CANADA_TZ).isoformat(), msg_id))
+
+    cursor.executemany('UPDATE processed SET canada_time = ? WHERE msg_id = ?', updates)
+    if updates:
+        log.info(f"✅ Заповнено canada_time для {len(updates)} записів")
+
+
+def _migration_003_indexes(cursor):
+    """Покриваючі індекси для гарячих запитів"""
+    # is_content_processed_recently, save_sent_message, mark_gone_processed
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_processed_hash
+        ON processed (content_hash, is_gone_processed, timestamp)
+    ''')
+    # get_sent_message_id_by_city
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_processed_city
+        ON processed (city, is_gone_processed, timestamp, sent_msg_id, content_hash)
+    ''')
+    # get_statistics_data
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_processed_stats
+        ON processed (is_gone_processed, timestamp, city, service, slots_count, canada_time)
+    ''')
+
+
+def _parse_canada_time(canada_time_str, timestamp):
+    """Локальний час Канади для рядка processed"""
+    if canada_time_str:
+        if 'T' in canada_time_str:
+            return datetime.fromisoformat(canada_time_str.replace('Z', '+00:00'))
+        return datetime.strptime(canada_time_str, '%Y-%m-%d %H:%M:%S')
+    utc_time = pytz.UTC.localize(datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S'))
+    return utc_time.astimezone(CANADA_TZ)
+
+
+def _local_date_hour(canada_time: datetime):
+    """(local_date, hour) за часом Канади"""
+    return canada_time.date().isoformat(), canada_time.hour
+
+
+def _migration_004_hourly_stats(cursor):
+    """
+    Порожня: тут створювалась і заповнювалась з історії таблиця hourly_stats
+    (година × місто × послуга). Її замінив індекс прогнозу forecast_cells
+    (міграція 6), тож крок лишається лише заради нумерації версій.
+    """
+
+
+def _migration_005_sent_posts(cursor):
+    """Відправлені пости по кожному чату призначення"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sent_posts (
+            msg_id INTEGER NOT NULL,
+            chat_id TEXT NOT NULL,
+            sent_msg_id INTEGER NOT NULL,
+            city TEXT,
+            content_hash TEXT,
+            is_gone BOOLEAN DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (msg_id, chat_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_sent_posts_city
+        ON sent_posts (city, is_gone, created_at)
+    ''')
+
+
+def _forecast_cell_op(cursor, city, canada_time):
+    """Згасає і збільшує комірку (місто, день тижня, година); повертає новий рядок"""
+    key = cell_key(city, canada_time)
+    now_ts = canada_time.timestamp()
+    row = cursor.execute('''
+        SELECT value, updated_at FROM forecast_cells WHERE city = ? AND weekday = ? AND hour = ?
+    ''', key).fetchone()
+    value = decayed_add(row[0] if row else 0.0, row[1] if row else None, now_ts, forecast_index.tau)
+    cursor.execute('''
+        INSERT INTO forecast_cells (city, weekday, hour, value, updated_at, first_seen)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (city, weekday, hour)
+        DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+    ''', (*key, value, now_ts, now_ts))
+    return (*key, value, now_ts)
+
+
+def _migration_006_forecast_cells(cursor):
+    """Знімок прогнозу місто × день тижня × година + заповнення з історії"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS forecast_cells (
+            city TEXT NOT NULL,
+            weekday INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            value REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            first_seen REAL NOT NULL,
+            PRIMARY KEY (city, weekday, hour)
+        ) WITHOUT ROWID
+    ''')
+
+    rows = cursor.execute('''
+        SELECT city, canada_time, timestamp
+        FROM processed
+        WHERE city IS NOT NULL AND is_gone_processed = 0
+        ORDER BY timestamp
+    ''').fetchall()
+
+    for city, canada_time_str, timestamp in rows:
+        try:
+            canada_time = _parse_canada_time(canada_time_str, timestamp)
+        except (TypeError, ValueError):
+            continue
+        if canada_time.tzinfo is None:
+            canada_time = CANADA_TZ.localize(canada_time)
+        _forecast_cell_op(cursor, city, canada_time)
+
+
+def _migration_007_daily_stats(cursor):
+    """Денні агрегати для рядків, старших за гаряче вікно"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            local_date TEXT NOT NULL,
+            city TEXT NOT NULL,
+            service TEXT NOT NULL DEFAULT '',
+            messages INTEGER NOT NULL DEFAULT 0,
+            slots INTEGER NOT NULL DEFAULT 0,
+            hours TEXT NOT NULL DEFAULT '{}',
+            PRIMARY KEY (local_date, city, service)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _migration_008_slots(cursor):
+    """Нормалізовані слоти: рядок на кожну пару дата/час оголошення"""
+    # Рядки не видаляються разом із processed при згортанні — це історія слотів.
+    # Старі записи не заповнюються: часи раніше не зберігались взагалі.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS slots (
+            msg_id INTEGER NOT NULL,
+            slot_date TEXT NOT NULL,
+            slot_time TEXT NOT NULL DEFAULT '',
+            city TEXT NOT NULL,
+            service TEXT NOT NULL DEFAULT '',
+            announced_date TEXT NOT NULL,
+            PRIMARY KEY (msg_id, slot_date, slot_time)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_slots_city
+        ON slots (city, slot_date, slot_time, announced_date)
+    ''')
+
+
+def _migration_009_sent_posts_text(cursor):
+    """Текст поста — щоб відредагувати його на місці, коли слоти зайняті"""
+    cursor.execute('ALTER TABLE sent_posts ADD COLUMN text TEXT')
+
+
+def _migration_010_outbox(cursor):
+    """Довговічна черга ingest → publisher для роздільного режиму"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            msg_id INTEGER NOT NULL UNIQUE,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            claimed_until REAL NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _migration_011_slot_lifetimes(cursor):
+    """Скільки слоти були відкриті (з "зайнято") і наша затримка оголошення"""
+    # Від отримання повідомлення джерела до посту в каналах, мс
+    cursor.execute('ALTER TABLE processed ADD COLUMN latency_ms REAL')
+    # Рядок на кожне "зайнято"; послуга й затримка копіюються з оголошення,
+    # бо processed згортається, а це історія (як slots)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS slot_lifetimes (
+            gone_msg_id INTEGER PRIMARY KEY,
+            msg_id INTEGER,
+            city TEXT NOT NULL,
+            service TEXT NOT NULL DEFAULT '',
+            lifetime_seconds INTEGER NOT NULL,
+            latency_ms REAL,
+            local_date TEXT NOT NULL,
+            hour INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_slot_lifetimes_date
+        ON slot_lifetimes (local_date)
+    ''')
+
+
+def _migration_012_stats_index(cursor):
+    """
+    Статистика рахує і оголошення, чиї слоти вже зайняті (is_gone_processed
+    лише прибирає їх з антидубля), тож індекс статистики — від timestamp
+    """
+    cursor.execute('DROP INDEX IF EXISTS idx_processed_stats')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_processed_timeline
+        ON processed (timestamp, city, service, slots_count, canada_time)
+    ''')
+
+
+MIGRATIONS = [
+    (1, 'Таблиця processed', _migration_001_processed_table),
+    (2, 'Заповнення старих записів', _migration_002_backfill),
+    (3, 'Індекси processed', _migration_003_indexes),
+    (4, 'Агрегати hourly_stats (порожня)', _migration_004_hourly_stats),
+    (5, 'Таблиця sent_posts', _migration_005_sent_posts),
+    (6, 'Прогноз forecast_cells', _migration_006_forecast_cells),
+    (7, 'Денні агрегати daily_stats', _migration_007_daily_stats),
+    (8, 'Таблиця slots', _migration_008_slots),
+    (9, 'Текст у sent_posts', _migration_009_sent_posts_text),
+    (10, 'Черга outbox', _migration_010_outbox),
+    (11, 'Тривалість слотів slot_lifetimes', _migration_011_slot_lifetimes),
+    (12, 'Індекс статистики без is_gone_processed', _migration_012_stats_index),
+]
+
+
+def get_schema_version(cursor) -> int:
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return cursor.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
 def init_db():
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS processed (
-                msg_id INTEGER PRIMARY KEY,
-                content_hash TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                city TEXT,
-                service TEXT,
-                slots_count INTEGER,
-                available_dates TEXT,
-                canada_time DATETIME,
-                sent_msg_id INTEGER,
-                is_gone_processed BOOLEAN DEFAULT 0
-            )
-        ''')
-        
-        # Міграція існуючих колонок
-        existing_columns = [row[1] for row in cursor.execute("PRAGMA table_info(processed)").fetchall()]
-        
-        columns_to_add = [
-            ('city', 'TEXT'),
-            ('service', 'TEXT'),
-            ('slots_count', 'INTEGER'),
-            ('available_dates', 'TEXT'),
-            ('canada_time', 'DATETIME'),
-            ('sent_msg_id', 'INTEGER'),
-            ('is_gone_processed', 'BOOLEAN DEFAULT 0')
-        ]
-        
-        for column_name, column_type in columns_to_add:
-            if column_name not in existing_columns:
-                try:
-                    cursor.execute(f'ALTER TABLE processed ADD COLUMN {column_name} {column_type}')
-                    print(f"✅ Додано колонку {column_name}")
-                except sqlite3.OperationalError:
-                    pass
-        
-        conn.commit()
+    """Застосовує всі нові міграції по черзі"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    current_version = get_schema_version(cursor)
+
+    for version, name, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        with conn:
+            cursor.execute('BEGIN IMMEDIATE')
+            # Процеси роздільного режиму стартують одночасно: поки чекали
+            # блокування, цю міграцію міг застосувати інший
+            current_version = get_schema_version(cursor)
+            if version <= current_version:
+                continue
+            migrate(cursor)
+            cursor.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (version, name))
+        log.info(f"✅ Міграція {version}: {name}")
 
 def is_processed(msg_id: int) -> bool:
-    with sqlite3.connect(DB_FILE) as conn:
+    conn = get_connection()
+    with conn:
         cursor = conn.cursor()
         cursor.execute('SELECT 1 FROM processed WHERE msg_id = ?', (msg_id,))
         return cursor.fetchone() is not None
@@ -56,7 +417,8 @@ def is_content_processed_recently(content_hash: str, minutes: int = 30) -> bool:
     if not content_hash:
         return False
         
-    with sqlite3.connect(DB_FILE) as conn:
+    conn = get_connection()
+    with conn:
         cursor = conn.cursor()
         time_limit = datetime.now() - timedelta(minutes=minutes)
         time_limit_str = time_limit.strftime('%Y-%m-%d %H:%M:%S')
@@ -69,43 +431,30 @@ def is_content_processed_recently(content_hash: str, minutes: int = 30) -> bool:
         result = cursor.fetchone() is not None
         
         if result:
-            print(f"🕒 Контент з хешем {content_hash[:8]}... вже публікувався протягом останніх {minutes} хвилин")
+            log.debug(f"🕒 Контент з хешем {content_hash[:8]}... вже публікувався протягом останніх {minutes} хвилин")
         else:
-            print(f"✅ Контент з хешом {content_hash[:8]}... можна публікувати")
+            log.debug(f"✅ Контент з хешом {content_hash[:8]}... можна публікувати")
             
         return result
 
 def mark_processed(msg_id: int, content_hash: str = None):
-    with sqlite3.connect(DB_FILE) as conn:
+    conn = get_connection()
+    with conn:
         cursor = conn.cursor()
         cursor.execute('INSERT OR IGNORE INTO processed (msg_id, content_hash) VALUES (?, ?)', 
                       (msg_id, content_hash))
         conn.commit()
 
 def mark_processed_with_stats(msg_id: int, content_hash: str, city: str = None, service: str = None, slots_count: int = None, available_dates: list = None):
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        canada_time = datetime.now(pytz.UTC).astimezone(CANADA_TZ)
-        
-        cursor.execute('''
-            INSERT OR IGNORE INTO processed 
-            (msg_id, content_hash, city, service, slots_count, available_dates, canada_time, is_gone_processed) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, 0)
-        ''', (msg_id, content_hash, city, service, slots_count, 
-              str(available_dates) if available_dates else None, canada_time.isoformat()))
-        conn.commit()
+    write_batch([(insert_processed_op, (msg_id, content_hash, city, service, slots_count, available_dates), {})])
 
 def save_sent_message(content_hash: str, sent_msg_id: int):
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE processed SET sent_msg_id = ? WHERE content_hash = ? AND is_gone_processed = 0
-        ''', (sent_msg_id, content_hash))
-        conn.commit()
+    write_batch([(save_sent_message_op, (content_hash, sent_msg_id), {})])
 
 def get_sent_message_id_by_city(city: str):
     """Знаходить останнє активне повідомлення для міста"""
-    with sqlite3.connect(DB_FILE) as conn:
+    conn = get_connection()
+    with conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT sent_msg_id, content_hash FROM processed 
@@ -117,20 +466,12 @@ def get_sent_message_id_by_city(city: str):
 
 def mark_gone_processed(content_hash: str, gone_msg_id: int):
     """Позначає що для цього контенту оброблено повідомлення про зайнятість"""
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE processed SET is_gone_processed = 1 WHERE content_hash = ?
-        ''', (content_hash,))
-        # Додаємо запис про "gone" повідомлення
-        cursor.execute('''
-            INSERT OR IGNORE INTO processed (msg_id, is_gone_processed) VALUES (?, 1)
-        ''', (gone_msg_id,))
-        conn.commit()
+    write_batch([(mark_gone_processed_op, (content_hash, gone_msg_id), {})])
 
 def cleanup_old_records(days: int = 30):
     """Видаляє записи старше вказаної кількості днів"""
-    with sqlite3.connect(DB_FILE) as conn:
+    conn = get_connection()
+    with conn:
         cursor = conn.cursor()
         cursor.execute('''
             DELETE FROM processed 
@@ -142,7 +483,8 @@ def cleanup_old_records(days: int = 30):
 
 def get_recent_publications(hours: int = 24):
     """Показує останні публікації для діагностики"""
-    with sqlite3.connect(DB_FILE) as conn:
+    conn = get_connection()
+    with conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT msg_id, content_hash, timestamp, city, service, slots_count
@@ -154,7 +496,8 @@ def get_recent_publications(hours: int = 24):
 
 def get_statistics_data(days: int = 30):
     """Отримує дані для статистики"""
-    with sqlite3.connect(DB_FILE) as conn:
+    conn = get_connection()
+    with conn:
         cursor = conn.cursor()
         since_date = datetime.now() - timedelta(days=days)
         
@@ -163,8 +506,593 @@ def get_statistics_data(days: int = 30):
             FROM processed 
             WHERE city IS NOT NULL 
               AND timestamp >= ?
-              AND is_gone_processed = 0
             ORDER BY timestamp DESC
         ''', (since_date.strftime('%Y-%m-%d %H:%M:%S'),))
         
-        return cursor.fetchall()
\ No newline at end of file
+        return cursor.fetchall()
+
+def get_statistics_history(days: int = 30):
+    """
+    Ті самі рядки, що й get_statistics_data, для колонкової статистики:
+    [(епоха UTC, місто, послуга, слотів)] — дата розбирається в SQLite, а не в Python
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        since_date = datetime.now() - timedelta(days=days)
+        cursor.execute('''
+            SELECT CAST(strftime('%s', timestamp) AS INTEGER), city, service, COALESCE(slots_count, 0)
+            FROM processed
+            WHERE city IS NOT NULL
+              AND timestamp >= ?
+        ''', (since_date.strftime('%Y-%m-%d %H:%M:%S'),))
+        return cursor.fetchall()
+
+
+# ============================================================
+# ЗАПИСИ ПАЧКАМИ
+# ============================================================
+# *_op-функції працюють з курсором всередині чужої транзакції і можуть
+# повернути дію, яку треба виконати після коміту (оновлення in-memory стану).
+# write_batch виконує будь-яку кількість таких операцій одним комітом.
+
+def _slot_date(date_str):
+    """'17.08.2025' -> '2025-08-17' (сортується і рахується в SQL)"""
+    try:
+        return datetime.strptime(date_str, '%d.%m.%Y').date().isoformat()
+    except ValueError:
+        return date_str
+
+def insert_processed_op(cursor, msg_id: int, content_hash: str, city: str = None, service: str = None,
+                        slots_count: int = None, available_dates: list = None, sent_msg_id: int = None,
+                        slots=None, latency_ms: float = None):
+    """
+    slots: ((дата, (час, ...)), ...); лише available_dates — слоти без часу.
+    latency_ms — від отримання повідомлення джерела до посту в каналах.
+    """
+    canada_time = datetime.now(pytz.UTC).astimezone(CANADA_TZ)
+
+    cursor.execute('''
+        INSERT OR IGNORE INTO processed 
+        (msg_id, content_hash, city, service, slots_count, canada_time, sent_msg_id, is_gone_processed, latency_ms) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)
+    ''', (msg_id, content_hash, city, service, slots_count, canada_time.isoformat(), sent_msg_id, latency_ms))
+
+    if cursor.rowcount != 1 or not city:
+        return None
+
+    if slots is None and available_dates:
+        slots = [(date, ()) for date in available_dates]
+    if slots:
+        announced_date = canada_time.date().isoformat()
+        cursor.executemany('''
+            INSERT OR IGNORE INTO slots (msg_id, slot_date, slot_time, city, service, announced_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(msg_id, _slot_date(date), slot_time, city, service or '', announced_date)
+              for date, times in slots for slot_time in (times or ('',))])
+
+    # Клітинку прогнозу оновлюємо в тій самій транзакції
+    cell = _forecast_cell_op(cursor, city, canada_time)
+
+    return functools.partial(_after_stats_insert, cell)
+
+def _after_stats_insert(cell):
+    global _stats_version
+    _stats_version += 1
+    forecast_index.set_cell(*cell)
+
+def save_sent_message_op(cursor, content_hash: str, sent_msg_id: int):
+    cursor.execute('''
+        UPDATE processed SET sent_msg_id = ? WHERE content_hash = ? AND is_gone_processed = 0
+    ''', (sent_msg_id, content_hash))
+
+def insert_sent_posts_op(cursor, msg_id: int, city: str, content_hash: str, posts, text: str = None):
+    """posts: [(chat_id, sent_msg_id), ...] — по одному рядку на чат"""
+    cursor.executemany('''
+        INSERT OR REPLACE INTO sent_posts (msg_id, chat_id, sent_msg_id, city, content_hash, text)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(msg_id, str(chat_id), sent_msg_id, city, content_hash, text) for chat_id, sent_msg_id in posts])
+
+def update_sent_posts_text_op(cursor, msg_id: int, text: str):
+    """Пост відредаговано (злиті слоти) — зберігаємо актуальний текст"""
+    cursor.execute('UPDATE sent_posts SET text = ? WHERE msg_id = ?', (text, msg_id))
+
+def mark_gone_processed_op(cursor, content_hash: str, gone_msg_id: int, msg_id: int = None):
+    """
+    msg_id — оголошення, чиї пости в каналах тепер неактивні.
+    is_gone_processed лише знімає хеш з антидубля — статистика рядок рахує далі.
+    """
+    cursor.execute('''
+        UPDATE processed SET is_gone_processed = 1 WHERE content_hash = ?
+    ''', (content_hash,))
+    if msg_id is not None:
+        cursor.execute('UPDATE sent_posts SET is_gone = 1 WHERE msg_id = ?', (msg_id,))
+    # Додаємо запис про "gone" повідомлення
+    cursor.execute('''
+        INSERT OR IGNORE INTO processed (msg_id, is_gone_processed) VALUES (?, 1)
+    ''', (gone_msg_id,))
+
+def lifetime_key(lifetime_seconds: int):
+    """(local_date, hour) відкриття вікна: момент "зайнято" мінус тривалість"""
+    return _local_date_hour(datetime.now(pytz.UTC).astimezone(CANADA_TZ) - timedelta(seconds=lifetime_seconds))
+
+def insert_slot_lifetime_op(cursor, gone_msg_id: int, city: str, lifetime_seconds: int, msg_id: int = None):
+    """msg_id — оголошення, що відкрило вікно; його послуга й затримка копіюються"""
+    local_date, hour = lifetime_key(lifetime_seconds)
+    cursor.execute('''
+        INSERT OR IGNORE INTO slot_lifetimes
+        (gone_msg_id, msg_id, city, service, lifetime_seconds, latency_ms, local_date, hour)
+        VALUES (?, ?, ?,
+                COALESCE((SELECT service FROM processed WHERE msg_id = ?), ''),
+                ?,
+                (SELECT latency_ms FROM processed WHERE msg_id = ?),
+                ?, ?)
+    ''', (gone_msg_id, msg_id, city, msg_id, lifetime_seconds, msg_id, local_date, hour))
+
+def enqueue_outbox_op(cursor, msg_id: int, kind: str, payload: dict):
+    """Запис у чергу; повторний msg_id (догін після рестарту) ігнорується"""
+    cursor.execute('''
+        INSERT OR IGNORE INTO outbox (msg_id, kind, payload, created_at) VALUES (?, ?, ?, ?)
+    ''', (msg_id, kind, json.dumps(payload, ensure_ascii=False), time.time()))
+
+def ack_outbox_op(cursor, outbox_id: int):
+    """Видаляє оброблений запис — у тій самій пачці, що й рядок processed"""
+    cursor.execute('DELETE FROM outbox WHERE id = ?', (outbox_id,))
+
+def write_batch(ops):
+    """Виконує список (op, args, kwargs) однією транзакцією"""
+    conn = get_connection()
+    after_commit = []
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        for op, args, kwargs in ops:
+            action = op(cursor, *args, **kwargs)
+            if action:
+                after_commit.append(action)
+
+    for action in after_commit:
+        action()
+    return len(ops)
+
+def claim_outbox(limit: int = 50, visibility_seconds: float = 60):
+    """
+    Забирає до `limit` записів у порядку надходження і ховає їх на
+    visibility_seconds. Якщо publisher впав до ack — записи знову стануть
+    видимими й будуть оброблені повторно (at-least-once).
+    Повертає [(id, msg_id, kind, payload, attempts)].
+    """
+    now = time.time()
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        rows = cursor.execute('''
+            SELECT id, msg_id, kind, payload, attempts FROM outbox
+            WHERE claimed_until < ?
+            ORDER BY id LIMIT ?
+        ''', (now, limit)).fetchall()
+        cursor.executemany('''
+            UPDATE outbox SET claimed_until = ?, attempts = attempts + 1 WHERE id = ?
+        ''', [(now + visibility_seconds, row[0]) for row in rows])
+        return [(outbox_id, msg_id, kind, json.loads(payload), attempts + 1)
+                for outbox_id, msg_id, kind, payload, attempts in rows]
+
+def get_outbox_depth() -> int:
+    conn = get_connection()
+    return conn.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+def get_processed_watermark():
+    """Найбільший msg_id у processed — версія статистики між процесами"""
+    conn = get_connection()
+    return conn.execute('SELECT MAX(msg_id) FROM processed').fetchone()[0]
+
+def checkpoint_db(mode: str = 'TRUNCATE'):
+    """Переносить WAL в основний файл БД (для надійного завершення)"""
+    conn = get_connection()
+    return conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+
+def compact_processed_batch(hot_days: int = HOT_DAYS, batch: int = 5000) -> int:
+    """
+    Згортає до `batch` сирих рядків, старших за hot_days, у daily_stats
+    (по днях Канади: повідомлення, слоти, гістограма годин) і видаляє їх.
+    Останній msg_id лишається завжди — це позиція джерела.
+    Повертає кількість видалених рядків (0 — більше нема чого згортати).
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        rows = cursor.execute('''
+            SELECT msg_id, city, service, slots_count, canada_time, timestamp
+            FROM processed
+            WHERE timestamp < datetime('now', '-' || ? || ' days')
+              AND msg_id < (SELECT MAX(msg_id) FROM processed)
+            LIMIT ?
+        ''', (hot_days, batch)).fetchall()
+        if not rows:
+            return 0
+
+        totals = {}
+        for msg_id, city, service, slots, canada_time_str, timestamp in rows:
+            # Рядки-маркери "зайнято" без міста; оголошення враховуються, навіть якщо слоти вже зайняті
+            if not city:
+                continue
+            try:
+                canada_time = _parse_canada_time(canada_time_str, timestamp)
+            except (TypeError, ValueError):
+                continue
+            counts = totals.setdefault((canada_time.date().isoformat(), city, service or ''), [0, 0, {}])
+            counts[0] += 1
+            counts[1] += slots or 0
+            counts[2][str(canada_time.hour)] = counts[2].get(str(canada_time.hour), 0) + 1
+
+        for key, (messages, slots, hours) in totals.items():
+            existing = cursor.execute('''
+                SELECT messages, slots, hours FROM daily_stats
+                WHERE local_date = ? AND city = ? AND service = ?
+            ''', key).fetchone()
+            if existing:
+                messages += existing[0]
+                slots += existing[1]
+                for hour, count in json.loads(existing[2]).items():
+                    hours[hour] = hours.get(hour, 0) + count
+            cursor.execute('''
+                INSERT OR REPLACE INTO daily_stats (local_date, city, service, messages, slots, hours)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (*key, messages, slots, json.dumps(hours, sort_keys=True)))
+
+        msg_ids = [(row[0],) for row in rows]
+        cursor.executemany('DELETE FROM processed WHERE msg_id = ?', msg_ids)
+        cursor.executemany('DELETE FROM sent_posts WHERE msg_id = ?', msg_ids)
+        return len(rows)
+
+def compact_processed(hot_days: int = HOT_DAYS, batch: int = 5000) -> int:
+    """Згортає всі старі рядки короткими транзакціями, щоб не тримати записувача"""
+    total = 0
+    while True:
+        deleted = compact_processed_batch(hot_days, batch)
+        total += deleted
+        if deleted < batch:
+            return total
+
+def enable_incremental_vacuum() -> bool:
+    """
+    Вмикає auto_vacuum=INCREMENTAL. Для вже створеної БД режим застосовується
+    лише після повного VACUUM, тож це робиться один раз (у тихі години).
+    Повертає True, якщо знадобився VACUUM.
+    """
+    conn = get_connection()
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return False
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    return True
+
+def incremental_vacuum(pages: int = 0):
+    """Повертає ОС вільні сторінки (0 — усі); повертає кількість вільних сторінок до цього"""
+    conn = get_connection()
+    free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+    return free_pages
+
+def get_stats_version() -> int:
+    """Змінюється щоразу, коли додається новий рядок зі слотами"""
+    return _stats_version
+
+def get_daily_stats(days: int = 30):
+    """Згорнуті дні (старші за гаряче вікно) за останні N днів"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        since_date = (datetime.now(CANADA_TZ) - timedelta(days=days)).date().isoformat()
+        cursor.execute('''
+            SELECT city, service, messages, slots, hours
+            FROM daily_stats
+            WHERE local_date >= ?
+        ''', (since_date,))
+        return cursor.fetchall()
+
+def get_slot_lifetimes(days: int = 30):
+    """[(місто, послуга, година відкриття, секунд, затримка мс або None)] за останні N днів"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        since_date = (datetime.now(CANADA_TZ) - timedelta(days=days)).date().isoformat()
+        cursor.execute('''
+            SELECT city, service, hour, lifetime_seconds, latency_ms
+            FROM slot_lifetimes
+            WHERE local_date >= ?
+        ''', (since_date,))
+        return cursor.fetchall()
+
+def _slots_filter(city, days):
+    since_date = (datetime.now(CANADA_TZ) - timedelta(days=days)).date().isoformat()
+    if city:
+        return 'WHERE city = ? AND announced_date >= ?', (city, since_date)
+    return 'WHERE announced_date >= ?', (since_date,)
+
+def get_top_slot_dates(city: str = None, days: int = 30, limit: int = 5):
+    """Дати слотів, що з'являлись найчастіше: [(slot_date, кількість)]"""
+    where, params = _slots_filter(city, days)
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT slot_date, COUNT(*) FROM slots {where}
+            GROUP BY slot_date ORDER BY COUNT(*) DESC, slot_date LIMIT ?
+        ''', (*params, limit))
+        return cursor.fetchall()
+
+def get_top_slot_times(city: str = None, days: int = 30, limit: int = 5):
+    """Години прийому, що з'являлись найчастіше: [(slot_time, кількість)]"""
+    where, params = _slots_filter(city, days)
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT slot_time, COUNT(*) FROM slots {where} AND slot_time != ''
+            GROUP BY slot_time ORDER BY COUNT(*) DESC, slot_time LIMIT ?
+        ''', (*params, limit))
+        return cursor.fetchall()
+
+def get_slot_lead_times(city: str = None, days: int = 30):
+    """Розподіл "за скільки днів до прийому з'явився слот": [(днів, кількість)]"""
+    where, params = _slots_filter(city, days)
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT CAST(julianday(slot_date) - julianday(announced_date) AS INTEGER) AS lead_days, COUNT(*)
+            FROM slots {where}
+            GROUP BY lead_days ORDER BY lead_days
+        ''', params)
+        return cursor.fetchall()
+
+def get_processed_ids(msg_ids):
+    """Які з переданих msg_id вже є в processed — одним запитом на пачку"""
+    msg_ids = list(msg_ids)
+    found = set()
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        # Ліміт параметрів SQLite — ділимо на шматки
+        for start in range(0, len(msg_ids), 900):
+            chunk = msg_ids[start:start + 900]
+            cursor.execute(f'''
+                SELECT msg_id FROM processed WHERE msg_id IN ({', '.join('?' * len(chunk))})
+            ''', chunk)
+            found.update(row[0] for row in cursor.fetchall())
+        return found
+
+def get_active_posts(hours: int = 24):
+    """Пости, ще не позначені як зайняті, за останні N годин"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT msg_id, chat_id, sent_msg_id, city, content_hash, text, created_at
+            FROM sent_posts
+            WHERE is_gone = 0 AND created_at > datetime('now', '-' || ? || ' hours')
+            ORDER BY created_at
+        ''', (hours,))
+        return cursor.fetchall()
+
+def get_forecast_cells():
+    """Знімок прогнозу: (рядки комірок, момент першого спостереження)"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT city, weekday, hour, value, updated_at FROM forecast_cells')
+        rows = cursor.fetchall()
+        since = cursor.execute('SELECT MIN(first_seen) FROM forecast_cells').fetchone()[0]
+        return rows, since
+
+def get_dedup_state(minutes: int = 60, max_ids: int = 5000):
+    """Дані для прогріву кешу антидублів: останні msg_id та свіжі хеші контенту"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT msg_id FROM processed ORDER BY msg_id DESC LIMIT ?
+        ''', (max_ids,))
+        msg_ids = [row[0] for row in cursor.fetchall()]
+
+        # timestamp зберігається в UTC (CURRENT_TIMESTAMP)
+        cursor.execute('''
+            SELECT content_hash, MAX(timestamp) FROM processed
+            WHERE content_hash IS NOT NULL
+              AND timestamp > datetime('now', '-' || ? || ' minutes')
+              AND is_gone_processed = 0
+            GROUP BY content_hash
+        ''', (minutes,))
+        content_hashes = cursor.fetchall()
+
+        return msg_ids, content_hashes
+
+# ============================================================
+# ASYNC-ВЕРСІЇ (не блокують event loop)
+# ============================================================
+
+async def init_db_async():
+    return await run_write(init_db)
+
+async def is_processed_async(msg_id: int) -> bool:
+    return await run_read(is_processed, msg_id)
+
+async def is_content_processed_recently_async(content_hash: str, minutes: int = 30) -> bool:
+    return await run_read(is_content_processed_recently, content_hash, minutes)
+
+async def mark_processed_async(msg_id: int, content_hash: str = None):
+    return await run_write(mark_processed, msg_id, content_hash)
+
+async def mark_processed_with_stats_async(msg_id: int, content_hash: str, city: str = None, service: str = None, slots_count: int = None, available_dates: list = None):
+    return await run_write(mark_processed_with_stats, msg_id, content_hash, city, service, slots_count, available_dates)
+
+async def save_sent_message_async(content_hash: str, sent_msg_id: int):
+    return await run_write(save_sent_message, content_hash, sent_msg_id)
+
+async def get_sent_message_id_by_city_async(city: str):
+    return await run_read(get_sent_message_id_by_city, city)
+
+async def mark_gone_processed_async(content_hash: str, gone_msg_id: int):
+    return await run_write(mark_gone_processed, content_hash, gone_msg_id)
+
+async def cleanup_old_records_async(days: int = 30):
+    return await run_write(cleanup_old_records, days)
+
+async def get_recent_publications_async(hours: int = 24):
+    return await run_read(get_recent_publications, hours)
+
+async def get_statistics_data_async(days: int = 30):
+    return await run_read(get_statistics_data, days)
+
+async def get_statistics_history_async(days: int = 30):
+    return await run_read(get_statistics_history, days)
+
+async def write_batch_async(ops):
+    return await run_write(write_batch, ops)
+
+async def claim_outbox_async(limit: int = 50, visibility_seconds: float = 60):
+    return await run_write(claim_outbox, limit, visibility_seconds)
+
+async def get_outbox_depth_async() -> int:
+    return await run_read(get_outbox_depth)
+
+async def get_processed_watermark_async():
+    return await run_read(get_processed_watermark)
+
+async def checkpoint_db_async(mode: str = 'TRUNCATE'):
+    return await run_write(checkpoint_db, mode)
+
+async def compact_processed_async(hot_days: int = HOT_DAYS, batch: int = 5000):
+    """Як compact_processed, але кожна пачка — окреме завдання записувача,
+    тож записи хендлера проходять між пачками"""
+    total = 0
+    while True:
+        deleted = await run_write(compact_processed_batch, hot_days, batch)
+        total += deleted
+        if deleted < batch:
+            return total
+
+async def enable_incremental_vacuum_async():
+    return await run_write(enable_incremental_vacuum)
+
+async def incremental_vacuum_async(pages: int = 0):
+    return await run_write(incremental_vacuum, pages)
+
+async def get_daily_stats_async(days: int = 30):
+    return await run_read(get_daily_stats, days)
+
+async def get_slot_lifetimes_async(days: int = 30):
+    return await run_read(get_slot_lifetimes, days)
+
+async def get_top_slot_dates_async(city: str = None, days: int = 30, limit: int = 5):
+    return await run_read(get_top_slot_dates, city, days, limit)
+
+async def get_top_slot_times_async(city: str = None, days: int = 30, limit: int = 5):
+    return await run_read(get_top_slot_times, city, days, limit)
+
+async def get_slot_lead_times_async(city: str = None, days: int = 30):
+    return await run_read(get_slot_lead_times, city, days)
+
+async def get_processed_ids_async(msg_ids):
+    return await run_read(get_processed_ids, msg_ids)
+
+async def get_active_posts_async(hours: int = 24):
+    return await run_read(get_active_posts, hours)
+
+async def get_forecast_cells_async():
+    return await run_read(get_forecast_cells)
+
+async def load_forecast_index():
+    """Прогріває in-memory прогноз зі знімка forecast_cells"""
+    rows, since = await get_forecast_cells_async()
+    forecast_index.load(rows, since)
+
+async def get_dedup_state_async(minutes: int = 60, max_ids: int = 5000):
+    return await run_read(get_dedup_state, minutes, max_ids)
+
+
+# ============================================================
+# ПЕРЕВІРКА ІНДЕКСІВ
+# ============================================================
+
+HOT_QUERIES = {
+    'is_content_processed_recently': ('''
+        SELECT 1 FROM processed
+        WHERE content_hash = ? AND timestamp > ? AND is_gone_processed = 0
+    ''', ('hash', '2000-01-01 00:00:00')),
+    'save_sent_message': ('''
+        UPDATE processed SET sent_msg_id = ? WHERE content_hash = ? AND is_gone_processed = 0
+    ''', (1, 'hash')),
+    'mark_gone_processed': ('''
+        UPDATE processed SET is_gone_processed = 1 WHERE content_hash = ?
+    ''', ('hash',)),
+    'get_sent_message_id_by_city': ('''
+        SELECT sent_msg_id, content_hash FROM processed
+        WHERE city = ? AND sent_msg_id IS NOT NULL AND is_gone_processed = 0
+        ORDER BY timestamp DESC LIMIT 1
+    ''', ('city',)),
+    'get_statistics_data': ('''
+        SELECT city, service, slots_count, canada_time, timestamp
+        FROM processed
+        WHERE city IS NOT NULL
+          AND timestamp >= ?
+        ORDER BY timestamp DESC
+    ''', ('2000-01-01 00:00:00',)),
+    'get_statistics_history': ('''
+        SELECT CAST(strftime('%s', timestamp) AS INTEGER), city, service, COALESCE(slots_count, 0)
+        FROM processed
+        WHERE city IS NOT NULL
+          AND timestamp >= ?
+    ''', ('2000-01-01 00:00:00',)),
+    'get_slot_lifetimes': ('''
+        SELECT city, service, hour, lifetime_seconds, latency_ms
+        FROM slot_lifetimes
+        WHERE local_date >= ?
+    ''', ('2000-01-01',)),
+}
+
+
+def explain_query_plans():
+    """Повертає EXPLAIN QUERY PLAN для гарячих запитів"""
+    conn = get_connection()
+    plans = {}
+    for name, (query, params) in HOT_QUERIES.items():
+        rows = conn.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()
+        plans[name] = [row[-1] for row in rows]
+    return plans
+
+
+def test_query_plans():
+    """Перевіряє, що гарячі запити використовують індекси, а не повний скан"""
+    print("🧪 ПЕРЕВІРКА ПЛАНІВ ЗАПИТІВ")
+    print("=" * 60)
+
+    failed = []
+    for name, plan in explain_query_plans().items():
+        uses_index = any('USING' in step and 'INDEX' in step for step in plan)
+        full_scan = any(step.startswith('SCAN processed') and 'INDEX' not in step for step in plan)
+        temp_sort = any('TEMP B-TREE' in step for step in plan)
+        ok = uses_index and not full_scan and not temp_sort
+        print(f"{'✅' if ok else '❌'} {name}: {' | '.join(plan)}")
+        if not ok:
+            failed.append(name)
+
+    print("=" * 60)
+    return not failed
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        DB_FILE = os.path.join(tmp_dir, 'plans.db')
+        init_db()
+        passed = test_query_plans()
+        close_db()
+
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,111 @@
+import time
+import calendar
+from collections import OrderedDict
+from datetime import datetime
+
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# Вікно антидубля за контентом (хвилини) — як у is_content_processed_recently
+CONTENT_WINDOW_MINUTES = 60
+# Скільки останніх msg_id тримаємо в пам'яті
+MAX_MSG_IDS = 5000
+
+
+class DedupCache:
+    """
+    In-memory індекс антидублів перед сховищем.
+
+    - обмежений набір останніх msg_id (OrderedDict як LRU за порядком вставки);
+    - впорядкована за часом мапа content_hash → час останньої появи,
+      записи старші за вікно видаляються з голови.
+
+    Рішення "дубль чи ні" приймається за O(1) в пам'яті, сховище потрібне лише
+    для збереження (write-through робить викликач).
+    """
+
+    def __init__(self, storage, window_minutes=CONTENT_WINDOW_MINUTES, max_msg_ids=MAX_MSG_IDS):
+        self.storage = storage
+        self.window_seconds = window_minutes * 60
+        self.max_msg_ids = max_msg_ids
+        self._msg_ids = OrderedDict()
+        self._content = OrderedDict()
+        # msg_id у джерелі зростають монотонно: все, що не новіше за
+        # найстаріший витіснений id, вважаємо вже обробленим
+        self._evicted_up_to = 0
+        # Найбільший оброблений msg_id — звідси продовжує догін після розриву
+        self.last_msg_id = 0
+
+    # --- msg_id ---
+
+    def is_processed(self, msg_id: int) -> bool:
+        return msg_id in self._msg_ids or msg_id <= self._evicted_up_to
+
+    def mark_processed(self, msg_id: int):
+        if msg_id in self._msg_ids:
+            return
+        if msg_id > self.last_msg_id:
+            self.last_msg_id = msg_id
+        self._msg_ids[msg_id] = None
+        while len(self._msg_ids) > self.max_msg_ids:
+            evicted, _ = self._msg_ids.popitem(last=False)
+            self._evicted_up_to = max(self._evicted_up_to, evicted)
+
+    # --- content_hash ---
+
+    def _expire(self, now):
+        limit = now - self.window_seconds
+        while self._content:
+            content_hash, seen_at = next(iter(self._content.items()))
+            if seen_at > limit:
+                break
+            self._content.popitem(last=False)
+
+    def is_content_recent(self, content_hash: str, now: float = None) -> bool:
+        if not content_hash:
+            return False
+        now = time.time() if now is None else now
+        self._expire(now)
+        seen_at = self._content.get(content_hash)
+        return seen_at is not None and seen_at > now - self.window_seconds
+
+    def mark_content(self, content_hash: str, now: float = None):
+        if not content_hash:
+            return
+        now = time.time() if now is None else now
+        self._content[content_hash] = now
+        self._content.move_to_end(content_hash)
+
+    def forget_content(self, content_hash: str):
+        """Контент більше не блокує публікацію (слоти зайняті або відправка не вдалась)"""
+        self._content.pop(content_hash, None)
+
+    # --- прогрів ---
+
+    def load(self, msg_ids, content_hashes):
+        """Заповнює кеш з рядків сховища (див. Storage.get_dedup_state)"""
+        for msg_id in sorted(msg_ids):
+            self.mark_processed(msg_id)
+        if len(msg_ids) >= self.max_msg_ids:
+            # БД віддала повну сторінку — старіші id теж уже оброблені
+            self._evicted_up_to = max(self._evicted_up_to, min(msg_ids) - 1)
+
+        entries = []
+        for content_hash, timestamp in content_hashes:
+            try:
+                seen_at = calendar.timegm(datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').timetuple())
+            except (TypeError, ValueError):
+                continue
+            entries.append((seen_at, content_hash))
+
+        for seen_at, content_hash in sorted(entries):
+            self.mark_content(content_hash, seen_at)
+        self._expire(time.time())
+
+    async def warm(self):
+        msg_ids, content_hashes = await self.storage.get_dedup_state(
+            self.window_seconds // 60, self.max_msg_ids
+        )
+        self.load(msg_ids, content_hashes)
+        log.info(f"🧠 Кеш антидублів: {len(self._msg_ids)} msg_id, {len(self._content)} хешів")
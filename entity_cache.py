@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import asyncio
+
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# Кеш сутностей Telegram між перезапусками
+ENTITY_CACHE_FILE = os.getenv('ENTITY_CACHE_FILE', 'entity_cache.json')
+
+
+def describe_entity(entity):
+    """Мінімум, потрібний для логів і перевірки: id, назва, username"""
+    return {
+        'id': getattr(entity, 'id', None),
+        'name': getattr(entity, 'title', None) or getattr(entity, 'first_name', None) or 'N/A',
+        'username': getattr(entity, 'username', None),
+        'resolved_at': time.time(),
+    }
+
+
+class EntityCache:
+    """
+    Сутності (джерело, канали), знайдені на попередньому запуску.
+
+    Якщо сутність уже в кеші — старт не чекає на get_entity: запис
+    повертається одразу, а перевірка йде у фоні й оновлює файл. Невдала
+    перевірка прибирає запис, тож наступний старт перевірить синхронно.
+    Ключ включає простір імен клієнта ("user"/"bot"): access_hash у
+    користувача й бота різні.
+    """
+
+    def __init__(self, path=ENTITY_CACHE_FILE):
+        self.path = path
+        self._entries = {}
+        self._tasks = set()
+        try:
+            with open(path, encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            log.warning(f"⚠️ Кеш сутностей пошкоджено, ігнорую: {e}")
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.warning(f"⚠️ Не вдалося зберегти кеш сутностей: {e}")
+
+    async def _fetch(self, client, cache_key, key):
+        info = describe_entity(await client.get_entity(key))
+        self._entries[cache_key] = info
+        self._save()
+        return info
+
+    async def _revalidate(self, client, cache_key, key):
+        try:
+            await self._fetch(client, cache_key, key)
+        except Exception as e:
+            log.error(f"❌ Сутність {key} більше недоступна: {e}")
+            if self._entries.pop(cache_key, None) is not None:
+                self._save()
+
+    async def resolve(self, client, namespace, key):
+        """Опис сутності: з кешу (з фоновою перевіркою) або з мережі"""
+        cache_key = f"{namespace}:{key}"
+        cached = self._entries.get(cache_key)
+        if cached is None:
+            return await self._fetch(client, cache_key, key)
+
+        task = asyncio.ensure_future(self._revalidate(client, cache_key, key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return cached
+
+    async def wait_revalidated(self):
+        """Дочекатися фонових перевірок (бенчмарк, завершення роботи)"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,169 @@
+import os
+import math
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytz
+
+CANADA_TZ = pytz.timezone('America/Toronto')
+
+# Період напіврозпаду ваги старих оголошень (днів)
+FORECAST_HALF_LIFE_DAYS = float(os.getenv('FORECAST_HALF_LIFE_DAYS', '14'))
+# Мінімальна ймовірність, з якою місто потрапляє в попередження
+FORECAST_MIN_PROBABILITY = float(os.getenv('FORECAST_MIN_PROBABILITY', '0.1'))
+
+WEEK_SECONDS = 7 * 24 * 3600
+
+
+def decay_tau(half_life_days=FORECAST_HALF_LIFE_DAYS):
+    return half_life_days * 86400 / math.log(2)
+
+
+def decayed_add(value, updated_at, now_ts, tau, amount=1.0):
+    """Нове значення комірки: старе, згасле до now_ts, плюс amount — O(1)"""
+    if value and updated_at is not None:
+        value *= math.exp(-max(0.0, now_ts - updated_at) / tau)
+    else:
+        value = 0.0
+    return value + amount
+
+
+def cell_key(city, canada_time: datetime):
+    """(city, weekday, hour) за місцевим часом Канади"""
+    return city, canada_time.weekday(), canada_time.hour
+
+
+class ForecastIndex:
+    """
+    Згаслі лічильники оголошень по (місто, день тижня, година).
+
+    Кожна комірка — (value, updated_at): при новому оголошенні значення
+    згасає до поточного моменту і збільшується на 1, тож оновлення O(1).
+    Інтенсивність для комірки — value, поділене на "ефективну кількість
+    тижнів" спостереження (з тим самим згасанням); ймовірність слотів
+    у наступні N хвилин — 1 - exp(-λ) по годинах, які покриває вікно.
+    """
+
+    def __init__(self, half_life_days=FORECAST_HALF_LIFE_DAYS):
+        self.tau = decay_tau(half_life_days)
+        self._lock = threading.Lock()
+        self._cells = {}                    # {(city, weekday, hour): [value, updated_at]}
+        self._slot_cities = defaultdict(set)  # {(weekday, hour): {city}}
+        self.since = None                   # момент першого спостереження (epoch)
+
+    def set_cell(self, city, weekday, hour, value, updated_at):
+        with self._lock:
+            self._cells[(city, weekday, hour)] = [value, updated_at]
+            self._slot_cities[(weekday, hour)].add(city)
+            if self.since is None or updated_at < self.since:
+                self.since = updated_at
+
+    def add(self, city, canada_time: datetime):
+        """Додає оголошення в пам'яті; повертає (city, weekday, hour, value, updated_at)"""
+        key = cell_key(city, canada_time)
+        now_ts = canada_time.timestamp()
+        with self._lock:
+            value, updated_at = self._cells.get(key, (0.0, None))
+        value = decayed_add(value, updated_at, now_ts, self.tau)
+        self.set_cell(*key, value, now_ts)
+        return (*key, value, now_ts)
+
+    def load(self, rows, since=None):
+        """Заповнює зі знімка: рядки (city, weekday, hour, value, updated_at)"""
+        with self._lock:
+            self._cells.clear()
+            self._slot_cities.clear()
+            self.since = None
+        for row in rows:
+            self.set_cell(*row)
+        if since is not None:
+            self.since = min(self.since, since) if self.since is not None else since
+
+    def _exposure(self, now_ts):
+        """Ефективна кількість тижнів спостереження: Σ r^k, r = exp(-тиждень/τ)"""
+        if self.since is None:
+            return 1.0
+        r = math.exp(-WEEK_SECONDS / self.tau)
+        weeks_decay = math.exp(-max(0.0, now_ts - self.since) / self.tau)
+        return max(1.0, (1 - weeks_decay) / (1 - r))
+
+    def _rate(self, city, weekday, hour, now_ts, exposure):
+        cell = self._cells.get((city, weekday, hour))
+        if not cell:
+            return 0.0
+        value, updated_at = cell
+        return value * math.exp(-max(0.0, now_ts - updated_at) / self.tau) / exposure
+
+    def probability(self, city, minutes, now=None):
+        """Ймовірність хоча б одного оголошення в місті за наступні `minutes` хвилин"""
+        now = now or datetime.now(CANADA_TZ)
+        now_ts = now.timestamp()
+        end = now + timedelta(minutes=minutes)
+        expected = 0.0
+        with self._lock:
+            exposure = self._exposure(now_ts)
+            cursor = now
+            while cursor < end:
+                hour_end = cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+                chunk_end = min(hour_end, end)
+                fraction = (chunk_end - cursor).total_seconds() / 3600
+                expected += self._rate(city, cursor.weekday(), cursor.hour, now_ts, exposure) * fraction
+                cursor = chunk_end
+        return 1 - math.exp(-expected)
+
+    def likely_cities(self, weekday, hour, now=None, limit=2, min_probability=FORECAST_MIN_PROBABILITY):
+        """Міста з ймовірністю оголошення протягом години [(city, p)], найімовірніші першими"""
+        now_ts = (now or datetime.now(CANADA_TZ)).timestamp()
+        with self._lock:
+            exposure = self._exposure(now_ts)
+            ranked = []
+            for city in self._slot_cities.get((weekday, hour), ()):
+                p = 1 - math.exp(-self._rate(city, weekday, hour, now_ts, exposure))
+                if p >= min_probability:
+                    ranked.append((city, p))
+        ranked.sort(key=lambda x: x[1], reverse=True)
+        return ranked[:limit]
+
+    def upcoming(self, now=None, hours=3, cities=2):
+        """
+        Найімовірніші години наступної доби: [(hour, [(city, p)])].
+        Кожна година береться з її конкретним днем тижня.
+        """
+        now = now or datetime.now(CANADA_TZ)
+        start = now.replace(minute=0, second=0, microsecond=0)
+        candidates = []
+        for offset in range(1, 25):
+            moment = start + timedelta(hours=offset)
+            likely = self.likely_cities(moment.weekday(), moment.hour, now, limit=cities)
+            if likely:
+                candidates.append((sum(p for _, p in likely), moment.hour, likely))
+        candidates.sort(key=lambda x: x[0], reverse=True)
+        return [(hour, likely) for _, hour, likely in candidates[:hours]]
+
+
+forecast_index = ForecastIndex()
+
+
+def test_forecast():
+    index = ForecastIndex(half_life_days=14)
+    monday_10 = CANADA_TZ.localize(datetime(2025, 8, 4, 10, 5))
+    # Чотири понеділки поспіль о 10:xx — Торонто; один раз Ванкувер
+    for week in range(4):
+        index.add("Торонто", monday_10 + timedelta(weeks=week))
+    index.add("Ванкувер", monday_10 + timedelta(weeks=3, minutes=20))
+
+    now = CANADA_TZ.localize(datetime(2025, 9, 1, 9, 55))  # наступний понеділок
+    p_toronto = index.probability("Торонто", 60, now)
+    p_vancouver = index.probability("Ванкувер", 60, now)
+    assert p_toronto > p_vancouver > 0, (p_toronto, p_vancouver)
+    assert index.probability("Торонто", 60, now + timedelta(days=1)) == 0  # вівторок
+
+    assert [c for c, _ in index.likely_cities(0, 10, now)] == ["Торонто", "Ванкувер"]
+    hour, likely = index.upcoming(now)[0]
+    assert hour == 10 and likely[0][0] == "Торонто"
+    print(f"✅ forecast OK: Торонто {p_toronto:.0%}, Ванкувер {p_vancouver:.0%}")
+
+
+if __name__ == "__main__":
+    test_forecast()
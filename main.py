@@ -1,28 +1,57 @@
 import os
-import re
+import time
 import asyncio
-from datetime import datetime, timedelta
-from collections import defaultdict
-import pytz
+
+# Відлік часу старту — до важких імпортів
+STARTED_PERF = time.perf_counter()
+
 from telethon import TelegramClient, events
 from telethon.tl.custom import Button
 from dotenv import load_dotenv
 
-from parse_like_whore import parse_slot_message, parse_slots_gone_message
-from db import (
-    init_db,
-    is_processed,
-    is_content_processed_recently,
-    get_sent_message_id_by_city,
-    save_sent_message,
-    mark_processed_with_stats,
-    mark_gone_processed,
-    get_statistics_data
+from app_logging import setup_logging, stop_logging, get_logger
+
+from parse_like_whore import (
+    parse_announcement,
+    parse_slots_gone_message,
+    format_slot_message,
+    slot_buttons,
+    SlotAnnouncement
 )
+from storage import open_storage
 from botstatisticshandler import BotStatisticsHandler
+from dedup_cache import DedupCache
+from active_posts import ActivePostIndex, post_opened_at
+from entity_cache import EntityCache
+from catchup import CatchUp
+from coalescer import BurstCoalescer
+from slot_delta import LiveSlotTracker, slot_pairs, NEW, ADDED, REMOVED, SAME
+from write_behind import WriteBehindQueue
+from metrics import (
+    start_metrics_server,
+    SOURCE_DELAY,
+    PARSE_TIME,
+    DEDUP_TIME,
+    SEND_TIME,
+    RECEIPT_TO_POST,
+    STARTUP_TIME,
+    MESSAGES
+)
+from forecast import forecast_index
+from routing import load_routing
+from predictions import PredictionScheduler
+from maintenance import maintenance_task
+from send_queue import (
+    SendScheduler,
+    PRIORITY_NEW_SLOTS,
+    PRIORITY_GONE,
+    PRIORITY_PREDICTION
+)
 
 # === Константи / змінні оточення ===
 load_dotenv()
+setup_logging()
+log = get_logger("slotbot")
 
 api_id = int(os.getenv("API_ID"))
 api_hash = os.getenv("API_HASH")
@@ -31,199 +60,202 @@ bot_token = os.getenv("BOT_TOKEN")
 channel_id_raw = os.getenv("BOT_USERNAME")
 source_user = os.getenv("SOURCE_USER")
 
-# Часовий пояс Канади для статистики
-CANADA_TZ = pytz.timezone("America/Toronto")
-
 # Коректна обробка channel_id
 try:
     if channel_id_raw.startswith('-') or channel_id_raw.lstrip('-').isdigit():
         channel_id = int(channel_id_raw)
-        print(f"📋 Використовую числовий ID каналу: {channel_id}")
+        log.info(f"📋 Використовую числовий ID каналу: {channel_id}")
     else:
         channel_id = channel_id_raw
-        print(f"📝 Використовую username каналу: @{channel_id}")
+        log.info(f"📝 Використовую username каналу: @{channel_id}")
 except Exception:
     channel_id = channel_id_raw
-    print(f"📝 Використовую як рядок: {channel_id}")
+    log.info(f"📝 Використовую як рядок: {channel_id}")
 
 # Клієнти
 user_client = TelegramClient(session, api_id, api_hash)
 bot_client = TelegramClient('bot', api_id, api_hash)
-stats_handler = BotStatisticsHandler()
-
-init_db()
+# Сховище: STORAGE_ENGINE=sqlite (файл DB_FILE) або memory
+storage = open_storage()
+stats_handler = BotStatisticsHandler(storage)
+dedup_cache = DedupCache(storage)
+active_posts = ActivePostIndex(storage)
+live_slots = LiveSlotTracker()
+send_scheduler = SendScheduler()
+persistence = WriteBehindQueue(storage)
+routing = load_routing(channel_id)
+entity_cache = EntityCache()
+# Хендлер чекає, поки прогріються антидублі (апдейти можуть прийти під час старту)
+state_ready = asyncio.Event()
+_background_tasks = set()
 
 # ============================================================
 # ХЕЛПЕРИ
 # ============================================================
 
 
+async def fan_out(chats, text, priority, received_perf=None, **kwargs):
+    """
+    Паралельна відправка в усі чати призначення через планувальник.
+    Повертає список (chat, sent) для успішних відправок — повільний
+    або заблокований FloodWait чат не затримує решту.
+    """
+    async def send_one(chat):
+        started = time.perf_counter()
+        sent = await send_scheduler.send_message(bot_client, chat, text, priority=priority, **kwargs)
+        SEND_TIME.observe(time.perf_counter() - started)
+        if received_perf is not None:
+            RECEIPT_TO_POST.observe(time.perf_counter() - received_perf)
+        return sent
+
+    results = await asyncio.gather(*(send_one(chat) for chat in chats), return_exceptions=True)
+    delivered = []
+    for chat, result in zip(chats, results):
+        if isinstance(result, BaseException):
+            log.error(f"❌ Не вдалося відправити в {chat}: {result}", extra={'chat_id': chat})
+        else:
+            delivered.append((chat, result))
+    return delivered
+
+
+def gone_post_text(original, time_display):
+    """Закреслений оригінальний пост + скільки слоти були доступні"""
+    return f"~~{original}~~\n\n❌ **Слоти зайняті** · були доступні **{time_display}**"
+
+
+async def edit_out(posts, text, priority, **kwargs):
+    """Паралельне редагування постів [(chat, sent_msg_id)]; повертає кількість успішних"""
+    results = await asyncio.gather(*(
+        send_scheduler.edit_message(bot_client, chat, sent_msg_id, text, priority=priority, **kwargs)
+        for chat, sent_msg_id in posts
+    ), return_exceptions=True)
+    edited = 0
+    for (chat, _), result in zip(posts, results):
+        if isinstance(result, BaseException):
+            log.error(f"❌ Не вдалося відредагувати пост у {chat}: {result}", extra={'chat_id': chat})
+        else:
+            edited += 1
+    return edited
+
+
+async def edit_gone_posts(active, time_display):
+    """Редагує пости оголошень на місці; повертає кількість успішних редагувань"""
+    counts = await asyncio.gather(*(
+        edit_out(post.posts, gone_post_text(post.text, time_display), PRIORITY_GONE, parse_mode='markdown')
+        for post in active if post.text
+    ))
+    return sum(counts)
+
+
+async def edit_coalesced_posts(posts, text):
+    """Злиті слоти сплеску — одне редагування першого поста"""
+    await edit_out(posts, text, PRIORITY_NEW_SLOTS, buttons=slot_buttons(), parse_mode='markdown')
+
+
+def on_coalesced(burst, text):
+    if burst.active_post is not None:
+        persistence.put('update_sent_posts_text', burst.active_post.msg_id, text)
+        city, service = burst.key
+        live_slots.attach(city, service, slot_pairs(burst.announcement.slots), burst.active_post)
+
+
+coalescer = BurstCoalescer(edit_coalesced_posts, format_slot_message, on_coalesced)
+
+
+async def edit_shrunk_posts(announcement):
+    """
+    Частину часів забрали, нових немає — пости, де ці часи були, показують
+    лише те, що лишилось (або закреслюються, якщо не лишилось нічого).
+    """
+    shrunk = live_slots.shrunk_posts(announcement.city, announcement.service)
+
+    async def edit_one(post, remaining):
+        if remaining:
+            text = format_slot_message(SlotAnnouncement(
+                announcement.location, announcement.city, announcement.service, remaining
+            ))
+            edited = await edit_out(post.posts, text, PRIORITY_GONE, buttons=slot_buttons(), parse_mode='markdown')
+        else:
+            text = f"~~{post.text}~~"
+            edited = await edit_out(post.posts, text, PRIORITY_GONE, parse_mode='markdown')
+        if edited:
+            post.text = text
+            persistence.put('update_sent_posts_text', post.msg_id, text)
+        return edited
+
+    counts = await asyncio.gather(*(edit_one(post, remaining) for post, remaining in shrunk if post.text))
+    return sum(counts)
+
+
 async def handle_slots_gone(event):
     """
-    Якщо прийшло повідомлення "❌ На жаль..." — відправляємо тиху нотифікацію
-    БЕЗ редагування попереднього повідомлення
+    Якщо прийшло повідомлення "❌ На жаль..." — редагуємо активні пости міста
+    на місці (закреслення + тривалість). Якщо редагувати нічого — тиха нотифікація.
+    Тривалість зберігається разом з оголошенням, що відкрило вікно (пост,
+    найближчий до моменту відкриття), — для порівняння з нашою затримкою.
     """
-    full_place, city, time_display = parse_slots_gone_message(event.raw_text)
+    full_place, city, time_display, lifetime_seconds = parse_slots_gone_message(event.raw_text)
     if not city:
         return False  # це не "зайнято"-повідомлення
 
-    # Формуємо чисте повідомлення БЕЗ преміум-приписки
-    clean_text = f"❌ **На жаль, слотів у {full_place} більше немає!**\n\n⏱️ Слоти були доступні **{time_display}**"
-
-    try:
-        # Відправляємо ТИХО (silent=True)
-        await bot_client.send_message(channel_id, clean_text, silent=True, parse_mode='markdown')
-        print(f"🔕 Тиха нотифікація про зайнятість слотів у {city}: {time_display}")
-    except Exception as e:
-        print(f"❌ Не вдалося відправити тиху нотифікацію для {city}: {e}")
+    # Одразу — щоб паралельна повторна доставка не пройшла антидубль під час редагувань
+    dedup_cache.mark_processed(event.id)
+    coalescer.cancel_city(city)
+    live_slots.clear_city(city)
+    active = active_posts.pop_city(city)
+    edited = await edit_gone_posts(active, time_display) if active else 0
 
-    # Позначаємо "зайнято"-повідомлення як оброблене
+    if edited:
+        log.info("✏️ Пости про слоти відредаговано: зайнято",
+                 extra={'msg_id': event.id, 'city': city, 'available': time_display, 'edited': edited})
+    else:
+        # Формуємо чисте повідомлення БЕЗ преміум-приписки
+        clean_text = f"❌ **На жаль, слотів у {full_place} більше немає!**\n\n⏱️ Слоти були доступні **{time_display}**"
+
+        # Відправляємо ТИХО (silent=True) у ті ж чати, що й оголошення по місту
+        delivered = await fan_out(
+            routing.destinations(city), clean_text, PRIORITY_GONE,
+            silent=True, parse_mode='markdown'
+        )
+        if delivered:
+            log.info("🔕 Тиха нотифікація про зайнятість слотів",
+                     extra={'msg_id': event.id, 'city': city, 'available': time_display, 'chats': len(delivered)})
+
+    # Позначаємо оголошення та "зайнято"-повідомлення як оброблені
     try:
-        mark_gone_processed("", event.id)
+        for post in active:
+            # Ті самі слоти знову стануть новиною
+            dedup_cache.forget_content(post.content_hash)
+            persistence.put('mark_gone_processed', post.content_hash, event.id, msg_id=post.msg_id)
+        if not active:
+            persistence.put('mark_gone_processed', "", event.id)
+        if lifetime_seconds is not None:
+            gone_at = event.date.timestamp() if getattr(event, 'date', None) else time.time()
+            origin = post_opened_at(active, gone_at - lifetime_seconds)
+            persistence.put('insert_slot_lifetime', event.id, city, lifetime_seconds,
+                            msg_id=origin.msg_id if origin else None)
     except Exception:
-        pass
+        log.exception("❌ Не вдалося позначити слоти як зайняті", extra={'msg_id': event.id, 'city': city})
     return True
 
 
-def extract_slot_info(original_text, parsed_msg):
-    """Витягує інфо про слоти для статистики."""
-    city = service = None
-    slots_count = 0
-    available_dates = []
-
-    # Місто з повідомлення
-    if "слоти в " in parsed_msg:
-        city_match = re.search(r'слоти в (.+?)!', parsed_msg)
-        if city_match:
-            city = city_match.group(1).strip()
-
-    # Послуга з оригінального тексту
-    service_match = re.search(r'🔸 Послуга: (.+)', original_text)
-    if service_match:
-        service = service_match.group(1).strip()
-
-    # Кількість слотів та дати з часів у повідомленні
-    times_section = re.search(r'🕐 \*\*Доступні часи:\*\* (.+)', parsed_msg)
-    if times_section:
-        times_text = times_section.group(1)
-        # Рахуємо всі часи
-        all_times = re.findall(r'\d{2}:\d{2}', times_text)
-        slots_count = len(all_times)
-        
-        # Витягуємо дати
-        dates = re.findall(r'\*\*(\d{2}\.\d{2}\.\d{4})\*\*:', times_text)
-        available_dates = dates
-
-    return city, service, slots_count, available_dates
-
-
-def get_hourly_city_stats(days=30):
-    """Отримує статистику по годинах та містах"""
-    data = get_statistics_data(days)
-    
-    hour_counts = defaultdict(int)
-    city_counts = defaultdict(int)
-    
-    for city, service, slots_count, canada_time_str, timestamp in data:
-        if city:
-            city_counts[city] += 1
-            
-        # Обробка часу
-        try:
-            if canada_time_str:
-                if 'T' in canada_time_str:
-                    ct = datetime.fromisoformat(canada_time_str.replace('Z', '+00:00'))
-                else:
-                    ct = datetime.strptime(canada_time_str, '%Y-%m-%d %H:%M:%S')
-            else:
-                utc_time = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
-                utc_time = pytz.UTC.localize(utc_time)
-                ct = utc_time.astimezone(CANADA_TZ)
-            
-            hour_counts[ct.hour] += 1
-        except:
-            continue
-    
-    # Топ-3 години та міста
-    top_hours = sorted(hour_counts.items(), key=lambda x: x[1], reverse=True)[:3]
-    top_cities = sorted(city_counts.items(), key=lambda x: x[1], reverse=True)[:3]
-    
-    return top_hours, top_cities
-
-def generate_content_hash_improved(text, parsed_msg):
-    """
-    Поліпшена функція для генерації хешу контенту.
-    Враховує тільки ключову інформацію: місто + дати + часи
+def get_prediction_forecast():
     """
-    import hashlib
-    
-    city = ""
-    dates_times = ""
-    
-    # Витягуємо місто
-    if "слоти в " in parsed_msg:
-        city_match = re.search(r'слоти в (.+?)!', parsed_msg)
-        if city_match:
-            city = city_match.group(1).strip()
-    
-    # Витягуємо дати та часи з оригінального тексту
-    date_sections = re.findall(r'(\d{2}\.\d{2}\.\d{4}):\s*([0-9:\s]+)', text)
-    if date_sections:
-        # Сортуємо дати та часи для консистентності
-        sorted_dates = sorted(date_sections)
-        dates_times = ";".join([f"{date}:{times.strip()}" for date, times in sorted_dates])
-    
-    # Генеруємо хеш
-    content_for_hash = f"{city}_{dates_times}"
-    return hashlib.md5(content_for_hash.encode()).hexdigest()
-
-# --- Мікро-аналітика без лізти у внутрішні методи StatisticsModule ---
-_announced_today = set()  # {(YYYY-MM-DD, hour)}
-
-async def notify_upcoming_slots_task():
+    Топ-3 години наступної доби з містами, де слоти справді ймовірні
+    (з урахуванням дня тижня) — [(hour, ["Місто (45%)"])] для планувальника
     """
-    Раз на хвилину перевіряємо: якщо за 5 хвилин починається "топ-година",
-    шлемо тихе повідомлення з найчастішими містами.
-    """
-    global _announced_today
-
-    while True:
-        try:
-            now = datetime.now(CANADA_TZ)
-            top_hours, top_cities = get_hourly_city_stats(days=30)
-
-            # Якщо немає достатньо статистики — спимо
-            if not top_hours or not top_cities:
-                await asyncio.sleep(60)
-                continue
-
-            # Наступна година, якщо зараз наприкінці години (55-59 хв) — попередження за 5 хв
-            # або, загальніше: якщо now.minute між 55..59 і наступна година у топ-годинах
-            if 55 <= now.minute <= 59:
-                next_hour = (now.hour + 1) % 24
-                if any(h == next_hour for (h, c) in top_hours):
-                    key = (now.strftime('%Y-%m-%d'), next_hour)
-                    if key not in _announced_today:
-                        # Формуємо список міст (через кому)
-                        cities_list = ", ".join(city for city, _ in top_cities[:2])  # Топ-2 міста
-                        text = f"🔔 **За 5 хвилин можливі слоти в {cities_list}**\n\n📊 _(За статистикою минулого місяця)_"
-
-                        try:
-                            await bot_client.send_message(channel_id, text, silent=True, parse_mode='markdown')
-                            print(f"🔕 Тихе попередження на {next_hour:02d}:00 — {cities_list}")
-                        except Exception as e:
-                            print(f"⚠️ Не вдалося надіслати тихе попередження: {e}")
-
-                        _announced_today.add(key)
-
-            # Скидаємо маркери на новий день
-            if now.hour == 0 and now.minute == 0:
-                _announced_today = set()
-
-        except Exception as e:
-            print(f"⚠️ Помилка в notify_upcoming_slots_task: {e}")
-        finally:
-            await asyncio.sleep(60)
+    return [
+        (hour, [f"{city} ({p:.0%})" for city, p in likely])
+        for hour, likely in forecast_index.upcoming(hours=3, cities=2)
+    ]
+
+
+async def announce_prediction(text):
+    """Тихе попередження в catch-all канали"""
+    await fan_out(routing.default, text, PRIORITY_PREDICTION, silent=True, parse_mode='markdown')
+
+
+predictions = PredictionScheduler(get_prediction_forecast, announce_prediction)
 
 
 # ============================================================
@@ -231,106 +263,203 @@ async def notify_upcoming_slots_task():
 # ============================================================
 
 @user_client.on(events.NewMessage(from_users=source_user))
-async def handler(event):
-    print("\n" + "="*60)
-    print("🔥 НОВЕ ПОВІДОМЛЕННЯ ОТРИМАНО!")
-    print("="*60)
-
+async def handler(event, catch_up=False):
+    """catch_up — повідомлення з догону: затримки не міряються й не зберігаються"""
+    received_at = time.time()
+    received_perf = time.perf_counter()
+    queued_at = getattr(event, 'received_at', None)
+    if queued_at:
+        # Роздільний режим: отримано в ingest — час у черзі outbox теж затримка
+        received_perf -= max(0.0, received_at - queued_at)
+        received_at = queued_at
+    if getattr(event, 'date', None) and not catch_up:
+        SOURCE_DELAY.observe(max(0.0, received_at - event.date.timestamp()))
+
+    msg_id = event.id
+    if not state_ready.is_set():
+        await state_ready.wait()
     try:
-        msg_id = event.id
-        sender = await event.get_sender()
-        sender_name = getattr(sender, 'username', 'Невідомо')
-
-        print(f"📨 ID повідомлення: {msg_id}")
-        print(f"👤 Відправник: @{sender_name}")
-        print(f"📝 Текст повідомлення:")
-        print("-" * 40)
-        print(event.raw_text[:500] + ("..." if len(event.raw_text) > 500 else ""))
-        print("-" * 40)
-
-        # 0) Якщо це повідомлення про "слоти вже зайняті" — обробляємо його і завершуємо
+        log.info("🔥 Нове повідомлення", extra={'msg_id': msg_id, 'sender_id': getattr(event, 'sender_id', None)})
+        log.debug("📝 Текст повідомлення", extra={'msg_id': msg_id, 'text': event.raw_text[:500]})
+
+        # 0) Антидубль по msg_id — і для "зайнято": повторна доставка не має
+        #    слати другу нотифікацію чи писати ще один рядок тривалості
+        started = time.perf_counter()
+        already_processed = dedup_cache.is_processed(msg_id)
+        dedup_time = time.perf_counter() - started
+        if already_processed:
+            DEDUP_TIME.observe(dedup_time)
+            MESSAGES.labels(result='duplicate').inc()
+            log.info("⭕ ПРОПУЩЕНО: повідомлення вже оброблено", extra={'msg_id': msg_id})
+            return
+
+        # 1) Якщо це повідомлення про "слоти вже зайняті" — обробляємо його і завершуємо
         handled_gone = await handle_slots_gone(event)
         if handled_gone:
+            DEDUP_TIME.observe(dedup_time)
+            MESSAGES.labels(result='gone').inc()
             return
 
-        # 1) Антидубль по msg_id
-        if is_processed(msg_id):
-            print("⭕ ПРОПУЩЕНО: Повідомлення вже було оброблено раніше")
-            return
+        persisted = False
 
         # 2) Парсимо "З'явились нові слоти!"
-        print("📄 Парсинг повідомлення...")
-        parsed_msg, buttons, content_hash = parse_slot_message(event.raw_text)
-
-        if parsed_msg and buttons and content_hash:
-            # Генеруємо кращий хеш
-            improved_hash = generate_content_hash_improved(event.raw_text, parsed_msg)
-            print(f"🔍 Поліпшений хеш: {improved_hash[:10]}...")
-            
-            # Антидубль за 60 хвилин (було 30)
-            if is_content_processed_recently(improved_hash, 60):
-                print("⭕ ПРОПУЩЕНО: Той самий контент за останню годину")
-                mark_processed_with_stats(msg_id, improved_hash)
+        started = time.perf_counter()
+        announcement = parse_announcement(event.raw_text)
+        parse_time = time.perf_counter() - started
+        PARSE_TIME.observe(parse_time)
+
+        if announcement:
+            # Порівнюємо з уже відкритими слотами консульства
+            started = time.perf_counter()
+            delta = live_slots.observe(announcement)
+            if delta.kind == ADDED:
+                # Публікуємо лише часи, яких ще не було
+                announcement = delta.announcement(announcement)
+            improved_hash = announcement.content_hash
+            fields = {
+                'msg_id': msg_id,
+                'city': announcement.city,
+                'service': announcement.service,
+                'slots': announcement.total_slots,
+                'delta': delta.kind,
+                'hash': improved_hash[:10],
+                'parse_ms': round(parse_time * 1000, 3),
+            }
+            if catch_up:
+                fields['catch_up'] = True
+
+            # Антидубль: той самий набір уже відкритий; якщо трекер ще нічого
+            # не знає про консульство (перезапуск) — за хешем контенту за 60 хвилин
+            if delta.kind == NEW:
+                recent_content = dedup_cache.is_content_recent(improved_hash)
+            else:
+                recent_content = delta.kind == SAME
+            dedup_time += time.perf_counter() - started
+            DEDUP_TIME.observe(dedup_time)
+            fields['dedup_ms'] = round(dedup_time * 1000, 3)
+
+            if delta.kind == REMOVED:
+                edited = await edit_shrunk_posts(announcement)
+                MESSAGES.labels(result='shrunk').inc()
+                log.info("✂️ Частину слотів уже забрали — пости відредаговано",
+                         extra={**fields, 'removed': len(delta.removed), 'edited': edited})
+                dedup_cache.mark_processed(msg_id)
+                persistence.put('insert_processed', msg_id, improved_hash)
                 return
 
-            print("✅ УСПІШНО РОЗПАРСЕНО!")
-            print("📄 Відформатоване повідомлення:")
-            print("-" * 40)
-            print(parsed_msg)
-            print("-" * 40)
-
-            print("📘 Кнопки:")
-            for btn in buttons:
-                print(f"   • {btn.text} → {btn.url}")
-
-            # 4) Відправляємо в канал
-            print("📤 Відправляю в канал...")
-            try:
-                sent = await bot_client.send_message(
-                    channel_id,
-                    parsed_msg,
-                    buttons=buttons,
-                    parse_mode='markdown'
-                )
+            if recent_content:
+                MESSAGES.labels(result='duplicate').inc()
+                log.info("⭕ ПРОПУЩЕНО: ці слоти вже опубліковані", extra=fields)
+                dedup_cache.mark_processed(msg_id)
+                dedup_cache.mark_content(improved_hash)
+                persistence.put('insert_processed', msg_id, improved_hash)
+                return
 
-                # 5) Дані для статистики
-                city, service, slots_count, available_dates = extract_slot_info(event.raw_text, parsed_msg)
+            # Фіксуємо рішення одразу, щоб паралельний дубль не пройшов під час відправки
+            dedup_cache.mark_processed(msg_id)
+            dedup_cache.mark_content(improved_hash)
 
-                # 6) Зберігаємо з новим хешем
-                mark_processed_with_stats(
+            # 3) Сплеск по тому ж консульству — зливаємо в уже опублікований пост
+            burst = coalescer.join(announcement)
+            if burst is not None:
+                MESSAGES.labels(result='coalesced').inc()
+                persistence.put(
+                    'insert_processed',
                     msg_id=msg_id,
-                    content_hash=improved_hash,  # ← ЗМІНЕНО
-                    city=city,
-                    service=service,
-                    slots_count=slots_count,
-                    available_dates=available_dates
+                    content_hash=improved_hash,
+                    city=announcement.city,
+                    service=announcement.service,
+                    slots_count=announcement.total_slots,
+                    slots=announcement.slots
                 )
+                persisted = True
+                log.info("🧩 Злито з попереднім постом, редагування в кінці вікна", extra=fields)
 
-                # 7) Зберігаємо message_id
-                save_sent_message(improved_hash, sent.id)  # ← ЗМІНЕНО
+            else:
+                burst = coalescer.start(announcement)
 
-                print(f"🎉 УСПІШНО ВІДПРАВЛЕНО в канал @{channel_id}!")
-                print(f"📊 Додано до статистики: {city}, {service}, {slots_count} слотів")
+                parsed_msg = format_slot_message(announcement)
+                buttons = slot_buttons()
 
-            except Exception as send_error:
-                print(f"❌ ПОМИЛКА при відправці: {send_error}")
+                # 4) Відправляємо паралельно в усі канали маршруту (місто/послуга)
+                chats = routing.destinations(announcement.city, announcement.service)
+                started = time.perf_counter()
+                delivered = await fan_out(
+                    chats,
+                    parsed_msg,
+                    PRIORITY_NEW_SLOTS,
+                    received_perf=None if catch_up else received_perf,
+                    buttons=buttons,
+                    parse_mode='markdown'
+                )
+                send_time = time.perf_counter() - started
+                total_time = time.perf_counter() - received_perf
+
+                if delivered:
+                    MESSAGES.labels(result='parsed').inc()
+                    # Основний канал — якщо він серед отримувачів, інакше перший успішний
+                    sent = dict(delivered).get(channel_id, delivered[0][1])
+                    posts = [(chat, post.id) for chat, post in delivered]
+
+                    # 5) Зберігаємо (у фоні, однією пачкою) статистику та message_id
+                    persistence.put(
+                        'insert_processed',
+                        msg_id=msg_id,
+                        content_hash=improved_hash,
+                        city=announcement.city,
+                        service=announcement.service,
+                        slots_count=announcement.total_slots,
+                        slots=announcement.slots,
+                        sent_msg_id=sent.id,
+                        latency_ms=None if catch_up else round(total_time * 1000, 3)
+                    )
+                    persistence.put(
+                        'insert_sent_posts',
+                        msg_id=msg_id,
+                        city=announcement.city,
+                        content_hash=improved_hash,
+                        posts=posts,
+                        text=parsed_msg
+                    )
+                    active_post = active_posts.add(announcement.city, msg_id, improved_hash, parsed_msg, posts)
+                    live_slots.attach(announcement.city, announcement.service, delta.added, active_post)
+                    if burst is not None:
+                        coalescer.delivered(burst, posts, active_post)
+                    persisted = True
+                    # Прогноз топ-годин міг зсунутись — планувальник перерахує план
+                    predictions.invalidate()
+
+                    fields.update(
+                        sent_msg_id=sent.id,
+                        chats=len(delivered),
+                        failed_chats=len(chats) - len(delivered),
+                        send_ms=round(send_time * 1000, 3),
+                        total_ms=round(total_time * 1000, 3),
+                    )
+                    log.info("🎉 Відправлено в канали", extra=fields)
+                    log.debug("📄 Відформатоване повідомлення", extra={'msg_id': msg_id, 'text': parsed_msg})
+
+                else:
+                    # Жоден канал не отримав — даємо шанс повторному оголошенню
+                    log.error("❌ Помилка при відправці: жоден канал не отримав повідомлення", extra=fields)
+                    dedup_cache.forget_content(improved_hash)
+                    live_slots.forget(announcement.city, announcement.service, delta.added)
+                    if burst is not None:
+                        for merged_hash in coalescer.failed(burst):
+                            dedup_cache.forget_content(merged_hash)
 
         else:
-            print("⚠️ НЕ РОЗПІЗНАНО: Повідомлення не містить інформацію про слоти або має неправильний формат")
-            print("💡 Очікувані ключові слова: \"З'явились нові слоти!\"")
+            MESSAGES.labels(result='unrecognized').inc()
+            log.warning("⚠️ НЕ РОЗПІЗНАНО: повідомлення не містить інформацію про слоти",
+                        extra={'msg_id': msg_id, 'parse_ms': round(parse_time * 1000, 3)})
 
         # 8) Наостанок — відмічуємо msg_id, щоб повторно не обробляти
-        try:
-            mark_processed_with_stats(msg_id, None)
-        except Exception:
-            pass
-
-    except Exception as e:
-        print(f"❌ КРИТИЧНА ПОМИЛКА при обробці: {e}")
-        import traceback
-        traceback.print_exc()
+        dedup_cache.mark_processed(msg_id)
+        if not persisted:
+            persistence.put('insert_processed', msg_id, None)
 
-    print("="*60)
+    except Exception:
+        log.exception("❌ Критична помилка при обробці", extra={'msg_id': msg_id})
 
 
 # ============================================================
@@ -341,75 +470,157 @@ async def handler(event):
 async def start_handler(event):
     await stats_handler.handle_start_command(event)
 
+@bot_client.on(events.NewMessage(pattern='/metrics'))
+async def metrics_handler(event):
+    await stats_handler.handle_metrics_command(event)
+
 @bot_client.on(events.CallbackQuery)
 async def callback_handler(event):
     await stats_handler.handle_stats_callback(event)
 
 
+def mark_skipped(msg_id):
+    """Повідомлення, пропущене догоном як застаріле, більше не розглядаємо"""
+    dedup_cache.mark_processed(msg_id)
+    persistence.put('insert_processed', msg_id, None)
+
+
+catch_up = CatchUp(user_client, source_user, handler, dedup_cache, mark_skipped, storage)
+
+
 # ============================================================
 # ЗАПУСК
 # ============================================================
 
-async def main():
-    print("🚀 ЗАПУСК БОТА ДЛЯ ПЕРЕСИЛАННЯ СЛОТІВ")
-    print("="*50)
+def _spawn(coro):
+    """Фонова задача з утриманням посилання"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def prepare_state():
+    """Критичне до першого повідомлення: схема БД і кеші антидублів та активних постів"""
+    await storage.init()
+    await asyncio.gather(dedup_cache.warm(), active_posts.warm())
+    # Позиція догону — до першого живого повідомлення, що зсуне last_msg_id
+    catch_up.mark_position()
+    state_ready.set()
+
+
+async def resolve_entities(source=True, channels=True):
+    """Джерело та канали призначення паралельно (з кешу сутностей, якщо є)"""
+    chats = routing.all_chats() if channels else ()
+    results = await asyncio.gather(
+        *((entity_cache.resolve(user_client, 'user', source_user),) if source else ()),
+        *(entity_cache.resolve(bot_client, 'bot', chat) for chat in chats),
+        return_exceptions=True
+    )
+
+    if source:
+        source_entity, results = results[0], results[1:]
+        if isinstance(source_entity, BaseException):
+            log.error(f"❌ Не вдалося знайти джерело {source_user}: {source_entity}")
+            return False
+        log.info(f"✅ Джерело: {source_entity['name']} (@{source_entity['username'] or 'N/A'})")
+
+    for chat, channel in zip(chats, results):
+        if isinstance(channel, BaseException):
+            log.error(f"❌ Не вдалося знайти канал {chat}: {channel}")
+            log.error("💡 Переконайтесь що бот доданий до каналу як адміністратор!")
+            return False
+        log.info(f"✅ Канал призначення: {channel['name']} (@{chat})")
+    return True
 
-    try:
-        # Підключання
-        print("📄 Підключення до Telegram...")
-        await user_client.start()
-        await bot_client.start(bot_token=bot_token)
 
+async def log_identities():
+    # У роздільному режимі процес має лише один з клієнтів
+    if user_client.is_connected():
         me = await user_client.get_me()
+        log.info(f"✅ USER клієнт: {me.first_name} (ID: {me.id})")
+    if bot_client.is_connected():
         bot = await bot_client.get_me()
+        log.info(f"✅ BOT клієнт: {bot.first_name} (@{bot.username})")
 
-        print(f"✅ USER клієнт: {me.first_name} (ID: {me.id})")
-        print(f"✅ BOT клієнт: {bot.first_name} (@{bot.username})")
 
-        # Джерело
-        try:
-            source_entity = await user_client.get_entity(source_user)
-            print(f"✅ Джерело: {getattr(source_entity, 'first_name', 'N/A')} (@{getattr(source_entity, 'username', 'N/A')})")
-        except Exception as e:
-            print(f"❌ Не вдалося знайти джерело {source_user}: {e}")
-            return
+async def deferred_startup():
+    """Некритичне — вже після того, як слухач працює"""
+    await storage.load_forecast_index()
 
-        # Канал
-        try:
-            channel_entity = await bot_client.get_entity(channel_id)
-            channel_title = getattr(channel_entity, 'title', 'Невідомо')
-            print(f"✅ Канал призначення: {channel_title} (@{channel_id})")
-        except Exception as e:
-            print(f"❌ Не вдалося знайти канал {channel_id}: {e}")
-            print("💡 Переконайтесь що бот доданий до каналу як адміністратор!")
-            return
+    # Локальний ендпоінт метрик
+    try:
+        await start_metrics_server()
+    except OSError as e:
+        log.warning(f"⚠️ Не вдалося запустити сервер метрик: {e}")
+
+    # Фонова задача з тихими попередженнями
+    _spawn(predictions.run())
+    # Згортання старих рядків і vacuum у тихі години
+    _spawn(maintenance_task(storage))
+
+    try:
+        await log_identities()
+    except Exception as e:
+        log.warning(f"⚠️ Не вдалося отримати дані клієнтів: {e}")
 
-        print("\n" + "="*50)
-        print("🎯 ВСЕ ГОТОВО! Чекаю нові повідомлення про слоти...")
-        print("💡 Бот буде автоматично пересилати ТІЛЬКИ НОВІ повідомлення")
-        print("📊 Статистика збирається автоматично. Використайте /start для перегляду")
-        print("🔕 Тихі попередження вмикнено (за 5 хв до найімовірнішої години)")
-        print("📱 Для зупинки натисніть Ctrl+C")
-        print("="*50)
 
-        # Фонова задача з тихими попередженнями
-        asyncio.create_task(notify_upcoming_slots_task())
+async def startup():
+    """
+    Підключення обох клієнтів паралельно з підготовкою БД, потім сутності.
+    Повертає True, щойно можна обробляти повідомлення.
+    """
+    log.info("📄 Підключення до Telegram...")
+    await asyncio.gather(
+        prepare_state(),
+        user_client.start(),
+        bot_client.start(bot_token=bot_token)
+    )
+
+    if not await resolve_entities():
+        return False
+
+    startup_time = time.perf_counter() - STARTED_PERF
+    STARTUP_TIME.observe(startup_time)
+    log.info("🎯 ВСЕ ГОТОВО! Чекаю нові повідомлення про слоти...",
+             extra={'startup_ms': round(startup_time * 1000, 1)})
+
+    # Пропущене під час простою — через звичайний хендлер, далі після кожного перепідключення
+    _spawn(catch_up.watch())
+    _spawn(deferred_startup())
+    return True
+
+
+async def main():
+    log.info("🚀 ЗАПУСК БОТА ДЛЯ ПЕРЕСИЛАННЯ СЛОТІВ")
+
+    try:
+        if not await startup():
+            return
 
         # Слухаємо нові повідомлення
         await user_client.run_until_disconnected()
 
-    except Exception as e:
-        print(f"❌ КРИТИЧНА ПОМИЛКА: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception("❌ КРИТИЧНА ПОМИЛКА")
+    finally:
+        await send_scheduler.stop()
+        # Дописати відкладені записи та закрити з'єднання з БД
+        await persistence.close()
+        storage.close()
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if os.getenv("RUN_MODE", "single") == "split":
+            # Окремі процеси ingest / publisher / stats під одним наглядачем
+            from split_mode import supervise
+            supervise()
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
-        print("\n👋 Бот зупинено користувачем")
-    except Exception as e:
-        print(f"❌ Помилка запуску: {e}")
-        import traceback
-        traceback.print_exc()
\ No newline at end of file
+        log.info("👋 Бот зупинено користувачем")
+    except Exception:
+        log.exception("❌ Помилка запуску")
+    finally:
+        stop_logging()
\ No newline at end of file
@@ -0,0 +1,67 @@
+import os
+import time
+import asyncio
+from datetime import datetime, timedelta, time as dtime
+
+import pytz
+
+from db import HOT_DAYS
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+CANADA_TZ = pytz.timezone('America/Toronto')
+
+# Тихі години (за часом Канади), коли оголошень майже немає: "3-5"
+MAINTENANCE_QUIET_HOURS = os.getenv('MAINTENANCE_QUIET_HOURS', '3-5')
+
+
+def parse_quiet_hours(raw=MAINTENANCE_QUIET_HOURS):
+    start, _, end = raw.partition('-')
+    return int(start) % 24, int(end or start) % 24
+
+
+def next_quiet_start(now, quiet_hours=None):
+    """Наступний початок тихого вікна; якщо вже всередині — now"""
+    start, end = quiet_hours or parse_quiet_hours()
+    hour = now.hour
+    inside = start <= hour < end if start < end else (hour >= start or hour < end)
+    if inside:
+        return now
+    day = now.date() if hour < start else now.date() + timedelta(days=1)
+    return CANADA_TZ.localize(datetime.combine(day, dtime(start)))
+
+
+async def run_maintenance(storage, hot_days=HOT_DAYS):
+    """Згортання старих рядків, повернення місця ОС і checkpoint WAL"""
+    started = time.perf_counter()
+    compacted = await storage.compact(hot_days)
+    vacuumed, free_pages = await storage.reclaim_space()
+    await storage.checkpoint('TRUNCATE')
+    log.info("🧹 Обслуговування БД завершено", extra={
+        'compacted_rows': compacted,
+        'full_vacuum': vacuumed,
+        'freed_pages': free_pages,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+    })
+
+
+async def maintenance_task(storage, hot_days=HOT_DAYS, quiet_hours=None):
+    """Раз на добу в тихі години: спимо рівно до початку вікна"""
+    quiet_hours = quiet_hours or parse_quiet_hours()
+    while True:
+        now = datetime.now(CANADA_TZ)
+        start = next_quiet_start(now, quiet_hours)
+        await asyncio.sleep(max(0.0, (start - now).total_seconds()))
+        try:
+            await run_maintenance(storage, hot_days)
+        except Exception:
+            log.exception("❌ Помилка обслуговування БД")
+
+        # Наступний запуск — не раніше за вихід з поточного вікна
+        now = datetime.now(CANADA_TZ)
+        _, end = quiet_hours
+        window_end = CANADA_TZ.localize(datetime.combine(now.date(), dtime(end)))
+        if window_end <= now:
+            window_end += timedelta(days=1)
+        await asyncio.sleep((window_end - now).total_seconds())
@@ -0,0 +1,247 @@
+import os
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))  # 0 — вимкнено
+
+# Межі кошиків (секунди) — від мілісекунд до хвилин
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(f'{name}="{value}"' for name, value in pairs)
+    return "{" + inner + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        REGISTRY.append(self)
+        if not self.labelnames:
+            self.labels()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Оцінка квантиля з кошиків (лінійна інтерполяція всередині кошика)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.buckets[-1]
+
+    def render(self, name, labelnames, key):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            labels = _format_labels(labelnames, key, ("le", _format_value(float(bound))))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, key)
+        lines.append(f"{name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{labels} {self.count}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def quantile(self, q):
+        return self._default().quantile(q)
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+REGISTRY = []
+
+# ============================================================
+# МЕТРИКИ ПАЙПЛАЙНУ
+# ============================================================
+
+SOURCE_DELAY = Histogram('slotbot_source_delay_seconds', "Від event.date джерела до отримання")
+PARSE_TIME = Histogram('slotbot_parse_seconds', "Парсинг повідомлення")
+DEDUP_TIME = Histogram('slotbot_dedup_seconds', "Перевірка антидублів")
+SEND_TIME = Histogram('slotbot_send_seconds', "Відправка в канал (з чергою)")
+RECEIPT_TO_POST = Histogram('slotbot_receipt_to_post_seconds', "Від отримання до публікації в каналі")
+PERSIST_TIME = Histogram('slotbot_persist_batch_seconds', "Коміт однієї пачки записів")
+PERSIST_BATCH_SIZE = Histogram('slotbot_persist_batch_size', "Операцій в одній пачці",
+                               buckets=(1, 2, 5, 10, 25, 50, 100, 250))
+SEND_QUEUE_LATENCY = Histogram('slotbot_send_queue_seconds', "Очікування в черзі відправки", ('priority',))
+
+MESSAGES = Counter('slotbot_messages_total', "Повідомлення від джерела за результатом", ('result',))
+SEND_FAILURES = Counter('slotbot_send_failures_total', "Невдалі відправки", ('priority',))
+FLOOD_WAITS = Counter('slotbot_flood_waits_total', "Отримані FloodWait")
+STARTUP_TIME = Histogram('slotbot_startup_seconds', "Від запуску процесу до готовності слухача")
+
+
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def format_metrics_summary():
+    """Короткий звіт для команди /metrics"""
+    def ms(value):
+        return "—" if value is None else f"{value * 1000:.1f} мс"
+
+    msg = "📈 **Метрики бота**\n\n"
+    for title, histogram in (
+        ("Отримання → публікація", RECEIPT_TO_POST),
+        ("Затримка джерела", SOURCE_DELAY),
+        ("Парсинг", PARSE_TIME),
+        ("Антидубль", DEDUP_TIME),
+        ("Відправка", SEND_TIME),
+        ("Запис пачки в БД", PERSIST_TIME),
+        ("Старт бота", STARTUP_TIME),
+    ):
+        value = histogram.labels()
+        msg += f"• {title}: p50 {ms(value.quantile(0.5))}, p99 {ms(value.quantile(0.99))} (n={value.count})\n"
+
+    msg += "\n📨 **Повідомлення:**\n"
+    for (result,), counter in sorted(MESSAGES._children.items()):
+        msg += f"• {result}: {counter.value}\n"
+
+    failures = sum(counter.value for counter in SEND_FAILURES._children.values())
+    msg += f"\n❌ Невдалих відправок: {failures}\n"
+    msg += f"⏳ FloodWait: {FLOOD_WAITS.labels().value}\n"
+    return msg
+
+
+async def _handle_http(reader, writer):
+    try:
+        request_line = await reader.readline()
+        # Заголовки запиту нам не потрібні — просто дочитуємо їх
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+
+        parts = request_line.decode(errors='replace').split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split('?')[0] == "/metrics":
+            body = render_prometheus().encode()
+            status = "200 OK"
+        else:
+            body = b"not found\n"
+            status = "404 Not Found"
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Локальний HTTP-ендпоінт /metrics у форматі Prometheus"""
+    if not port:
+        return None
+    server = await asyncio.start_server(_handle_http, host, port)
+    log.info(f"📈 Метрики: http://{host}:{port}/metrics")
+    return server
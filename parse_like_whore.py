@@ -16,74 +16,118 @@ def get_city_color(city):
             return color
     return '🟢'
 
+SLOTS_HEADER = "З'явились нові слоти!"
+BOOKING_URL = "https://id.e-consul.gov.ua/"
+
+# Один прохід по тексту: рядки з консульством, послугою та датами
+_ANNOUNCEMENT_RE = re.compile(
+    r"^🔸 Послуга: (?P<service>.+?)\s*$"
+    r"|🔸 (?P<location>(?:Генеральне Консульство|Посольство) України в (?P<city>.+?))\s*$"
+    # Як і раніше ([0-9:\s]+): часи до першого іншого символу, \r чи приписка після них не заважають
+    r"|^(?P<date>\d{2}\.\d{2}\.\d{4}):(?P<times>[ \t\r\d:]*)",
+    re.MULTILINE,
+)
+_TIME_RE = re.compile(r'\d{2}:\d{2}')
+
+
+class SlotAnnouncement:
+    """Розпарсене повідомлення про нові слоти"""
+    __slots__ = ('location', 'city', 'service', 'slots', 'total_slots', 'content_hash')
+
+    def __init__(self, location, city, service, slots):
+        self.location = location
+        self.city = city
+        self.service = service
+        self.slots = slots  # ((дата, (час, ...)), ...)
+        self.total_slots = sum(len(times) for _, times in slots)
+        self.content_hash = announcement_hash(city, slots)
+
+    @property
+    def dates(self):
+        return [date for date, _ in self.slots]
+
+    def __repr__(self):
+        return f"SlotAnnouncement({self.city!r}, {self.service!r}, {self.total_slots} слотів)"
+
+
+def announcement_hash(city, slots):
+    """
+    Канонічний хеш контенту: місто + відсортовані дати та часи.
+    Той самий формат, що й раніше в generate_content_hash_improved,
+    тож хеші в БД залишаються сумісними.
+    """
+    dates_times = ";".join(f"{date}:{' '.join(times)}" for date, times in sorted(slots))
+    return hashlib.md5(f"{city}_{dates_times}".encode()).hexdigest()
+
+
+def parse_announcement(text):
+    """Парсить повідомлення про нові слоти за один прохід, повертає SlotAnnouncement або None"""
+    if not text or SLOTS_HEADER not in text:
+        return None
+
+    location = city = service = None
+    slots = []
+
+    for match in _ANNOUNCEMENT_RE.finditer(text):
+        if match.group('service') is not None:
+            if service is None:
+                service = match.group('service')
+        elif match.group('location') is not None:
+            if location is None:
+                location = match.group('location').strip()
+                city = match.group('city').strip()
+        else:
+            times = tuple(_TIME_RE.findall(match.group('times')))
+            if times:
+                slots.append((match.group('date'), times))
+
+    if not (location and service and slots):
+        return None
+
+    return SlotAnnouncement(location, city, service, tuple(slots))
+
+
+def format_slot_message(announcement):
+    """Мінімальне повідомлення для каналу - тільки місто та часи"""
+    city_color = get_city_color(announcement.city)
+    times_inline = " ".join(f"**{date}**: {' '.join(times)}" for date, times in announcement.slots)
+    return f"{city_color} **Є слоти в {announcement.city}!** 🕐 **Доступні часи:** {times_inline}"
+
+
+def slot_buttons():
+    return [Button.url("🔗 Записатися", BOOKING_URL)]
+
+
 def parse_slot_message(text):
     """Спрощений парсер - тільки місто та часи"""
-    if not text or "З'явились нові слоти!" not in text:
-        return None, None, None
-    
-    # Консульство/посольство
-    location_match = re.search(r'🔸 (Генеральне Консульство України в .+|Посольство України в .+)', text)
-    service_match = re.search(r'🔸 Послуга: (.+)', text)
-    
-    # Всі дати та часи
-    date_sections = re.findall(r'(\d{2}\.\d{2}\.\d{4}):\s*([0-9:\s]+)', text)
-    
-    if not (location_match and service_match and date_sections):
+    announcement = parse_announcement(text)
+    if announcement is None:
         return None, None, None
+    return format_slot_message(announcement), slot_buttons(), announcement.content_hash
 
-    location_full = location_match.group(1)
-    city = (location_full.replace("Генеральне Консульство України в ", "")
-                         .replace("Посольство України в ", "").strip())
-    service = service_match.group(1).strip()
-    
-    # Обробляємо дати та часи
-    total_slots = 0
-    date_time_info = []
-    all_dates = []
-    
-    for date, times_str in date_sections:
-        times = re.findall(r'\d{2}:\d{2}', times_str)
-        if times:
-            total_slots += len(times)
-            all_dates.append(date)
-            # Форматуємо часи для кожної дати
-            times_formatted = " ".join(times)
-            date_time_info.append(f"**{date}**: {times_formatted}")
-    
-    if total_slots == 0:
-        return None, None, None
-    
-    # Генеруємо хеш включаючи часи
-    times_for_hash = ";".join([f"{date}:{times_str.strip()}" for date, times_str in date_sections])
-    content_hash = hashlib.md5(f"{city}_{service}_{times_for_hash}".encode()).hexdigest()
-    
-    # Мінімальне повідомлення - тільки місто та часи
-    city_color = get_city_color(city)
-    times_inline = " ".join(date_time_info)
-    
-    msg = f"{city_color} **Є слоти в {city}!** 🕐 **Доступні часи:** {times_inline}"
-
-    buttons = [Button.url("🔗 Записатися", "https://id.e-consul.gov.ua/")]
-    
-    return msg, buttons, content_hash
+_GONE_RE = re.compile(
+    r"❌\s*На жаль,\s*усі\s*слоти\s*у\s*(.+?)\s*вже\s*зайняті!\s*Слоти\s*були\s*доступні\s*протягом\s*(\d+)\s*(хвилин|секунд)",
+    re.IGNORECASE | re.DOTALL
+)
 
 def parse_slots_gone_message(text: str):
-    """Парсить повідомлення про зайняті слоти"""
+    """
+    Парсить повідомлення про зайняті слоти:
+    (повне місце, місто, тривалість для тексту, тривалість у секундах)
+    """
     if not text or "❌ На жаль" not in text:
-        return None, None, None
+        return None, None, None, None
 
     # Шукаємо місце та час
-    gone_match = re.search(
-        r"❌\s*На жаль,\s*усі\s*слоти\s*у\s*(.+?)\s*вже\s*зайняті!\s*Слоти\s*були\s*доступні\s*протягом\s*(\d+)\s*(хвилин|секунд)",
-        text, re.IGNORECASE | re.DOTALL
-    )
+    gone_match = _GONE_RE.search(text)
     
     if not gone_match:
-        return None, None, None
+        return None, None, None, None
 
     full_place = gone_match.group(1).strip()
     time_count = int(gone_match.group(2))
-    time_unit = gone_match.group(3)
+    # Регулярка без урахування регістру — одиниця теж
+    time_unit = gone_match.group(3).lower()
     
     # Отримуємо назву міста
     city = (full_place.replace("Генеральне Консульство України в ", "")
@@ -99,14 +143,14 @@ def parse_slots_gone_message(text: str):
             time_display = f"{minutes} хв {seconds} сек" if seconds > 0 else f"{minutes} хвилин"
     else:
         time_display = f"{time_count} хвилин"
+    lifetime_seconds = time_count if time_unit == "секунд" else time_count * 60
     
-    return full_place, city, time_display
+    return full_place, city, time_display, lifetime_seconds
 
-def test_parser():
-    """Функція для тестування парсера"""
-    test_messages = [
-        # Твій приклад з Посольством України в Канаді
-        """🆕 З'явились нові слоти!
+# Приклади повідомлень джерела (для test_parser та bench.py)
+TEST_MESSAGES = [
+    # Твій приклад з Посольством України в Канаді
+    """🆕 З'явились нові слоти!
 🔸 Посольство України в Канаді
 🔸 Послуга: Оформлення закордонного паспорта
 📅 Слоти які були опубліковані:
@@ -115,34 +159,36 @@ def test_parser():
 Скоро ми вас приголомшимо!
 🔥 Ви отримали це повідомлення без затримок!
 Дякуємо за оформлення преміум підписки!""",
-        
-        # Приклад з Едмонтоном
-        """🆕 З'явились нові слоти!
+    
+    # Приклад з Едмонтоном
+    """🆕 З'явились нові слоти!
 🔸 Генеральне Консульство України в Едмонтоні
 🔸 Послуга: Оформлення закордонного паспорта
 📅 Слоти які були опубліковані:
 16.08.2025: 14:00 14:10 14:20
 🔥 Ви отримали це повідомлення без затримок!""",
-        
-        # Приклад з кількома датами
-        """🆕 З'явились нові слоти!
+    
+    # Приклад з кількома датами
+    """🆕 З'явились нові слоти!
 🔸 Генеральне Консульство України в Торонто
 🔸 Послуга: Оформлення закордонного паспорта
 📅 Слоти які були опубліковані:
 17.08.2025: 11:15 11:25
 18.08.2025: 09:30 10:00 10:30
 🔥 Ви отримали це повідомлення без затримок!""",
-        
-        # Приклад повідомлення про зайнятість
-        """❌ На жаль, усі слоти у Посольство України в Канаді вже зайняті!
+    
+    # Приклад повідомлення про зайнятість
+    """❌ На жаль, усі слоти у Посольство України в Канаді вже зайняті!
 Слоти були доступні протягом 59 секунд.
 🔥 Тільки преміум користувачі отримують такі повідомлення. Дякуємо за оформлення преміум підписки!"""
-    ]
+]
 
+def test_parser():
+    """Функція для тестування парсера"""
     print("🧪 ТЕСТУВАННЯ ПАРСЕРА")
     print("=" * 60)
     
-    for i, test_message in enumerate(test_messages[:3], 1):  # Тестуємо перші 3 (слоти)
+    for i, test_message in enumerate(TEST_MESSAGES[:3], 1):  # Тестуємо перші 3 (слоти)
         print(f"\n🧪 ТЕСТ {i} (слоти):")
         print("-" * 40)
         result, buttons, content_hash = parse_slot_message(test_message)
@@ -158,15 +204,23 @@ def test_parser():
     # Тестуємо "зайнято"
     print(f"\n🧪 ТЕСТ 4 (зайнято):")
     print("-" * 40)
-    gone_result = parse_slots_gone_message(test_messages[3])
+    gone_result = parse_slots_gone_message(TEST_MESSAGES[3])
     if gone_result[0]:
-        full_place, city, time_display = gone_result
+        full_place, city, time_display, lifetime_seconds = gone_result
         print("✅ УСПІШНО:")
         print(f"Повне місце: {full_place}")
         print(f"Місто: {city}")
         print(f"Час доступності: {time_display}")
+        print(f"Секунд: {lifetime_seconds}")
     else:
         print("❌ НЕ РОЗПІЗНАНО")
+
+    # Переноси рядків \r\n (як у старому парсері) дають те саме оголошення
+    print(f"\n🧪 ТЕСТ 5 (\\r\\n):")
+    print("-" * 40)
+    crlf = parse_announcement(TEST_MESSAGES[1].replace('\n', '\r\n'))
+    same = crlf is not None and crlf.content_hash == parse_announcement(TEST_MESSAGES[1]).content_hash
+    print("✅ УСПІШНО" if same else "❌ НЕ РОЗПІЗНАНО")
     
     print("\n" + "=" * 60)
     print("🎯 ТЕСТУВАННЯ ЗАВЕРШЕНО")
@@ -0,0 +1,142 @@
+import os
+import math
+import asyncio
+from datetime import datetime, timedelta, time as dtime
+
+import pytz
+
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+CANADA_TZ = pytz.timezone('America/Toronto')
+
+# За скільки хвилин до топ-години попереджати, напр. "15,5"
+PREDICT_LEAD_MINUTES = tuple(sorted(
+    {int(x) for x in os.getenv('PREDICT_LEAD_MINUTES', '5').split(',') if x.strip()},
+    reverse=True
+))
+
+
+def _target_time(day, hour):
+    """Початок години `hour` дня `day` за часом Канади (з урахуванням DST)"""
+    return CANADA_TZ.localize(datetime.combine(day, dtime(hour)))
+
+
+def plan_fires(now, forecast, lead_minutes=PREDICT_LEAD_MINUTES, announced=()):
+    """
+    Найближчі попередження: [(fire_at, target, lead, cities)], відсортовані за fire_at.
+
+    forecast — [(hour, [cities])]. Беремо лише години, що ще не почались
+    (сьогодні або завтра); уже надіслані ключі (target, lead) пропускаємо.
+    """
+    fires = []
+    today = now.date()
+    for hour, cities in forecast:
+        for offset in (0, 1):
+            target = _target_time(today + timedelta(days=offset), hour)
+            if target <= now:
+                continue
+            for lead in lead_minutes:
+                if (target, lead) in announced:
+                    continue
+                fires.append((target - timedelta(minutes=lead), target, lead, cities))
+            break
+    fires.sort(key=lambda x: x[0])
+    return fires
+
+
+def prediction_text(cities, minutes):
+    cities_list = ", ".join(cities)
+    return f"🔔 **За {minutes} хвилин можливі слоти в {cities_list}**\n\n📊 _(За статистикою по днях тижня)_"
+
+
+class PredictionScheduler:
+    """
+    Тихі попередження перед топ-годинами без щохвилинного опитування.
+
+    Обчислює найближчий момент спрацювання з прогнозу, спить рівно до нього
+    і перераховує план лише тоді, коли прогноз змінився (invalidate()).
+    Надіслані ключі (година, lead) живуть лише до початку своєї години,
+    тож множина не росте.
+    """
+
+    def __init__(self, forecast, announce, lead_minutes=PREDICT_LEAD_MINUTES):
+        self.forecast = forecast      # () -> [(hour, [cities])]
+        self.announce = announce      # async (text) -> None
+        self.lead_minutes = lead_minutes
+        self._announced = set()       # {(target, lead)}
+        self._changed = asyncio.Event()
+        self._stale = True
+        self._plan = []
+
+    def invalidate(self):
+        """Прогноз міг змінитись (нове оголошення) — перерахувати план"""
+        self._stale = True
+        self._changed.set()
+
+    def _refresh(self, now):
+        if self._stale:
+            self._stale = False
+            self._plan = [(hour, tuple(cities)) for hour, cities in self.forecast() if cities]
+        self._announced = {key for key in self._announced if key[0] > now}
+        return plan_fires(now, self._plan, self.lead_minutes, self._announced)
+
+    async def _fire(self, now, target, lead, cities):
+        # Ті ж години з більшим lead вже неактуальні (напр. після рестарту)
+        for other in self.lead_minutes:
+            if other >= lead:
+                self._announced.add((target, other))
+
+        self._stale = True  # заодно підхопити зсув 30-денного вікна
+        minutes = max(1, math.ceil((target - now).total_seconds() / 60))
+        try:
+            await self.announce(prediction_text(cities, minutes))
+            log.info(f"🔕 Тихе попередження на {target:%H:%M} — {', '.join(cities)}")
+        except Exception as e:
+            log.warning(f"⚠️ Не вдалося надіслати тихе попередження: {e}")
+
+    async def run(self):
+        while True:
+            try:
+                self._changed.clear()
+                now = datetime.now(CANADA_TZ)
+                fires = self._refresh(now)
+
+                due = [f for f in fires if f[0] <= now]
+                if due:
+                    # Найпізніше з прострочених — найменший lead, решта для тієї ж години відпадає
+                    await self._fire(now, *due[-1][1:])
+                    continue
+
+                # Спимо до найближчого спрацювання або до зміни прогнозу
+                timeout = (fires[0][0] - now).total_seconds() if fires else None
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"⚠️ Помилка в планувальнику попереджень: {e}")
+                await asyncio.sleep(60)
+
+
+def test_plan_fires():
+    now = CANADA_TZ.localize(datetime(2025, 8, 18, 12, 57))
+    forecast = [(13, ("Торонто",)), (9, ("Ванкувер",))]
+
+    fires = plan_fires(now, forecast, (15, 5))
+    assert [(f[1].hour, f[2]) for f in fires] == [(13, 15), (13, 5), (9, 15), (9, 5)]
+    assert fires[0][0] < now  # вікно 15 хв уже почалось — спрацює одразу
+    assert fires[2][1].date().day == 19  # 09:00 вже минула — завтра
+
+    announced = {(fires[0][1], 15), (fires[0][1], 5)}
+    fires = plan_fires(now, forecast, (15, 5), announced)
+    assert [(f[1].hour, f[2]) for f in fires] == [(9, 15), (9, 5)]
+    print("✅ plan_fires OK")
+
+
+if __name__ == "__main__":
+    test_plan_fires()
@@ -0,0 +1,87 @@
+import os
+import json
+
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# JSON з маршрутами: файл (ROUTES_FILE) або рядок (ROUTES)
+# {
+#   "default": [-1001234567890],                  — catch-all, отримує все
+#   "cities": {"Торонто": ["@toronto_slots"]},    — підрядок назви міста
+#   "services": {"паспорта": [-1009876543210]}    — підрядок назви послуги
+# }
+ROUTES_FILE = os.getenv("ROUTES_FILE")
+ROUTES = os.getenv("ROUTES")
+
+
+def parse_chat_id(raw):
+    """Числовий ID каналу або username (як для BOT_USERNAME)"""
+    if isinstance(raw, int):
+        return raw
+    raw = str(raw).strip()
+    if raw.lstrip('-').isdigit():
+        return int(raw)
+    return raw.lstrip('@')
+
+
+class RoutingTable:
+    """
+    Місто/послуга → набір чатів призначення.
+
+    Ключі міст і послуг зіставляються як підрядки (як у get_city_color),
+    catch-all чати отримують кожне повідомлення. Результат кешується
+    на пару (місто, послуга), тож у гарячому шляху це один dict lookup.
+    """
+
+    def __init__(self, default=(), cities=None, services=None):
+        self.default = tuple(dict.fromkeys(parse_chat_id(chat) for chat in default))
+        self.cities = {key: tuple(parse_chat_id(chat) for chat in chats) for key, chats in (cities or {}).items()}
+        self.services = {key: tuple(parse_chat_id(chat) for chat in chats) for key, chats in (services or {}).items()}
+        self._cache = {}
+
+    def destinations(self, city=None, service=None):
+        key = (city, service)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        chats = list(self.default)
+        if city:
+            for name, city_chats in self.cities.items():
+                if name in city:
+                    chats.extend(city_chats)
+        if service:
+            for name, service_chats in self.services.items():
+                if name in service:
+                    chats.extend(service_chats)
+
+        result = tuple(dict.fromkeys(chats))
+        self._cache[key] = result
+        return result
+
+    def all_chats(self):
+        chats = list(self.default)
+        for group in (self.cities, self.services):
+            for group_chats in group.values():
+                chats.extend(group_chats)
+        return tuple(dict.fromkeys(chats))
+
+
+def load_routing(default_chat):
+    """Таблиця маршрутів з ROUTES_FILE/ROUTES; без них — лише основний канал"""
+    config = {}
+    try:
+        if ROUTES_FILE:
+            with open(ROUTES_FILE, encoding='utf-8') as f:
+                config = json.load(f)
+        elif ROUTES:
+            config = json.loads(ROUTES)
+    except (OSError, ValueError) as e:
+        log.error(f"❌ Не вдалося прочитати маршрути: {e}")
+        config = {}
+
+    default = config.get("default", [default_chat])
+    table = RoutingTable(default, config.get("cities"), config.get("services"))
+    log.info(f"🧭 Маршрути: {len(table.default)} catch-all, {len(table.cities)} міст, {len(table.services)} послуг")
+    return table
@@ -0,0 +1,250 @@
+import time
+import asyncio
+import itertools
+from collections import deque
+
+from telethon.errors import FloodWaitError
+
+from metrics import SEND_QUEUE_LATENCY, SEND_FAILURES, FLOOD_WAITS
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# Пріоритети (менше — важливіше)
+PRIORITY_NEW_SLOTS = 0
+PRIORITY_GONE = 1
+PRIORITY_PREDICTION = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_NEW_SLOTS: 'new_slots',
+    PRIORITY_GONE: 'gone',
+    PRIORITY_PREDICTION: 'prediction',
+}
+
+# Ліміти Telegram для ботів: ~1 повідомлення/с в один чат (з невеликим бурстом)
+# та ~30 повідомлень/с загалом
+PER_CHAT_RATE = 1.0
+PER_CHAT_BURST = 3
+GLOBAL_RATE = 30.0
+GLOBAL_BURST = 30
+# У групу чи канал — не більше 20 повідомлень (і редагувань) за хвилину
+GROUP_LIMIT = 20
+GROUP_PERIOD = 60.0
+
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0  # секунд, подвоюється з кожною спробою
+
+
+class TokenBucket:
+    """Класичний token bucket: rate токенів на секунду, не більше capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Скільки секунд чекати до наступного токена (0 — можна зараз)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class WindowLimit:
+    """Не більше limit подій за будь-які period секунд (ковзне вікно)"""
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.events = deque()
+
+    def _expire(self, now):
+        while self.events and self.events[0] <= now - self.period:
+            self.events.popleft()
+
+    def delay(self, now):
+        self._expire(now)
+        if len(self.events) < self.limit:
+            return 0.0
+        return self.events[0] + self.period - now
+
+    def consume(self, now):
+        self._expire(now)
+        self.events.append(now)
+
+
+def is_group_chat(chat_id):
+    """Група чи канал: від'ємний id або username (особисті чати — додатні id)"""
+    if isinstance(chat_id, str):
+        try:
+            chat_id = int(chat_id)
+        except ValueError:
+            return True
+    return chat_id < 0
+
+
+class SendJob:
+    __slots__ = ('priority', 'chat_id', 'factory', 'future', 'enqueued_at', 'attempts')
+
+    def __init__(self, priority, chat_id, factory, future):
+        self.priority = priority
+        self.chat_id = chat_id
+        self.factory = factory
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class SendScheduler:
+    """
+    Центральна черга вихідних повідомлень.
+
+    - пріоритети: нові слоти > "слоти зайняті" > прогнози;
+    - token bucket на кожен чат та загальний на бота, для груп і каналів
+      ще й вікно GROUP_LIMIT за GROUP_PERIOD (редагування теж рахуються);
+    - FloodWait блокує лише свій чат, задача повертається в чергу і
+      повторюється після паузи, не зупиняючи решту відправок;
+    - затримка в черзі та збої пишуться в metrics.
+    """
+
+    def __init__(self, per_chat_rate=PER_CHAT_RATE, per_chat_burst=PER_CHAT_BURST,
+                 global_rate=GLOBAL_RATE, global_burst=GLOBAL_BURST, group_limit=GROUP_LIMIT,
+                 group_period=GROUP_PERIOD, max_retries=MAX_RETRIES):
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.group_limit = group_limit  # None — без ліміту груп
+        self.group_period = group_period
+        self.max_retries = max_retries
+        self._global_bucket = TokenBucket(global_rate, global_burst)
+        self._chat_buckets = {}
+        self._group_windows = {}
+        self._blocked_until = {}  # {chat_id: monotonic} — після FloodWait
+        self._queue = None
+        self._worker = None
+        self._inflight = set()  # задачі відправки — з посиланням, щоб їх не зібрав GC
+        self._seq = itertools.count()
+
+    # --- публічне API ---
+
+    async def submit(self, chat_id, factory, priority=PRIORITY_NEW_SLOTS):
+        """Ставить виклик factory() в чергу та чекає на його результат"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._put(SendJob(priority, chat_id, factory, future))
+        return await future
+
+    async def send_message(self, client, chat_id, text, priority=PRIORITY_NEW_SLOTS, **kwargs):
+        return await self.submit(chat_id, lambda: client.send_message(chat_id, text, **kwargs), priority)
+
+    async def edit_message(self, client, chat_id, message_id, text, priority=PRIORITY_NEW_SLOTS, **kwargs):
+        return await self.submit(chat_id, lambda: client.edit_message(chat_id, message_id, text, **kwargs), priority)
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    # --- внутрішнє ---
+
+    def _ensure_worker(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    def _put(self, job):
+        self._queue.put_nowait((job.priority, next(self._seq), job))
+
+    def _bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return bucket
+
+    def _group_window(self, chat_id):
+        """WindowLimit для групи чи каналу, None — для особистого чату"""
+        if chat_id not in self._group_windows:
+            self._group_windows[chat_id] = (
+                WindowLimit(self.group_limit, self.group_period)
+                if self.group_limit and is_group_chat(chat_id) else None
+            )
+        return self._group_windows[chat_id]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            job = item[2]
+            if job.future.done():
+                continue
+
+            now = time.monotonic()
+            window = self._group_window(job.chat_id)
+            wait = max(
+                self._blocked_until.get(job.chat_id, 0) - now,
+                self._bucket(job.chat_id).delay(now),
+                window.delay(now) if window else 0.0,
+                self._global_bucket.delay(now),
+            )
+            if wait > 0:
+                # Чат ще не готовий — відкладаємо, не блокуючи інші чати
+                loop.call_later(wait, self._queue.put_nowait, item)
+                continue
+
+            self._bucket(job.chat_id).consume(now)
+            if window:
+                window.consume(now)
+            self._global_bucket.consume(now)
+            task = asyncio.create_task(self._execute(job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, job):
+        if job.attempts == 0:
+            SEND_QUEUE_LATENCY.labels(priority=PRIORITY_NAMES.get(job.priority, job.priority)).observe(
+                time.monotonic() - job.enqueued_at
+            )
+
+        job.attempts += 1
+        try:
+            result = await job.factory()
+        except FloodWaitError as e:
+            self._blocked_until[job.chat_id] = time.monotonic() + e.seconds
+            FLOOD_WAITS.inc()
+            log.warning(f"⏳ FloodWait {e.seconds} с для чату {job.chat_id} (спроба {job.attempts})")
+            self._retry_or_fail(job, e)
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            self._retry_or_fail(job, e, delay=RETRY_BACKOFF * 2 ** (job.attempts - 1))
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _fail(self, job, error):
+        SEND_FAILURES.labels(priority=PRIORITY_NAMES.get(job.priority, job.priority)).inc()
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    def _retry_or_fail(self, job, error, delay=0):
+        if job.attempts > self.max_retries:
+            self._fail(job, error)
+            return
+        if delay:
+            asyncio.get_running_loop().call_later(delay, self._put, job)
+        else:
+            self._put(job)
@@ -0,0 +1,191 @@
+import os
+import time
+
+from parse_like_whore import SlotAnnouncement
+from coalescer import merge_slots
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# Скільки хвилин слот вважається відкритим без повторного оголошення; 0 — вимкнено
+SLOT_DELTA_TTL_MINUTES = int(os.getenv('SLOT_DELTA_TTL_MINUTES', '60'))
+
+NEW = 'new'          # про консульство нічого не відомо — публікуємо все
+ADDED = 'added'      # з'явились нові часи — публікуємо лише їх
+REMOVED = 'removed'  # частину часів забрали, нових немає — редагуємо пост
+SAME = 'same'        # той самий набір — дубль
+
+
+def slot_pairs(slots):
+    """((дата, (час, ...)), ...) -> {(дата, час), ...}"""
+    return {(date, slot_time) for date, times in slots for slot_time in times}
+
+
+def group_slots(pairs):
+    """{(дата, час), ...} -> ((дата, (час, ...)), ...) по порядку"""
+    return merge_slots(((date, (slot_time,)) for date, slot_time in pairs))
+
+
+class SlotDelta:
+    """Різниця між оголошенням і вже відомим набором відкритих слотів"""
+    __slots__ = ('kind', 'added', 'removed')
+
+    def __init__(self, kind, added=frozenset(), removed=frozenset()):
+        self.kind = kind
+        self.added = frozenset(added)
+        self.removed = frozenset(removed)
+
+    def announcement(self, base):
+        """Оголошення лише з новими часами (для ADDED)"""
+        return SlotAnnouncement(base.location, base.city, base.service, group_slots(self.added))
+
+    def __repr__(self):
+        return f"SlotDelta({self.kind}, +{len(self.added)}, -{len(self.removed)})"
+
+
+class LiveSlotTracker:
+    """
+    Відкриті зараз слоти (дата, час) по консульству і послузі.
+
+    Кожне оголошення порівнюється з відомим набором: нові часи — окремий
+    пост лише з ними, лише зникли — редагування постів, де вони були,
+    той самий набір — дубль. Слот забувається через ttl без повторного
+    оголошення або одразу, коли місто отримує "слоти зайняті".
+
+    Для редагувань трекер пам'ятає, який пост (ActivePost) оголосив які
+    слоти; посилання живуть, поки в пості лишається хоч один відкритий слот.
+    """
+
+    def __init__(self, ttl_minutes=SLOT_DELTA_TTL_MINUTES):
+        self.ttl = ttl_minutes * 60
+        self._open = {}   # {(місто, послуга): {(дата, час): коли востаннє бачили}}
+        self._posts = {}  # {(місто, послуга): [[ActivePost, {(дата, час), ...}], ...]}
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _expire(self, key, now):
+        open_slots = self._open.get(key)
+        if not open_slots:
+            return {}
+        limit = now - self.ttl
+        for pair in [pair for pair, seen_at in open_slots.items() if seen_at <= limit]:
+            del open_slots[pair]
+        if not open_slots:
+            del self._open[key]
+            self._posts.pop(key, None)
+        return open_slots
+
+    def observe(self, announcement, now=None):
+        """Порівнює оголошення з відкритим набором і робить його поточним"""
+        if not self.enabled:
+            return SlotDelta(NEW, slot_pairs(announcement.slots))
+        now = time.time() if now is None else now
+        key = (announcement.city, announcement.service)
+        known = self._expire(key, now)
+        incoming = slot_pairs(announcement.slots)
+
+        added = incoming - known.keys()
+        removed = known.keys() - incoming
+        if not known:
+            kind = NEW
+        elif added:
+            kind = ADDED
+        elif removed:
+            kind = REMOVED
+        else:
+            kind = SAME
+
+        self._open[key] = {pair: now for pair in incoming}
+        return SlotDelta(kind, added, removed)
+
+    def forget(self, city, service, pairs):
+        """Пост з цими слотами не відправився — наступне оголошення знову їх опублікує"""
+        open_slots = self._open.get((city, service))
+        if not open_slots:
+            return
+        for pair in pairs:
+            open_slots.pop(pair, None)
+        if not open_slots:
+            self.clear_key((city, service))
+
+    def attach(self, city, service, pairs, post):
+        """Запам'ятовує пост, що оголосив ці слоти (для майбутніх редагувань)"""
+        if not self.enabled or post is None or not pairs:
+            return
+        for entry in self._posts.setdefault((city, service), []):
+            if entry[0] is post:
+                entry[1] |= set(pairs)
+                return
+        self._posts[(city, service)].append([post, set(pairs)])
+
+    def shrunk_posts(self, city, service):
+        """
+        Пости, частина слотів яких уже не відкрита: [(ActivePost, залишок слотів)].
+        Залишок запам'ятовується як новий вміст поста.
+        """
+        key = (city, service)
+        open_slots = self._open.get(key, {})
+        shrunk, alive = [], []
+        for post, pairs in self._posts.get(key, ()):
+            remaining = pairs & open_slots.keys()
+            if remaining != pairs:
+                shrunk.append((post, group_slots(remaining)))
+            if remaining:
+                alive.append([post, remaining])
+        if alive:
+            self._posts[key] = alive
+        else:
+            self._posts.pop(key, None)
+        return shrunk
+
+    def clear_key(self, key):
+        self._open.pop(key, None)
+        self._posts.pop(key, None)
+
+    def clear_city(self, city):
+        """Слоти міста зайняті — усе відкрите по ньому більше неактуальне"""
+        for key in [key for key in self._open.keys() | self._posts.keys() if key[0] == city]:
+            self.clear_key(key)
+
+    def __len__(self):
+        return sum(len(open_slots) for open_slots in self._open.values())
+
+
+def test_slot_delta():
+    def announcement(slots):
+        return SlotAnnouncement("Генеральне Консульство України в Торонто", "Торонто", "Паспорт", slots)
+
+    tracker = LiveSlotTracker(ttl_minutes=60)
+    first = announcement((("17.08.2025", ("11:15", "11:25")),))
+    delta = tracker.observe(first, now=0)
+    assert delta.kind == NEW and len(delta.added) == 2, delta
+    tracker.attach("Торонто", "Паспорт", delta.added, "post-1")
+
+    assert tracker.observe(first, now=60).kind == SAME
+
+    grown = announcement((("17.08.2025", ("11:15", "11:25")), ("18.08.2025", ("09:30",))))
+    delta = tracker.observe(grown, now=120)
+    assert delta.kind == ADDED and delta.added == {("18.08.2025", "09:30")}, delta
+    assert delta.announcement(grown).slots == (("18.08.2025", ("09:30",)),)
+    tracker.attach("Торонто", "Паспорт", delta.added, "post-2")
+
+    shrunk = announcement((("17.08.2025", ("11:15",)), ("18.08.2025", ("09:30",))))
+    delta = tracker.observe(shrunk, now=180)
+    assert delta.kind == REMOVED and delta.removed == {("17.08.2025", "11:25")}, delta
+    assert tracker.shrunk_posts("Торонто", "Паспорт") == [("post-1", (("17.08.2025", ("11:15",)),))]
+
+    # Час повернувся — знову новина (хеш-антидубль це приховав би)
+    assert tracker.observe(grown, now=240).kind == ADDED
+
+    # Після ttl без оголошень — усе спочатку
+    assert tracker.observe(grown, now=240 + 3600).kind == NEW
+
+    tracker.clear_city("Торонто")
+    assert len(tracker) == 0 and tracker.observe(first, now=0).kind == NEW
+    print("✅ slot_delta OK")
+
+
+if __name__ == "__main__":
+    test_slot_delta()
@@ -0,0 +1,325 @@
+"""
+Роздільний режим (RUN_MODE=split): три процеси під одним наглядачем.
+
+- ingest    — user_client: парсинг, антидубль за msg_id, запис у довговічну чергу outbox;
+- publisher — bot_client без апдейтів: розбирає outbox і публікує/редагує пости,
+              тихі попередження, обслуговування БД, ендпоінт метрик;
+- stats     — bot_client з апдейтами: /start, /metrics, кнопки статистики.
+
+Черга — таблиця outbox у тій самій SQLite (WAL), тож перезапуск будь-якого
+процесу не губить оголошень: ingest пише запис у пачці з групового коміту,
+publisher видаляє його лише в пачці разом з рядком processed.
+
+    python split_mode.py                  # наглядач
+    python split_mode.py --role publisher # один процес (для systemd тощо)
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import subprocess
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from app_logging import setup_logging, stop_logging, get_logger
+
+log = get_logger("split")
+
+ROLES = ("ingest", "publisher", "stats")
+
+# Як часто publisher перевіряє outbox, коли вона порожня (мс)
+OUTBOX_POLL_MS = int(os.getenv("OUTBOX_POLL_MS", "20"))
+# Скільки запис лишається невидимим після claim (секунд)
+OUTBOX_VISIBILITY_SECONDS = 60
+# Після стількох невдалих спроб запис відкидається
+OUTBOX_MAX_ATTEMPTS = 5
+# Скільки записів outbox publisher обробляє одночасно
+OUTBOX_MAX_IN_FLIGHT = int(os.getenv("OUTBOX_MAX_IN_FLIGHT", "32"))
+# Пауза перед перезапуском процесу, що впав (секунд, росте до максимуму)
+RESTART_BACKOFF = (1, 2, 5, 10, 30)
+
+
+class QueuedEvent:
+    """Повідомлення джерела з outbox — те саме, що потрібно main.handler"""
+
+    def __init__(self, msg_id, raw_text, date=None, sender_id=None, received_at=None):
+        self.id = msg_id
+        self.raw_text = raw_text
+        self.date = datetime.fromisoformat(date) if date else None
+        self.sender_id = sender_id
+        self.received_at = received_at  # time.time() в ingest — затримка рахується від нього
+
+
+# ============================================================
+# INGEST
+# ============================================================
+
+async def run_ingest():
+    import main
+    from telethon import events
+    from parse_like_whore import parse_announcement, parse_slots_gone_message
+    from metrics import MESSAGES
+
+    dedup_cache = main.dedup_cache
+    persistence = main.persistence
+
+    def enqueue(event, kind, catch_up=False, **fields):
+        payload = {
+            'raw_text': event.raw_text,
+            'date': event.date.isoformat() if getattr(event, 'date', None) else None,
+            'sender_id': getattr(event, 'sender_id', None),
+            'received_at': time.time(),
+            **fields,
+        }
+        if catch_up:
+            payload['catch_up'] = True
+        persistence.put('enqueue_outbox', event.id, kind, payload)
+
+    async def ingest_handler(event, catch_up=False):
+        msg_id = event.id
+        if not main.state_ready.is_set():
+            await main.state_ready.wait()
+        if dedup_cache.is_processed(msg_id):
+            MESSAGES.labels(result='duplicate').inc()
+            return
+
+        _, city, _, _ = parse_slots_gone_message(event.raw_text)
+        if city:
+            enqueue(event, 'gone', catch_up, city=city)
+            MESSAGES.labels(result='gone').inc()
+        else:
+            announcement = parse_announcement(event.raw_text)
+            if announcement is None:
+                MESSAGES.labels(result='unrecognized').inc()
+                persistence.put('insert_processed', msg_id, None)
+            else:
+                # Дубль чи нові часи вирішує publisher: лише він знає відкриті слоти
+                enqueue(
+                    event, 'new_slots', catch_up,
+                    city=announcement.city,
+                    service=announcement.service,
+                    slots=announcement.slots,
+                    content_hash=announcement.content_hash,
+                )
+                MESSAGES.labels(result='parsed').inc()
+                log.info("📥 Оголошення в черзі outbox",
+                         extra={'msg_id': msg_id, 'city': announcement.city, 'slots': announcement.total_slots})
+        dedup_cache.mark_processed(msg_id)
+
+    # Звичайний хендлер публікує сам — в ingest його замінює запис у чергу
+    main.user_client.remove_event_handler(main.handler)
+    main.user_client.add_event_handler(ingest_handler, events.NewMessage(from_users=main.source_user))
+    # Той самий догін, що й у main: позицію запам'ятовує prepare_state
+    catch_up = main.catch_up
+    catch_up.handler = ingest_handler
+
+    try:
+        await asyncio.gather(main.prepare_state(), main.user_client.start())
+        if not await main.resolve_entities(source=True, channels=False):
+            return
+        log.info("🎯 INGEST готовий", extra={'startup_ms': round((time.perf_counter() - main.STARTED_PERF) * 1000, 1)})
+        main._spawn(catch_up.watch())
+        await main.user_client.run_until_disconnected()
+    finally:
+        await main.persistence.close()
+        main.storage.close()
+
+
+# ============================================================
+# PUBLISHER
+# ============================================================
+
+async def dispatch_outbox_row(main, outbox_id, msg_id, kind, payload, attempts, after=()):
+    """Один запис outbox через звичайний main.handler; ack — лише після нього"""
+    if after:
+        # "Зайнято" редагує пост оголошення — воно має бути вже опубліковане
+        await asyncio.wait(after)
+    if attempts > OUTBOX_MAX_ATTEMPTS:
+        log.error("❌ Запис outbox відкинуто після невдалих спроб",
+                  extra={'msg_id': msg_id, 'kind': kind, 'attempts': attempts})
+    else:
+        event = QueuedEvent(msg_id, payload['raw_text'], payload.get('date'), payload.get('sender_id'),
+                            payload.get('received_at'))
+        try:
+            await main.handler(event, catch_up=payload.get('catch_up', False))
+        except Exception:
+            # Без ack: запис знову стане видимим після OUTBOX_VISIBILITY_SECONDS
+            log.exception("❌ Помилка обробки запису outbox", extra={'msg_id': msg_id, 'kind': kind})
+            return
+    # ack — у тій самій пачці write-behind, що й рядок processed
+    main.persistence.put('ack_outbox', outbox_id)
+
+
+async def drain_outbox(main, poll_interval=OUTBOX_POLL_MS / 1000, max_in_flight=OUTBOX_MAX_IN_FLIGHT):
+    """
+    Розбирає outbox у порядку надходження: кожен запис — окрема задача,
+    не більше max_in_flight одночасно. Як і хендлери Telethon в одному
+    процесі, записи не чекають один на одного — FloodWait чи повільний
+    канал затримує лише свої пости, а не всі наступні оповіщення.
+    Виняток — "зайнято": чекає попередніх записів свого міста.
+    """
+    in_flight = {}  # {outbox_id: задача}
+    by_city = {}  # {місто: {задачі в роботі}}
+
+    def forget(task, outbox_id, city):
+        in_flight.pop(outbox_id, None)
+        city_tasks = by_city.get(city)
+        if city_tasks is not None:
+            city_tasks.discard(task)
+            if not city_tasks:
+                del by_city[city]
+
+    while True:
+        free = max_in_flight - len(in_flight)
+        if not free:
+            await asyncio.wait(in_flight.values(), return_when=asyncio.FIRST_COMPLETED)
+            continue
+
+        rows = await main.storage.claim_outbox(limit=free, visibility_seconds=OUTBOX_VISIBILITY_SECONDS)
+        # Запис, що довше за visibility чекає в задачі, claim віддасть знову — його ack'не та задача
+        rows = [row for row in rows if row[0] not in in_flight]
+        if not rows:
+            await asyncio.sleep(poll_interval)
+            continue
+
+        for row in rows:
+            outbox_id, _, kind, payload, _ = row
+            city = payload.get('city')
+            city_tasks = by_city.setdefault(city, set())
+            after = tuple(city_tasks) if kind == 'gone' else ()
+            task = asyncio.create_task(dispatch_outbox_row(main, *row, after=after))
+            in_flight[outbox_id] = task
+            city_tasks.add(task)
+            task.add_done_callback(lambda task, outbox_id=outbox_id, city=city: forget(task, outbox_id, city))
+
+
+async def run_publisher():
+    import main
+    from telethon import TelegramClient
+
+    # Окрема сесія без апдейтів: команди й кнопки обробляє процес stats
+    main.bot_client = TelegramClient('bot_publisher', main.api_id, main.api_hash, receive_updates=False)
+
+    try:
+        await asyncio.gather(main.prepare_state(), main.bot_client.start(bot_token=main.bot_token))
+        if not await main.resolve_entities(source=False, channels=True):
+            return
+        log.info("🎯 PUBLISHER готовий", extra={'startup_ms': round((time.perf_counter() - main.STARTED_PERF) * 1000, 1)})
+        main._spawn(main.deferred_startup())
+        await drain_outbox(main)
+    finally:
+        await main.send_scheduler.stop()
+        await main.persistence.close()
+        main.storage.close()
+
+
+# ============================================================
+# STATS
+# ============================================================
+
+async def run_stats():
+    import main
+
+    # Лічильник версій у пам'яті тут не змінюється — беремо версію з БД
+    main.stats_handler.version_source = main.storage.get_processed_watermark
+
+    try:
+        await asyncio.gather(main.storage.init(), main.bot_client.start(bot_token=main.bot_token))
+        log.info("🎯 STATS готовий", extra={'startup_ms': round((time.perf_counter() - main.STARTED_PERF) * 1000, 1)})
+        await main.bot_client.run_until_disconnected()
+    finally:
+        main.storage.close()
+
+
+ROLE_RUNNERS = {
+    "ingest": run_ingest,
+    "publisher": run_publisher,
+    "stats": run_stats,
+}
+
+
+# ============================================================
+# НАГЛЯДАЧ
+# ============================================================
+
+def _start_role(role):
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--role", role])
+
+
+def supervise(roles=ROLES):
+    """Запускає процеси ролей і перезапускає ті, що завершились"""
+    engine = os.getenv('STORAGE_ENGINE', 'sqlite')
+    if engine != 'sqlite':
+        # Черга й стан спільні між процесами лише через файл БД
+        raise SystemExit(f"❌ Роздільний режим потребує STORAGE_ENGINE=sqlite (зараз {engine})")
+    processes = {role: _start_role(role) for role in roles}
+    restarts = {role: 0 for role in roles}
+    restart_at = {}
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    log.info("🧭 Роздільний режим запущено", extra={'pids': {role: p.pid for role, p in processes.items()}})
+
+    try:
+        while not stopping:
+            time.sleep(0.5)
+            now = time.monotonic()
+            for role, process in processes.items():
+                code = process.poll()
+                if code is None:
+                    continue
+                if role not in restart_at:
+                    delay = RESTART_BACKOFF[min(restarts[role], len(RESTART_BACKOFF) - 1)]
+                    restart_at[role] = now + delay
+                    log.warning(f"⚠️ Процес {role} завершився (код {code}), перезапуск через {delay} с")
+                elif now >= restart_at.pop(role):
+                    restarts[role] += 1
+                    processes[role] = _start_role(role)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log.info("👋 Зупиняю процеси роздільного режиму")
+        for process in processes.values():
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+        for process in processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def run_role(role):
+    setup_logging()
+    try:
+        asyncio.run(ROLE_RUNNERS[role]())
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        log.exception(f"❌ Процес {role} впав")
+        raise SystemExit(1)
+    finally:
+        stop_logging()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Роздільний режим: ingest / publisher / stats")
+    parser.add_argument("--role", choices=ROLES, help="запустити один процес замість наглядача")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.role:
+        run_role(args.role)
+    else:
+        setup_logging()
+        try:
+            supervise()
+        finally:
+            stop_logging()
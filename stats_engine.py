@@ -0,0 +1,273 @@
+"""
+Статистика по колонках замість циклу по рядках.
+
+Період завантажується один раз як колонки (епоха UTC, місто, послуга,
+кількість слотів). Локальна година — через таблицю "година UTC -> година
+в Канаді": зсув сталий між переходами DST, тож pytz питаємо лише кілька
+десятків разів на період (межі відрізків + бісекція переходу), а не для
+кожного рядка. Гістограми — Counter (рахує в C), транспонування —
+map(itemgetter), тож цикл Python на рядок лишається лише в години.
+"""
+import json
+import heapq
+from operator import itemgetter
+from collections import Counter
+from datetime import datetime
+
+import pytz
+
+CANADA_TZ = pytz.timezone('America/Toronto')
+PERCENTILES = (50, 90)
+
+
+# Два переходи DST ніколи не трапляються ближче, ніж за стільки годин
+SEGMENT_HOURS = 30 * 24
+
+
+def _offset(bucket, tz):
+    return int(datetime.fromtimestamp(bucket * 3600, tz).utcoffset().total_seconds())
+
+
+def offset_segments(first_bucket, last_bucket, tz=CANADA_TZ):
+    """
+    Зсув локального часу на проміжку годин UTC [first_bucket, last_bucket]:
+    (межі, зсуви) — з межі bounds[i] діє offsets[i] секунд. DST змінюється
+    лише на межі години, тож межі знаходяться точно.
+    """
+    bounds, offsets = [first_bucket], [_offset(first_bucket, tz)]
+
+    def split(lo, hi, lo_offset, hi_offset):
+        if lo_offset == hi_offset:
+            return
+        if hi - lo == 1:
+            bounds.append(hi)
+            offsets.append(hi_offset)
+            return
+        mid = (lo + hi) // 2
+        mid_offset = _offset(mid, tz)
+        split(lo, mid, lo_offset, mid_offset)
+        split(mid, hi, mid_offset, hi_offset)
+
+    lo, lo_offset = first_bucket, offsets[0]
+    while lo < last_bucket:
+        hi = min(lo + SEGMENT_HOURS, last_bucket)
+        hi_offset = _offset(hi, tz)
+        split(lo, hi, lo_offset, hi_offset)
+        lo, lo_offset = hi, hi_offset
+    return bounds, offsets
+
+
+def local_hour_table(first_bucket, last_bucket, tz=CANADA_TZ):
+    """[локальна година для кожної години UTC від first_bucket до last_bucket]"""
+    bounds, offsets = offset_segments(first_bucket, last_bucket, tz)
+    table = []
+    for start, end, offset in zip(bounds, bounds[1:] + [last_bucket + 1], offsets):
+        table.extend((bucket * 3600 + offset) // 3600 % 24 for bucket in range(start, end))
+    return table
+
+
+def nearest_rank(ordered, q):
+    """q-й перцентиль відсортованої послідовності (найближчий ранг)"""
+    if not len(ordered):
+        return 0
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))]
+
+
+def counted_rank(counts, q):
+    """nearest_rank для {значення: скільки разів} — без сортування всіх значень"""
+    total = sum(counts.values())
+    if not total:
+        return 0
+    rank = min(total - 1, max(0, round(q / 100 * (total - 1))))
+    for value in sorted(counts):
+        rank -= counts[value]
+        if rank < 0:
+            return value
+    return value
+
+
+class HistoryColumns:
+    """Сирі рядки періоду по колонках (див. Storage.get_statistics_history)"""
+    __slots__ = ('epochs', 'cities', 'services', 'slots')
+
+    def __init__(self, epochs, cities, services, slots):
+        self.epochs = epochs
+        self.cities = cities
+        self.services = services
+        self.slots = slots
+
+    @classmethod
+    def from_rows(cls, rows):
+        """rows: [(epoch, city, service, slots), ...]"""
+        # itemgetter через map — транспонування в C, без циклу Python на рядок
+        return cls(*(list(map(itemgetter(i), rows)) for i in range(4)))
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def local_hours(self, tz=CANADA_TZ):
+        """Година за локальним часом для кожного рядка"""
+        if not len(self):
+            return []
+        first = min(self.epochs) // 3600
+        table = local_hour_table(first, max(self.epochs) // 3600, tz)
+        return [table[epoch // 3600 - first] for epoch in self.epochs]
+
+
+class StatsSummary:
+    __slots__ = ('total_messages', 'total_slots', 'city_counts', 'service_counts', 'city_hours', 'slot_percentiles')
+
+    def __init__(self):
+        self.total_messages = 0
+        self.total_slots = 0
+        self.city_counts = {}      # {місто: повідомлень}
+        self.service_counts = {}   # {послуга: повідомлень}
+        self.city_hours = {}       # {місто: {година: повідомлень}}
+        self.slot_percentiles = {}  # {q: слотів у повідомленні} — лише сирі рядки
+
+    def top_cities(self, limit=3):
+        return heapq.nsmallest(limit, self.city_counts.items(), key=lambda item: (-item[1], item[0]))
+
+    def top_hours(self, city, limit=3):
+        hours = self.city_hours.get(city, {})
+        return heapq.nsmallest(limit, hours.items(), key=lambda item: (-item[1], item[0]))
+
+
+def _bump(mapping, key, count):
+    if count:
+        mapping[key] = mapping.get(key, 0) + count
+
+
+def _summarize_history(history, summary, percentiles):
+    summary.total_messages += len(history)
+    summary.total_slots += sum(history.slots)
+
+    # Counter рахує в C
+    for city, count in Counter(history.cities).items():
+        _bump(summary.city_counts, city, count)
+    for service, count in Counter(history.services).items():
+        if service:
+            _bump(summary.service_counts, service, count)
+
+    for (city, hour), count in Counter(zip(history.cities, history.local_hours())).items():
+        _bump(summary.city_hours.setdefault(city, {}), hour, count)
+
+    slot_counts = Counter(history.slots)
+    summary.slot_percentiles = {q: counted_rank(slot_counts, q) for q in percentiles}
+
+
+def summarize(history, daily=(), percentiles=PERCENTILES):
+    """
+    Підсумки періоду: сирі рядки (HistoryColumns) + згорнуті дні
+    (рядки daily_stats: місто, послуга, повідомлень, слотів, JSON годин).
+    """
+    summary = StatsSummary()
+    for city, service, messages, slots, hours in daily:
+        summary.total_messages += messages
+        summary.total_slots += slots
+        _bump(summary.city_counts, city, messages)
+        if service:
+            _bump(summary.service_counts, service, messages)
+        city_hours = summary.city_hours.setdefault(city, {})
+        for hour, count in json.loads(hours).items():
+            _bump(city_hours, int(hour), count)
+
+    if len(history):
+        _summarize_history(history, summary, percentiles)
+    return summary
+
+
+class LifetimeStats:
+    """
+    Вікна "слоти відкриті": скільки секунд вони жили і чи встигав наш пост.
+    Вікно "вигране", якщо затримка від отримання до посту менша за його
+    тривалість; вікна без виміряної затримки в частку не входять.
+    """
+    __slots__ = ('lifetimes', 'latencies', 'beaten')
+
+    def __init__(self):
+        self.lifetimes = []  # секунд
+        self.latencies = []  # мс — лише вікна, прив'язані до нашого посту
+        self.beaten = 0
+
+    def add(self, lifetime_seconds, latency_ms=None):
+        self.lifetimes.append(lifetime_seconds)
+        if latency_ms is not None:
+            self.latencies.append(latency_ms)
+            if latency_ms < lifetime_seconds * 1000:
+                self.beaten += 1
+
+    def __len__(self):
+        return len(self.lifetimes)
+
+    def lifetime_percentiles(self, percentiles=(10, 50)):
+        ordered = sorted(self.lifetimes)
+        return {q: nearest_rank(ordered, q) for q in percentiles}
+
+    def latency_percentiles(self, percentiles=(50, 90)):
+        ordered = sorted(self.latencies)
+        return {q: nearest_rank(ordered, q) for q in percentiles}
+
+    @property
+    def beat_ratio(self):
+        """Частка виміряних вікон, які ми встигли, або None"""
+        return self.beaten / len(self.latencies) if self.latencies else None
+
+
+def summarize_lifetimes(rows):
+    """
+    rows: [(місто, послуга, година відкриття, секунд, затримка мс або None)]
+    (див. Storage.get_slot_lifetimes) -> (усі вікна, {місто: ...}, {(місто, година): ...})
+    """
+    total, by_city, by_hour = LifetimeStats(), {}, {}
+    for city, _, hour, lifetime_seconds, latency_ms in rows:
+        for stats in (total, by_city.setdefault(city, LifetimeStats()),
+                      by_hour.setdefault((city, hour), LifetimeStats())):
+            stats.add(lifetime_seconds, latency_ms)
+    return total, by_city, by_hour
+
+
+def test_stats_engine():
+    import calendar
+
+    def epoch(text):
+        return calendar.timegm(datetime.strptime(text, '%Y-%m-%d %H:%M:%S').timetuple())
+
+    rows = [
+        (epoch('2025-08-17 14:05:00'), 'Торонто', 'Паспорт', 3),   # 10:05 EDT
+        (epoch('2025-08-18 14:40:00'), 'Торонто', 'Паспорт', 1),   # 10:40 EDT
+        (epoch('2025-12-01 15:10:00'), 'Торонто', None, 2),        # 10:10 EST
+        (epoch('2025-08-17 20:00:00'), 'Ванкувер', 'Паспорт', 5),  # 16:00 EDT
+    ]
+    daily = [('Ванкувер', 'Паспорт', 2, 4, '{"16": 1, "9": 1}')]
+
+    summary = summarize(HistoryColumns.from_rows(rows), daily)
+    assert summary.total_messages == 6 and summary.total_slots == 15
+    assert summary.top_cities() == [('Ванкувер', 3), ('Торонто', 3)], summary.top_cities()
+    assert summary.city_hours['Торонто'] == {10: 3}, summary.city_hours
+    assert summary.city_hours['Ванкувер'] == {16: 2, 9: 1}
+    assert summary.service_counts == {'Паспорт': 5}
+    assert summary.slot_percentiles == {50: 3, 90: 5}, summary.slot_percentiles
+    assert summarize(HistoryColumns.from_rows([])).total_messages == 0
+
+    # Таблиця годин збігається з pytz по кожній годині року, включно з переходами DST
+    first = epoch('2025-01-01 00:00:00') // 3600
+    table = local_hour_table(first, first + 366 * 24)
+    for bucket in range(first, first + 366 * 24 + 1):
+        assert table[bucket - first] == datetime.fromtimestamp(bucket * 3600, CANADA_TZ).hour, bucket
+
+    total, by_city, by_hour = summarize_lifetimes([
+        ('Торонто', 'Паспорт', 10, 30, 800.0),    # встигли
+        ('Торонто', 'Паспорт', 10, 1, 1500.0),    # слот зник раніше за пост
+        ('Торонто', '', 14, 120, None),           # оголошення до перезапуску — затримка невідома
+        ('Ванкувер', 'Паспорт', 16, 600, 900.0),
+    ])
+    assert len(total) == 4 and total.beaten == 2 and total.beat_ratio == 2 / 3
+    assert by_city['Торонто'].lifetime_percentiles() == {10: 1, 50: 30}
+    assert by_hour[('Торонто', 10)].beat_ratio == 0.5 and by_hour[('Торонто', 14)].beat_ratio is None
+    assert LifetimeStats().lifetime_percentiles() == {10: 0, 50: 0}
+    print("✅ stats_engine OK")
+
+
+if __name__ == "__main__":
+    test_stats_engine()
@@ -0,0 +1,616 @@
+"""
+Сховище бота: один інтерфейс, два рушії (STORAGE_ENGINE).
+
+- sqlite — db.py: WAL, потік-записувач, міграції; файл з DB_FILE;
+- memory — усе в пам'яті процесу з тією ж семантикою (бенчмарки,
+           перевірки, короткі запуски без диска).
+
+Записи йдуть пачками: write_batch([(назва операції, args, kwargs), ...]),
+назви — WRITE_OPS. Операція може повернути дію, яку треба виконати після
+коміту (оновлення in-memory агрегатів), як db.*_op.
+"""
+import os
+import json
+import time
+import heapq
+import asyncio
+import functools
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytz
+
+import db
+from forecast import forecast_index, cell_key, decayed_add
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+CANADA_TZ = pytz.timezone('America/Toronto')
+
+WRITE_OPS = (
+    'insert_processed',
+    'insert_sent_posts',
+    'update_sent_posts_text',
+    'mark_gone_processed',
+    'insert_slot_lifetime',
+    'enqueue_outbox',
+    'ack_outbox',
+)
+
+
+class Storage(ABC):
+    """
+    Що потрібно боту від сховища:
+
+    - антидублі: get_dedup_state, get_processed_ids, get_processed_watermark;
+    - оголошення та пости в каналах: write_batch, get_active_posts;
+    - статистика: get_statistics_data, get_statistics_history, get_daily_stats,
+      get_top_slot_*, get_slot_lead_times, get_slot_lifetimes, get_forecast_cells, get_stats_version;
+    - черга роздільного режиму: claim_outbox, get_outbox_depth;
+    - обслуговування: compact, reclaim_space, checkpoint.
+
+    Рушій без будь-якого з цих методів не створиться (TypeError).
+    """
+
+    name = None  # значення STORAGE_ENGINE
+
+    @abstractmethod
+    async def init(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def close(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def write_batch(self, ops):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def checkpoint(self, mode='TRUNCATE'):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_dedup_state(self, minutes=60, max_ids=5000):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_processed_ids(self, msg_ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_processed_watermark(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_active_posts(self, hours=24):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_statistics_data(self, days=30):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_statistics_history(self, days=30):
+        """[(епоха UTC, місто, послуга, слотів)] — сирі рядки для stats_engine"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_daily_stats(self, days=30):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_top_slot_dates(self, city=None, days=30, limit=5):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_top_slot_times(self, city=None, days=30, limit=5):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_slot_lead_times(self, city=None, days=30):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_slot_lifetimes(self, days=30):
+        """[(місто, послуга, година відкриття, секунд, затримка мс або None)]"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_forecast_cells(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_stats_version(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def claim_outbox(self, limit=50, visibility_seconds=60):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_outbox_depth(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def compact(self, hot_days=db.HOT_DAYS):
+        """Згортає сирі рядки старші за hot_days у денні агрегати; повертає кількість"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def reclaim_space(self):
+        """Повертає ОС вільне місце; (чи був повний VACUUM, звільнено сторінок)"""
+        raise NotImplementedError
+
+    # --- прогрів in-memory індексів (спільне для всіх рушіїв) ---
+
+    async def load_forecast_index(self):
+        rows, since = await self.get_forecast_cells()
+        forecast_index.load(rows, since)
+
+
+# ============================================================
+# SQLITE
+# ============================================================
+
+SQLITE_OPS = {
+    'insert_processed': db.insert_processed_op,
+    'insert_sent_posts': db.insert_sent_posts_op,
+    'update_sent_posts_text': db.update_sent_posts_text_op,
+    'mark_gone_processed': db.mark_gone_processed_op,
+    'insert_slot_lifetime': db.insert_slot_lifetime_op,
+    'enqueue_outbox': db.enqueue_outbox_op,
+    'ack_outbox': db.ack_outbox_op,
+}
+
+
+class SQLiteStorage(Storage):
+    """Тонка обгортка над async-функціями db.py"""
+
+    name = 'sqlite'
+
+    def __init__(self, path=None):
+        # Шлях треба задати до першого з'єднання — вони довготривалі
+        if path:
+            db.DB_FILE = path
+        self.path = db.DB_FILE
+
+    async def init(self):
+        await db.init_db_async()
+
+    def close(self):
+        db.close_db()
+
+    async def write_batch(self, ops):
+        return await db.write_batch_async([(SQLITE_OPS[name], args, kwargs) for name, args, kwargs in ops])
+
+    async def checkpoint(self, mode='TRUNCATE'):
+        return await db.checkpoint_db_async(mode)
+
+    async def get_dedup_state(self, minutes=60, max_ids=5000):
+        return await db.get_dedup_state_async(minutes, max_ids)
+
+    async def get_processed_ids(self, msg_ids):
+        return await db.get_processed_ids_async(msg_ids)
+
+    async def get_processed_watermark(self):
+        return await db.get_processed_watermark_async()
+
+    async def get_active_posts(self, hours=24):
+        return await db.get_active_posts_async(hours)
+
+    async def get_statistics_data(self, days=30):
+        return await db.get_statistics_data_async(days)
+
+    async def get_statistics_history(self, days=30):
+        return await db.get_statistics_history_async(days)
+
+    async def get_daily_stats(self, days=30):
+        return await db.get_daily_stats_async(days)
+
+    async def get_top_slot_dates(self, city=None, days=30, limit=5):
+        return await db.get_top_slot_dates_async(city, days, limit)
+
+    async def get_top_slot_times(self, city=None, days=30, limit=5):
+        return await db.get_top_slot_times_async(city, days, limit)
+
+    async def get_slot_lead_times(self, city=None, days=30):
+        return await db.get_slot_lead_times_async(city, days)
+
+    async def get_slot_lifetimes(self, days=30):
+        return await db.get_slot_lifetimes_async(days)
+
+    async def get_forecast_cells(self):
+        return await db.get_forecast_cells_async()
+
+    async def get_stats_version(self):
+        return db.get_stats_version()
+
+    async def claim_outbox(self, limit=50, visibility_seconds=60):
+        return await db.claim_outbox_async(limit, visibility_seconds)
+
+    async def get_outbox_depth(self):
+        return await db.get_outbox_depth_async()
+
+    async def compact(self, hot_days=db.HOT_DAYS):
+        return await db.compact_processed_async(hot_days)
+
+    async def reclaim_space(self):
+        vacuumed = await db.enable_incremental_vacuum_async()
+        free_pages = await db.incremental_vacuum_async()
+        return vacuumed, free_pages
+
+
+# ============================================================
+# ПАМ'ЯТЬ
+# ============================================================
+
+def _utc_now():
+    """Як CURRENT_TIMESTAMP у SQLite: UTC, '%Y-%m-%d %H:%M:%S'"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _utc_ago(**delta):
+    return (datetime.now(timezone.utc) - timedelta(**delta)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _canada_since(days):
+    return (datetime.now(CANADA_TZ) - timedelta(days=days)).date().isoformat()
+
+
+class ProcessedRow:
+    __slots__ = ('msg_id', 'content_hash', 'epoch', 'timestamp', 'city', 'service', 'slots_count',
+                 'canada_time', 'sent_msg_id', 'is_gone', 'latency_ms')
+
+    def __init__(self, msg_id, content_hash=None, city=None, service=None, slots_count=None,
+                 canada_time=None, sent_msg_id=None, is_gone=False, latency_ms=None):
+        self.msg_id = msg_id
+        self.content_hash = content_hash
+        self.epoch = int(time.time())
+        self.timestamp = datetime.fromtimestamp(self.epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        self.city = city
+        self.service = service
+        self.slots_count = slots_count
+        self.canada_time = canada_time
+        self.sent_msg_id = sent_msg_id
+        self.is_gone = is_gone
+        self.latency_ms = latency_ms
+
+
+class MemoryStorage(Storage):
+    """
+    Ті самі таблиці, що й у SQLite, але словниками в пам'яті процесу.
+    Після перезапуску даних немає — лише для бенчмарків і перевірок.
+    Усі виклики — з event loop, тож блокування не потрібні.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._processed = {}   # {msg_id: ProcessedRow}
+        self._slots = {}       # {(msg_id, slot_date, slot_time): (city, service, announced_date)}
+        self._daily = {}       # {(local_date, city, service): [messages, slots, {година: кількість}]}
+        self._cells = {}       # {(city, weekday, hour): [value, updated_at, first_seen]}
+        self._sent_posts = {}  # {(msg_id, chat_id): [sent_msg_id, city, content_hash, is_gone, created_at, text]}
+        self._lifetimes = {}   # {gone_msg_id: (msg_id, city, service, lifetime_seconds, latency_ms, local_date, hour)}
+        self._outbox = {}      # {id: [msg_id, kind, payload, created_at, claimed_until, attempts]}
+        self._outbox_ids = 0
+        self._version = 0
+
+    async def init(self):
+        log.info("🧪 Сховище в пам'яті: дані не переживуть перезапуск")
+
+    def close(self):
+        pass
+
+    async def write_batch(self, ops):
+        after_commit = []
+        for name, args, kwargs in ops:
+            action = getattr(self, f'_{name}')(*args, **kwargs)
+            if action:
+                after_commit.append(action)
+        for action in after_commit:
+            action()
+        return len(ops)
+
+    async def checkpoint(self, mode='TRUNCATE'):
+        return None
+
+    # --- операції запису (як db.*_op) ---
+
+    def _insert_processed(self, msg_id, content_hash, city=None, service=None, slots_count=None,
+                          available_dates=None, sent_msg_id=None, slots=None, latency_ms=None):
+        if msg_id in self._processed:
+            return None
+        canada_time = datetime.now(pytz.UTC).astimezone(CANADA_TZ)
+        self._processed[msg_id] = ProcessedRow(msg_id, content_hash, city, service, slots_count,
+                                               canada_time.isoformat(), sent_msg_id, latency_ms=latency_ms)
+        if not city:
+            return None
+
+        if slots is None and available_dates:
+            slots = [(date, ()) for date in available_dates]
+        announced_date = canada_time.date().isoformat()
+        for date, times in slots or ():
+            for slot_time in times or ('',):
+                self._slots.setdefault((msg_id, db._slot_date(date), slot_time),
+                                       (city, service or '', announced_date))
+
+        key = cell_key(city, canada_time)
+        now_ts = canada_time.timestamp()
+        cell = self._cells.get(key)
+        value = decayed_add(cell[0] if cell else 0.0, cell[1] if cell else None, now_ts, forecast_index.tau)
+        self._cells[key] = [value, now_ts, cell[2] if cell else now_ts]
+
+        return functools.partial(self._after_stats_insert, (*key, value, now_ts))
+
+    def _after_stats_insert(self, cell):
+        self._version += 1
+        forecast_index.set_cell(*cell)
+
+    def _insert_sent_posts(self, msg_id, city, content_hash, posts, text=None):
+        for chat_id, sent_msg_id in posts:
+            self._sent_posts[(msg_id, str(chat_id))] = [sent_msg_id, city, content_hash, False, _utc_now(), text]
+
+    def _update_sent_posts_text(self, msg_id, text):
+        for (post_msg_id, _), post in self._sent_posts.items():
+            if post_msg_id == msg_id:
+                post[5] = text
+
+    def _mark_gone_processed(self, content_hash, gone_msg_id, msg_id=None):
+        for row in self._processed.values():
+            if row.content_hash == content_hash:
+                row.is_gone = True
+        if msg_id is not None:
+            for (post_msg_id, _), post in self._sent_posts.items():
+                if post_msg_id == msg_id:
+                    post[3] = True
+        if gone_msg_id not in self._processed:
+            self._processed[gone_msg_id] = ProcessedRow(gone_msg_id, is_gone=True)
+
+    def _insert_slot_lifetime(self, gone_msg_id, city, lifetime_seconds, msg_id=None):
+        if gone_msg_id in self._lifetimes:
+            return
+        origin = self._processed.get(msg_id)
+        self._lifetimes[gone_msg_id] = (
+            msg_id, city, (origin.service if origin else None) or '', lifetime_seconds,
+            origin.latency_ms if origin else None, *db.lifetime_key(lifetime_seconds)
+        )
+
+    def _enqueue_outbox(self, msg_id, kind, payload):
+        if any(entry[0] == msg_id for entry in self._outbox.values()):
+            return
+        self._outbox_ids += 1
+        # Через JSON — щоб споживач отримав те саме, що й з SQLite
+        self._outbox[self._outbox_ids] = [msg_id, kind, json.dumps(payload, ensure_ascii=False), time.time(), 0, 0]
+
+    def _ack_outbox(self, outbox_id):
+        self._outbox.pop(outbox_id, None)
+
+    # --- антидублі ---
+
+    async def get_dedup_state(self, minutes=60, max_ids=5000):
+        msg_ids = heapq.nlargest(max_ids, self._processed)
+        since = _utc_ago(minutes=minutes)
+        latest = {}
+        for row in self._processed.values():
+            if row.content_hash is not None and row.timestamp > since and not row.is_gone:
+                latest[row.content_hash] = max(latest.get(row.content_hash, ''), row.timestamp)
+        return msg_ids, list(latest.items())
+
+    async def get_processed_ids(self, msg_ids):
+        return {msg_id for msg_id in msg_ids if msg_id in self._processed}
+
+    async def get_processed_watermark(self):
+        return max(self._processed, default=None)
+
+    async def get_active_posts(self, hours=24):
+        since = _utc_ago(hours=hours)
+        rows = [
+            (msg_id, chat_id, sent_msg_id, city, content_hash, text, created_at)
+            for (msg_id, chat_id), (sent_msg_id, city, content_hash, is_gone, created_at, text)
+            in self._sent_posts.items()
+            if not is_gone and created_at > since
+        ]
+        rows.sort(key=lambda row: row[6])
+        return rows
+
+    # --- статистика ---
+
+    async def get_statistics_data(self, days=30):
+        # Як у db.get_statistics_data: межа — локальний now() проти timestamp у UTC
+        since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        rows = [row for row in self._processed.values()
+                if row.city is not None and row.timestamp >= since]
+        rows.sort(key=lambda row: row.timestamp, reverse=True)
+        return [(row.city, row.service, row.slots_count, row.canada_time, row.timestamp) for row in rows]
+
+    async def get_statistics_history(self, days=30):
+        since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        return [(row.epoch, row.city, row.service, row.slots_count or 0) for row in self._processed.values()
+                if row.city is not None and row.timestamp >= since]
+
+    async def get_daily_stats(self, days=30):
+        since = _canada_since(days)
+        return [(city, service, messages, slots, json.dumps(hours, sort_keys=True))
+                for (local_date, city, service), (messages, slots, hours) in self._daily.items()
+                if local_date >= since]
+
+    def _slots_since(self, city, days):
+        since = _canada_since(days)
+        for (_, slot_date, slot_time), (slot_city, _, announced_date) in self._slots.items():
+            if announced_date >= since and (not city or slot_city == city):
+                yield slot_date, slot_time, announced_date
+
+    async def get_top_slot_dates(self, city=None, days=30, limit=5):
+        counts = Counter(slot_date for slot_date, _, _ in self._slots_since(city, days))
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    async def get_top_slot_times(self, city=None, days=30, limit=5):
+        counts = Counter(slot_time for _, slot_time, _ in self._slots_since(city, days) if slot_time)
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    async def get_slot_lead_times(self, city=None, days=30):
+        counts = Counter()
+        for slot_date, _, announced_date in self._slots_since(city, days):
+            try:
+                lead = (datetime.fromisoformat(slot_date) - datetime.fromisoformat(announced_date)).days
+            except ValueError:
+                continue
+            counts[lead] += 1
+        return sorted(counts.items())
+
+    async def get_slot_lifetimes(self, days=30):
+        since = _canada_since(days)
+        return [(city, service, hour, lifetime_seconds, latency_ms)
+                for _, city, service, lifetime_seconds, latency_ms, local_date, hour in self._lifetimes.values()
+                if local_date >= since]
+
+    async def get_forecast_cells(self):
+        rows = [(*key, value, updated_at) for key, (value, updated_at, _) in self._cells.items()]
+        since = min((first_seen for _, _, first_seen in self._cells.values()), default=None)
+        return rows, since
+
+    async def get_stats_version(self):
+        return self._version
+
+    # --- черга роздільного режиму ---
+
+    async def claim_outbox(self, limit=50, visibility_seconds=60):
+        now = time.time()
+        claimed = []
+        for outbox_id in sorted(self._outbox):
+            if len(claimed) >= limit:
+                break
+            entry = self._outbox[outbox_id]
+            if entry[4] >= now:
+                continue
+            entry[4] = now + visibility_seconds
+            entry[5] += 1
+            claimed.append((outbox_id, entry[0], entry[1], json.loads(entry[2]), entry[5]))
+        return claimed
+
+    async def get_outbox_depth(self):
+        return len(self._outbox)
+
+    # --- обслуговування ---
+
+    async def compact(self, hot_days=db.HOT_DAYS):
+        limit = _utc_ago(days=hot_days)
+        watermark = max(self._processed, default=None)
+        old = [row for row in self._processed.values() if row.timestamp < limit and row.msg_id != watermark]
+
+        for row in old:
+            del self._processed[row.msg_id]
+            for key in [key for key in self._sent_posts if key[0] == row.msg_id]:
+                del self._sent_posts[key]
+            if not row.city:
+                continue
+            try:
+                canada_time = db._parse_canada_time(row.canada_time, row.timestamp)
+            except (TypeError, ValueError):
+                continue
+            counts = self._daily.setdefault((canada_time.date().isoformat(), row.city, row.service or ''),
+                                            [0, 0, {}])
+            counts[0] += 1
+            counts[1] += row.slots_count or 0
+            hour = str(canada_time.hour)
+            counts[2][hour] = counts[2].get(hour, 0) + 1
+        return len(old)
+
+    async def reclaim_space(self):
+        return False, 0
+
+
+ENGINES = {
+    'sqlite': SQLiteStorage,
+    'memory': MemoryStorage,
+}
+
+
+def open_storage(engine=None, path=None):
+    """
+    Рушій з STORAGE_ENGINE (sqlite за замовчуванням), файл БД — з DB_FILE.
+    Читається під час виклику, тобто вже після load_dotenv().
+    """
+    engine = engine or os.getenv('STORAGE_ENGINE', 'sqlite')
+    if engine not in ENGINES:
+        raise ValueError(f"Невідомий STORAGE_ENGINE={engine!r}, доступні: {', '.join(ENGINES)}")
+    if engine == 'sqlite':
+        return SQLiteStorage(path or os.getenv('DB_FILE'))
+    return ENGINES[engine]()
+
+
+# Сценарій для test_storage_parity: усі операції запису, вкл. повтори
+PARITY_OPS = [
+    ('insert_processed', (1, 'h1', 'Торонто', 'Паспорт', 3),
+     {'slots': (('17.08.2025', ('11:15', '11:25')), ('18.08.2025', ('09:30',))), 'latency_ms': 12.5}),
+    ('insert_processed', (2, 'h2', 'Едмонтоні', None, 1), {'available_dates': ['20.08.2025']}),
+    ('insert_processed', (3, None), {}),
+    ('insert_sent_posts', (), {'msg_id': 1, 'city': 'Торонто', 'content_hash': 'h1',
+                               'posts': [(-100, 11), (-200, 12)], 'text': 't'}),
+    ('insert_sent_posts', (), {'msg_id': 2, 'city': 'Едмонтоні', 'content_hash': 'h2',
+                               'posts': [(-100, 13)], 'text': 'e'}),
+    ('update_sent_posts_text', (1, 't2'), {}),
+    ('mark_gone_processed', ('h2', 4), {'msg_id': 2}),
+    ('insert_slot_lifetime', (4, 'Едмонтоні', 59), {'msg_id': 2}),
+    ('insert_slot_lifetime', (5, 'Торонто', 120), {'msg_id': 1}),
+    ('insert_slot_lifetime', (5, 'Торонто', 999), {'msg_id': 1}),
+    ('insert_slot_lifetime', (6, 'Торонто', 30), {}),
+    ('enqueue_outbox', (7, 'new_slots', {'raw_text': 'x'}), {}),
+    ('enqueue_outbox', (7, 'new_slots', {'raw_text': 'y'}), {}),
+    ('enqueue_outbox', (8, 'gone', {'raw_text': 'z'}), {}),
+]
+
+
+async def _parity_snapshot(storage):
+    """Відповіді всіх запитів сховища після PARITY_OPS"""
+    await storage.init()
+    await storage.write_batch(PARITY_OPS)
+    claimed = await storage.claim_outbox(limit=1)
+    await storage.write_batch([('ack_outbox', (claimed[0][0],), {})])
+    msg_ids, hashes = await storage.get_dedup_state()
+    snapshot = {
+        'dedup': (sorted(msg_ids), sorted(content_hash for content_hash, _ in hashes)),
+        'processed_ids': await storage.get_processed_ids([1, 2, 9]),
+        'watermark': await storage.get_processed_watermark(),
+        'active_posts': sorted((row[0], row[1], row[2], row[3], row[5]) for row in await storage.get_active_posts()),
+        'statistics': sorted(row[:3] for row in await storage.get_statistics_data()),
+        'history': sorted(row[1:] for row in await storage.get_statistics_history()),
+        'top_dates': await storage.get_top_slot_dates(),
+        'top_times': await storage.get_top_slot_times('Торонто'),
+        'lead_times': await storage.get_slot_lead_times(),
+        'lifetimes': sorted(await storage.get_slot_lifetimes(), key=repr),
+        'forecast': sorted((row[0], round(row[3], 6)) for row in (await storage.get_forecast_cells())[0]),
+        'claimed': [row[1:] for row in claimed],
+        'outbox_depth': await storage.get_outbox_depth(),
+        'compact_hot': await storage.compact(30),
+    }
+    # compact бере рядки, старші за поточну секунду
+    await asyncio.sleep(1.1)
+    snapshot['compact_all'] = await storage.compact(0)
+    snapshot['daily'] = sorted(row[:4] for row in await storage.get_daily_stats())
+    snapshot['after_compact'] = await storage.get_processed_ids([1, 2, 3, 4])
+    storage.close()
+    return snapshot
+
+
+def test_storage_parity():
+    """Однаковий сценарій записів дає однакові відповіді в обох рушіях"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sqlite = asyncio.run(_parity_snapshot(SQLiteStorage(os.path.join(tmp_dir, 'parity.db'))))
+    memory = asyncio.run(_parity_snapshot(MemoryStorage()))
+
+    failed = [name for name in sqlite if sqlite[name] != memory[name]]
+    for name in failed:
+        print(f"❌ {name}: sqlite={sqlite[name]!r} memory={memory[name]!r}")
+    assert not failed, failed
+    print(f"✅ storage parity OK ({len(sqlite)} запитів)")
+
+
+if __name__ == "__main__":
+    test_storage_parity()
@@ -0,0 +1,176 @@
+import time
+import sqlite3
+import asyncio
+
+from storage import WRITE_OPS
+from metrics import PERSIST_TIME, PERSIST_BATCH_SIZE
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# Як часто скидати накопичені записи та максимальний розмір пачки
+FLUSH_INTERVAL = 0.005  # секунд
+MAX_BATCH = 100
+# Пауза перед повтором, коли БД зайнята (секунд, росте до максимуму)
+RETRY_BACKOFF = (0.05, 0.2, 1, 5)
+# Тимчасові помилки: блокування довше за busy_timeout (напр. VACUUM іншого процесу)
+TRANSIENT_ERRORS = (sqlite3.OperationalError,)
+
+
+class WriteBehindQueue:
+    """
+    Відкладений запис у БД з груповим комітом.
+
+    Хендлер лише додає операцію в пам'ять (put) і одразу йде далі;
+    фонова задача кожні FLUSH_INTERVAL секунд (або щойно набралось
+    MAX_BATCH операцій) записує всю пачку однією транзакцією.
+    Пачка, що не записалась, повертається на початок черги: при зайнятій
+    БД — повтор з паузою, інакше — по одній операції, і відкидається
+    лише та, що падає й окремо.
+    При зупинці close() дописує все і робить checkpoint WAL.
+    """
+
+    def __init__(self, storage, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending = []
+        self._has_data = None
+        self._batch_full = None
+        self._worker = None
+        self._closed = False
+        self.batches = 0
+        self.ops_written = 0
+
+    def put(self, op, *args, **kwargs):
+        """Додає операцію сховища (назва з storage.WRITE_OPS) в чергу запису"""
+        if self._closed:
+            raise RuntimeError("WriteBehindQueue вже закрито")
+        if op not in WRITE_OPS:
+            raise ValueError(f"Невідома операція запису: {op}")
+        self._ensure_worker()
+        self._pending.append((op, args, kwargs))
+        self._has_data.set()
+        if len(self._pending) >= self.max_batch:
+            self._batch_full.set()
+
+    async def flush(self):
+        """Записує все, що накопичилось, і чекає на коміт"""
+        retries = 0
+        while self._pending:
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            started = time.perf_counter()
+            try:
+                await self.storage.write_batch(batch)
+            except TRANSIENT_ERRORS as e:
+                retries = await self._retry_later(batch, retries, e)
+                continue
+            except Exception as e:
+                log.error(f"❌ Помилка групового запису ({len(batch)} операцій): {e} — пишу по одній")
+                rest, error = await self._write_one_by_one(batch)
+                if rest:
+                    retries = await self._retry_later(rest, retries, error)
+                continue
+            retries = 0
+            PERSIST_TIME.observe(time.perf_counter() - started)
+            PERSIST_BATCH_SIZE.observe(len(batch))
+            self.batches += 1
+            self.ops_written += len(batch)
+
+    async def _retry_later(self, batch, retries, error):
+        """Повертає пачку на початок черги і чекає перед повтором"""
+        self._pending[:0] = batch
+        delay = RETRY_BACKOFF[min(retries, len(RETRY_BACKOFF) - 1)]
+        log.warning(f"⚠️ БД зайнята, повтор запису {len(batch)} операцій через {delay} с: {error}")
+        await asyncio.sleep(delay)
+        return retries + 1
+
+    async def _write_one_by_one(self, batch):
+        """Кожна операція — окремою транзакцією; повертає (незаписаний хвіст, помилка), якщо БД зайнята"""
+        for index, item in enumerate(batch):
+            try:
+                await self.storage.write_batch([item])
+            except TRANSIENT_ERRORS as e:
+                return batch[index:], e
+            except Exception as e:
+                op, args, _ = item
+                log.error(f"❌ Операцію {op} відкинуто: падає й окремо: {e}", extra={'op_args': repr(args)[:200]})
+                continue
+            self.batches += 1
+            self.ops_written += 1
+        return [], None
+
+    async def close(self):
+        """Надійне завершення: дописати чергу та перенести WAL в основний файл"""
+        self._closed = True
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        await self.flush()
+        await self.storage.checkpoint()
+        log.info(f"💾 Записано {self.ops_written} операцій у {self.batches} транзакціях")
+
+    def _ensure_worker(self):
+        if self._has_data is None:
+            self._has_data = asyncio.Event()
+            self._batch_full = asyncio.Event()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._has_data.wait()
+
+            # Даємо пачці накопичитись, якщо вона ще не повна
+            if len(self._pending) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            self._has_data.clear()
+            self._batch_full.clear()
+            await self.flush()
+
+
+def test_write_behind():
+    class FlakyStorage:
+        """Перші два записи — "database is locked", операція 'bad' падає завжди"""
+
+        def __init__(self):
+            self.locked = 2
+            self.rows = []
+
+        async def write_batch(self, ops):
+            if self.locked:
+                self.locked -= 1
+                raise sqlite3.OperationalError("database is locked")
+            if any(args == ('bad',) for _, args, _ in ops):
+                raise ValueError("bad op")
+            self.rows.extend(args[0] for _, args, _ in ops)
+            return len(ops)
+
+        async def checkpoint(self, mode='TRUNCATE'):
+            return None
+
+    async def scenario():
+        storage = FlakyStorage()
+        queue = WriteBehindQueue(storage)
+        for value in (1, 2, 'bad', 3):
+            queue.put('insert_processed', value)
+        await asyncio.sleep(0.5)
+        queue.put('insert_processed', 4)
+        await queue.close()
+        assert storage.rows == [1, 2, 3, 4], storage.rows
+
+    asyncio.run(scenario())
+    print("✅ write_behind OK")
+
+
+if __name__ == "__main__":
+    test_write_behind()